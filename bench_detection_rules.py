@@ -0,0 +1,54 @@
+# bench_detection_rules.py
+# Per-member evaluation cost of compiled detection rules (full-guild scan budget)
+#
+# Usage: python bench_detection_rules.py [member_count]
+
+from __future__ import annotations
+import random
+import sys
+import time
+
+from detection_rules import MemberFeatures, compile_rule
+from presence_history import PresenceHistory
+
+RULES = [
+    "platforms == web",
+    "platforms == web and account_age < 30d",
+    "platforms == web and continuous(web, 10m) and join_age < 7d",
+    "not seen(desktop+mobile, 7d) and tracked_for >= 1d and (account_age < 90d or role_count == 0)",
+    "(platforms == web or platforms == none) and not has_role(123456789012345678) and not seen(desktop, 7d) and continuous(web, 10m)",
+]
+
+def make_features(n: int):
+    rng = random.Random(42)
+    now = time.time()
+    history = PresenceHistory(max_members=n, depth=16)
+    features = []
+    for _ in range(n):
+        uid = rng.randrange(100_000_000_000_000_000, 1_200_000_000_000_000_000)
+        ts = now - 14 * 86400
+        for _ in range(rng.randrange(1, 12)):
+            ts += rng.random() * 86400
+            history.record(uid, rng.choice((0, 1, 1, 2, 4, 5)), min(ts, now))
+        mask = history.current_mask(uid) or 0
+        roles = frozenset(rng.sample(range(1, 50), rng.randrange(0, 4)))
+        features.append(MemberFeatures(uid, mask, now - rng.random() * 60 * 86400, now, roles, history))
+    return features
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    features = make_features(n)
+    print(f"members: {n}")
+    print(f"{'ns/member':>10}  {'matched':>8}  rule")
+    for source in RULES:
+        rule = compile_rule(source)
+        best = float("inf")
+        matched = 0
+        for _ in range(3):
+            t0 = time.perf_counter()
+            matched = sum(1 for f in features if rule(f))
+            best = min(best, time.perf_counter() - t0)
+        print(f"{best / n * 1e9:>10.0f}  {matched:>8}  {source}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_member_store.py
+# Memory / disk benchmark: legacy sus_platforms.json dict layout vs PlatformSnapshotStore,
+# plus the lean-mode MemberIndex footprint
+#
+# Usage: python bench_member_store.py [member_count]
+
+from __future__ import annotations
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from member_store import MemberIndex, PlatformSnapshotStore, platforms_to_mask
+
+PLATFORM_CHOICES = (["web"], ["mobile"], ["desktop"], ["desktop", "mobile"], ["mobile", "web"], [])
+
+def make_members(n: int):
+    rng = random.Random(1234)
+    base_id = 100_000_000_000_000_000
+    now = time.time()
+    return [(base_id + rng.randrange(10**17), rng.choice(PLATFORM_CHOICES), now - rng.random() * 86400) for _ in range(n)]
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    obj = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return obj, size
+
+def build_legacy(members):
+    # same shape set_sus_platform_snapshot used to write: str(id) -> {"platforms": [...], "ts": float}
+    return {str(uid): {"platforms": list(platforms), "ts": ts} for uid, platforms, ts in members}
+
+def build_store(members):
+    store = PlatformSnapshotStore()
+    for uid, platforms, ts in sorted(members):
+        store.set_platforms(uid, platforms, ts)
+    return store
+
+ROLE_COMBOS = [(), (111,), (111, 222), (333,), (111, 333, 444)]
+
+def build_index(members):
+    rng = random.Random(99)
+    index = MemberIndex()
+    for uid, platforms, ts in members:
+        index.upsert(uid, ts, rng.choice(ROLE_COMBOS), False)
+        index.set_mask(uid, platforms_to_mask(platforms))
+    return index
+
+def time_lookups(fn, ids, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for uid in ids:
+            fn(uid)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(ids) * 1e9
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    members = make_members(n)
+    ids = [uid for uid, _, _ in members[:10_000]]
+
+    legacy, legacy_bytes = measure(lambda: build_legacy(members))
+    store, store_bytes = measure(lambda: build_store(members))
+    legacy_disk = len(json.dumps(legacy, indent=2).encode())
+    store_disk = len(store.to_bytes())
+
+    legacy_ns = time_lookups(lambda uid: legacy.get(str(uid)), ids)
+    store_ns = time_lookups(store.get, ids)
+
+    print(f"members: {n}")
+    print(f"{'layout':<28}{'heap bytes':>14}{'bytes/member':>14}{'disk bytes':>14}{'lookup ns':>12}")
+    print(f"{'dict + JSON (legacy)':<28}{legacy_bytes:>14,}{legacy_bytes / n:>14.1f}{legacy_disk:>14,}{legacy_ns:>12.0f}")
+    print(f"{'PlatformSnapshotStore':<28}{store_bytes:>14,}{store_bytes / n:>14.1f}{store_disk:>14,}{store_ns:>12.0f}")
+    print(f"heap reduction: {legacy_bytes / max(store_bytes, 1):.1f}x, disk reduction: {legacy_disk / max(store_disk, 1):.1f}x")
+
+    index, index_bytes = measure(lambda: build_index(members))
+    index_ns = time_lookups(index.get, ids)
+    print(f"{'MemberIndex (lean mode)':<28}{index_bytes:>14,}{index_bytes / n:>14.1f}{'-':>14}{index_ns:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,13 @@ import asyncio
 import secrets
 import random
 import datetime
+import time
 import re
+import sys
+import hashlib
 import traceback
+from array import array
+from collections import deque
 from pathlib import Path
 from typing import Dict, Any, List, Set
 import aiocron
@@ -18,6 +23,20 @@ from dotenv import load_dotenv
 import discord
 from discord import app_commands
 from discord.ext import commands
+from member_store import MemberIndex, MemberRecord, PlatformSnapshotStore, platforms_to_mask, mask_to_platforms, diff_stores
+from presence_history import PresenceHistory
+from scan_archive import ScanArchive
+from detection_rules import CompiledRule, MemberFeatures, RuleError, DEFAULT_RULE, compile_rule
+from challenge_tokens import ChallengeSigner, AttemptThrottle, UsedChallenges
+from loop_monitor import LoopLagMonitor
+from tracing import Tracer, Trace, NULL_TRACE
+from command_schemas import COMMANDS, commands_hash, load_synced_hash, save_synced_hash
+from metrics import Histogram, format_seconds, format_summary
+from rest_accounting import RestAccounting
+from gateway_log import GatewayRecorder, EVENT_CODES
+from raid_cohorts import Cohort, find_cohorts
+from mem_profile import HeapTracker, approx_size, format_bytes
+from role_pipeline import RolePipeline, LANE_INTERACTIVE, LANE_JOIN, LANE_BULK, DEFAULT_LANE_WEIGHTS
 
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -32,6 +51,24 @@ SUS_ROLE_NAME = os.getenv("SUS_ROLE_NAME", "Sus")
 ADMIN_ROLE_IDS_RAW = json.loads(os.getenv("ADMIN_ROLE_IDS", "[]") or "[]")
 PROCESS_DELAY_MS = int(os.getenv("PROCESS_DELAY_MS", "800"))
 COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "!")
+PRESENCE_HISTORY_MAX_MEMBERS = int(os.getenv("PRESENCE_HISTORY_MAX_MEMBERS", "100000"))
+PRESENCE_HISTORY_DEPTH = int(os.getenv("PRESENCE_HISTORY_DEPTH", "16"))
+# lean mode: no discord.py member cache / startup chunking; a compact MemberIndex is fed from raw gateway events
+LEAN_MODE = os.getenv("LEAN_MODE", "false").lower() in ("1", "true", "yes")
+# slash-only: ignore prefix commands and drop the privileged message_content intent
+SLASH_ONLY = os.getenv("SLASH_ONLY", "false").lower() in ("1", "true", "yes")
+# register slash commands at startup when command_schemas.py changed (no API calls otherwise)
+SYNC_COMMANDS_ON_START = os.getenv("SYNC_COMMANDS_ON_START", "true").lower() in ("1", "true", "yes")
+TRACE_PATH = Path(os.getenv("TRACE_PATH", "traces.json"))
+TRACE_MAX_MB = int(os.getenv("TRACE_MAX_MB", "20"))
+# record handled gateway events to <dir>/gateway_<utc time>.log.gz for replay_gateway.py (empty = off)
+GATEWAY_RECORD_DIR = os.getenv("GATEWAY_RECORD_DIR", "")
+GATEWAY_RECORD_MAX_MB = int(os.getenv("GATEWAY_RECORD_MAX_MB", "512"))
+# traceback depth recorded per allocation once tracemalloc is switched on (!mem snapshot)
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+VERIFY_HMAC_KEY = os.getenv("VERIFY_HMAC_KEY", "")
+VERIFY_MAX_ATTEMPTS = int(os.getenv("VERIFY_MAX_ATTEMPTS", "5"))              # answer submits per user ...
+VERIFY_ATTEMPT_WINDOW_SECONDS = int(os.getenv("VERIFY_ATTEMPT_WINDOW_SECONDS", "60"))  # ... per window
 
 # Normalize admin role ids to ints safely
 ADMIN_ROLE_IDS: List[int] = []
@@ -43,18 +80,41 @@ for rid in ADMIN_ROLE_IDS_RAW:
 ADMIN_ROLE_IDS_SET: Set[int] = set(ADMIN_ROLE_IDS)
 
 CONFIG_PATH = Path("config.json")
-SUS_PLATFORM_CACHE_PATH = Path("sus_platforms.json")
+SCAN_BASELINE_DIR = Path("scan_baselines")
+SCAN_ARCHIVE_DIR = Path("scan_archive")
+BULK_JOBS_DIR = Path("bulk_jobs")
+HEAP_DIFF_DIR = Path("memory_diffs")
+SUS_PLATFORM_CACHE_PATH = Path("sus_platforms.bin")
+LEGACY_SUS_PLATFORM_CACHE_PATH = Path("sus_platforms.json")  # pre-binary format, migrated on load
 DEFAULT_CONFIG = {
     "sus_role_id": None,
     "verify_message_id": None,
     "admin_prompt_message_id": None,
     "verification_methods": ["button"],
     "autoscan_enabled": False,
+    "autoscan_interval_seconds": 60,
+    "autoscan_full_rescan_hours": 24,
+    "scan_cache_ttl_seconds": 300,
+    "scan_cache_max_entries": 8,
+    "scan_max_concurrent": 1,
+    "cohort_join_window_seconds": 300,
+    "cohort_created_window_seconds": 7200,
+    "cohort_min_size": 10,
+    "cohort_autodetect": False,
+    "cohort_auto_apply": False,
     "log_channel_id": SUS_LOG_CHANNEL_ID or None,
     "periodic_notify_enabled": True,
     "periodic_notify_cron": "0,30 * * * *",
     "periodic_mention_delete_seconds": 30,
-    "process_delay_ms": PROCESS_DELAY_MS
+    "mention_batch_window_ms": 2000,
+    "mention_batch_max_wait_seconds": 15,
+    "process_delay_ms": PROCESS_DELAY_MS,
+    "role_lane_weights": dict(DEFAULT_LANE_WEIGHTS),
+    "verify_slo_ms": 2000,
+    "loop_lag_threshold_ms": 100,
+    "tracing_enabled": True,
+    "memory_report_minutes": 60,
+    "detection_rule": DEFAULT_RULE
 }
 
 if not BOT_TOKEN or not GUILD_ID:
@@ -64,17 +124,46 @@ if not BOT_TOKEN or not GUILD_ID:
 intents = discord.Intents.default()
 intents.members = True
 intents.presences = True   # make sure this is enabled in Dev Portal
-intents.message_content = True
+intents.message_content = not SLASH_ONLY
 intents.guilds = True
 
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents, help_command=None)
+if LEAN_MODE:
+    bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents, help_command=None,
+                       member_cache_flags=discord.MemberCacheFlags.none(), chunk_guilds_at_startup=False)
+else:
+    bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents, help_command=None)
 
 config: Dict[str, Any] = {}
-role_queue: asyncio.Queue = asyncio.Queue()
+# role ops in priority lanes: interactive verify/unsus > join detections > bulk jobs
+role_pipeline = RolePipeline()
 role_worker_task: asyncio.Task = None
-challenge_store: Dict[str, Dict[str, Any]] = {}
-
-sus_platform_cache: Dict[str, Dict[str, Any]] = {}
+# strong refs for fire-and-forget follow-ups (logs, mentions) so they are not garbage collected
+background_tasks: Set[asyncio.Task] = set()
+autoscan_task: asyncio.Task = None
+loop_monitor: LoopLagMonitor = None
+startup_rss_mb: float = 0.0
+# spans for join -> Sus and verify flows (Chrome Trace Event JSON, open in ui.perfetto.dev)
+tracer = Tracer(TRACE_PATH, max_bytes=TRACE_MAX_MB * 1024 * 1024)
+heap_tracker = HeapTracker(HEAP_DIFF_DIR, frames=TRACEMALLOC_FRAMES)
+memory_report_task: asyncio.Task = None
+# REST calls by route, per operation (sus_add, verify, notifier, ...)
+rest_calls = RestAccounting()
+gateway_recorder: GatewayRecorder = None
+# verification challenges live in signed custom_ids, not in memory; all processes must share the key
+if not VERIFY_HMAC_KEY:
+    print("WARNING: VERIFY_HMAC_KEY not set; using a random key (open challenges become invalid on restart)")
+challenge_signer = ChallengeSigner(VERIFY_HMAC_KEY.encode() or secrets.token_bytes(32))
+verify_throttle = AttemptThrottle(VERIFY_MAX_ATTEMPTS, VERIFY_ATTEMPT_WINDOW_SECONDS)
+used_challenges = UsedChallenges()
+CHALLENGE_OPEN_PREFIX = "vc:"    # "Submit Answer" button -> opens the modal
+CHALLENGE_SUBMIT_PREFIX = "vs:"  # modal custom_id -> handled in on_interaction
+CHALLENGE_TTL_SECONDS = 300
+
+sus_platform_cache: PlatformSnapshotStore = PlatformSnapshotStore()
+# lean mode only: id -> joined ts / platform mask / roles for every member seen on the gateway
+member_index = MemberIndex()
+# last platform transitions per member, fed by presence updates (fixed memory budget)
+presence_history = PresenceHistory(max_members=PRESENCE_HISTORY_MAX_MEMBERS, depth=PRESENCE_HISTORY_DEPTH)
 
 # -------------------------
 # Config & platform-cache helpers
@@ -90,41 +179,47 @@ def load_config():
     except Exception:
         config = DEFAULT_CONFIG.copy()
         save_config()
+    load_detection_rule()
+    role_pipeline.set_weights(config.get("role_lane_weights") or {})
+    tracer.enabled = bool(config.get("tracing_enabled", True))
 
 def save_config():
     CONFIG_PATH.write_text(json.dumps(config, indent=2))
 
 def load_sus_platform_cache():
     global sus_platform_cache
-    if SUS_PLATFORM_CACHE_PATH.exists():
-        try:
-            sus_platform_cache = json.loads(SUS_PLATFORM_CACHE_PATH.read_text())
-        except Exception:
-            sus_platform_cache = {}
-    else:
-        sus_platform_cache = {}
+    try:
+        sus_platform_cache = PlatformSnapshotStore.load(SUS_PLATFORM_CACHE_PATH, LEGACY_SUS_PLATFORM_CACHE_PATH)
+    except Exception as e:
+        print("Failed to load sus_platform_cache:", e)
+        sus_platform_cache = PlatformSnapshotStore()
 
 def save_sus_platform_cache():
     try:
-        SUS_PLATFORM_CACHE_PATH.write_text(json.dumps(sus_platform_cache, indent=2))
+        sus_platform_cache.save(SUS_PLATFORM_CACHE_PATH)
     except Exception as e:
         print("Failed to save sus_platform_cache:", e)
 
 def set_sus_platform_snapshot(user_id: int, platforms: List[str]):
     try:
-        sus_platform_cache[str(user_id)] = {"platforms": platforms, "ts": datetime.datetime.utcnow().timestamp()}
+        sus_platform_cache.set_platforms(user_id, platforms, datetime.datetime.utcnow().timestamp())
         save_sus_platform_cache()
     except Exception as e:
         print("Error setting sus platform snapshot:", e)
 
 def pop_sus_platform_snapshot(user_id: int):
     try:
-        if str(user_id) in sus_platform_cache:
-            sus_platform_cache.pop(str(user_id), None)
+        if sus_platform_cache.pop(user_id):
             save_sus_platform_cache()
     except Exception as e:
         print("Error popping sus platform snapshot:", e)
 
+def recent_sus_platform_snapshot(user_id: int, now_ts: float, max_age: float = 86400) -> List[str]:
+    snap = sus_platform_cache.get(user_id)
+    if snap and (now_ts - snap.ts < max_age):
+        return snap.platforms
+    return []
+
 # -------------------------
 # Admin detection helper
 # -------------------------
@@ -149,42 +244,112 @@ def is_admin_member(member: discord.Member) -> bool:
         pass
     return False
 
+# -------------------------
+# Channel resolution (gateway cache first)
+# -------------------------
+# channels that had to be fetched once (e.g. not visible in the guild cache) are kept here,
+# so the log and verify paths never pay a fetch_channel per message
+fetched_channels: Dict[int, discord.abc.GuildChannel] = {}
+
+async def resolve_channel(guild: discord.Guild, channel_id: int):
+    ch = guild.get_channel(channel_id) or fetched_channels.get(channel_id)
+    if ch is None:
+        ch = await guild.fetch_channel(channel_id)
+        fetched_channels[channel_id] = ch
+    return ch
+
 # -------------------------
 # Logging helper (non-notifying)
 # -------------------------
-async def log_to_channel(guild: discord.Guild, text: str, csv_path: str = None):
+async def log_to_channel(guild: discord.Guild, text: str, csv_path: str = None, view: discord.ui.View = None) -> bool:
     channel_id = config.get("log_channel_id") or SUS_LOG_CHANNEL_ID
     if not channel_id:
         print("[LOG]", text)
-        return
-    ch = guild.get_channel(channel_id)
-    if ch is None:
-        try:
-            ch = await guild.fetch_channel(channel_id)
-        except Exception:
-            print("[LOG] channel not available, fallback to console:", text)
-            return
+        return False
+    try:
+        ch = await resolve_channel(guild, channel_id)
+    except Exception:
+        print("[LOG] channel not available, fallback to console:", text)
+        return False
     try:
         # disable allowed_mentions to avoid accidental pings
-        await ch.send(content=text, allowed_mentions=discord.AllowedMentions.none())
+        if view is not None:
+            await ch.send(content=text, view=view, allowed_mentions=discord.AllowedMentions.none())
+        else:
+            await ch.send(content=text, allowed_mentions=discord.AllowedMentions.none())
         if csv_path:
             await ch.send(file=discord.File(csv_path), allowed_mentions=discord.AllowedMentions.none())
+        return True
     except Exception as e:
         print("Failed to send log:", e)
+        return False
 
 # -------------------------
 # Role queue to avoid ratelimits
 # -------------------------
+def spawn_background(coro) -> asyncio.Task:
+    """Run `coro` off the role worker (logging, mentions); errors are printed, not raised."""
+    async def guarded():
+        try:
+            await coro
+        except Exception as e:
+            print("Background task error:", e)
+    task = asyncio.create_task(guarded(), name=f"bg: {getattr(coro, '__qualname__', 'coroutine')}")
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def traced(trace: Trace, stage: str, coro):
+    """Await `coro` inside a `stage` span of `trace`."""
+    with trace.span(stage):
+        return await coro
+
+async def queue_role_op(coro, lane: str = LANE_BULK) -> asyncio.Future:
+    """Put a role coroutine in `lane`; the returned future resolves after it has run."""
+    done = asyncio.get_running_loop().create_future()
+
+    async def tracked():
+        try:
+            await coro
+        finally:
+            if not done.done():
+                done.set_result(None)
+    role_pipeline.put(lane, tracked())
+    return done
+
 async def role_worker():
-    delay = (config.get("process_delay_ms") or PROCESS_DELAY_MS) / 1000.0
     while True:
-        task_coro = await role_queue.get()
+        lane, task_coro = await role_pipeline.get()
         try:
             await task_coro
         except Exception as e:
-            print("Role task error:", e)
-        await asyncio.sleep(delay)
-        role_queue.task_done()
+            print(f"Role task error ({lane}):", e)
+        # only the role op itself is paced; its logging and mentions run in the background
+        await asyncio.sleep((config.get("process_delay_ms") or PROCESS_DELAY_MS) / 1000.0)
+
+def install_rest_accounting():
+    """Count every REST request the bot makes under the current operation (see rest_accounting.py)."""
+    request = bot.http.request
+    async def counted_request(route, **kwargs):
+        rest_calls.record(route.method, route.path)
+        return await request(route, **kwargs)
+    bot.http.request = counted_request
+
+def rest_calls_report() -> str:
+    runs = rest_calls.ops.get("sus_add", 0)
+    role_edits = sum(n for route, n in rest_calls.calls.get("sus_add", {}).items() if "/roles/" in route)
+    lines = ["**REST calls**"]
+    if runs:
+        lines.append(f"per Sus action: {rest_calls.per_op('sus_add'):.2f} ({role_edits / runs:.2f} role edits, the rest is log/mention traffic)")
+    lines.append(rest_calls.report())
+    return "\n".join(lines)
+
+def role_queue_report() -> str:
+    lines = [f"**Role queue** (Sus members: {len(sus_members)})"]
+    for lane in role_pipeline.weights:
+        lines.append(f"`{lane}` weight {role_pipeline.weights[lane]}, pending {role_pipeline.qsize(lane)}, "
+                     f"wait {format_summary(role_pipeline.wait_hist[lane])}")
+    return "\n".join(lines)
 
 # -------------------------
 # Role management helpers
@@ -202,39 +367,167 @@ async def ensure_sus_role_and_overwrites(guild: discord.Guild):
         except Exception as e:
             print("Could not create Sus role:", e)
             return None
-    config["sus_role_id"] = role.id
-    save_config()
+    if config.get("sus_role_id") != role.id:
+        config["sus_role_id"] = role.id
+        save_config()
 
+    # only touch channels whose overwrite differs; a restart with everything in place makes no API calls
     allowed = {VERIFY_CHANNEL_ID, SUS_CHAT_CHANNEL_ID}
+    open_overwrite = discord.PermissionOverwrite(view_channel=True, send_messages=True)
+    hidden_overwrite = discord.PermissionOverwrite(view_channel=False)
+    updated = 0
     for ch in guild.channels:
         try:
-            if ch.id in allowed:
-                await ch.set_permissions(role, view_channel=True, send_messages=True)
-            else:
-                await ch.set_permissions(role, view_channel=False)
+            desired = open_overwrite if ch.id in allowed else hidden_overwrite
+            if ch.overwrites_for(role) == desired:
+                continue
+            await ch.set_permissions(role, overwrite=desired)
+            updated += 1
         except Exception:
             pass
+    if updated:
+        print(f"Sus role overwrites updated on {updated} channel(s).")
     return role
 
-async def send_immediate_mention(guild: discord.Guild, user_id: int):
+# -------------------------
+# Moderation mentions (coalesced, shared delete timer)
+# -------------------------
+# Flagged members share no-ping moderation notes in the verify channel, packed up to the message
+# length limit, and every note is deleted by one timer task that bulk-deletes whatever is due, so a
+# raid costs a few sends and deletes instead of two calls per member. A raid drains through the role
+# worker one add at a time (PROCESS_DELAY_MS apart), so a batch stays open while more work is queued
+# there: it closes `mention_batch_window_ms` after the queue empties, when the note is full, or once
+# its first member has waited `mention_batch_max_wait_seconds`.
+MESSAGE_CONTENT_LIMIT = 2000
+MENTION_NOTE = "(moderation note) You were placed into verification. Please verify."
+# pause after the last role change before mentioning, for Discord to apply the Sus overwrites (so
+# moderators' view resolves the mention); waited here rather than in the role worker
+MENTION_SETTLE_SECONDS = 0.5
+MENTION_SEND_ATTEMPTS = 3
+mention_pending: List[tuple] = []          # (user_id, trace, queued at, flagged at)
+mention_flush_task: asyncio.Task = None
+mention_deletes: List[tuple] = []          # (delete at, message)
+mention_delete_task: asyncio.Task = None
+
+def pack_mention_groups(user_ids: List[int], suffix: str) -> List[List[int]]:
+    """`user_ids` split into as few groups as fit one message each (mentions, then `suffix`)."""
+    groups: List[List[int]] = []
+    length = 0
+    for uid in user_ids:
+        size = len(f"<@{uid}>") + 1
+        if not groups or length + size + len(suffix) > MESSAGE_CONTENT_LIMIT:
+            groups.append([])
+            length = 0
+        groups[-1].append(uid)
+        length += size
+    return groups
+
+def pack_mentions(user_ids: List[int], suffix: str) -> List[str]:
+    """Mentions of `user_ids` followed by `suffix`, packed into as few messages as fit the length limit."""
+    return [" ".join(f"<@{uid}>" for uid in group) + f" {suffix}" for group in pack_mention_groups(user_ids, suffix)]
+
+def queue_moderation_mention(guild: discord.Guild, user_id: int, trace: Trace = NULL_TRACE):
     """
-    Send a plain mention visible to moderators in the verify channel but DO NOT notify the user.
-    This uses AllowedMentions.none() so the message includes the mention text but does not produce a ping.
+    Queue a plain mention visible to moderators in the verify channel but DO NOT notify the user.
+    Sent with AllowedMentions.none() together with the other members flagged around the same time.
     """
-    ttl = config.get("periodic_mention_delete_seconds", 30)
-    try:
-        ch = guild.get_channel(VERIFY_CHANNEL_ID) or await guild.fetch_channel(VERIFY_CHANNEL_ID)
-        sent = await ch.send(
-            f"<@{user_id}> (moderation note) You were placed into verification. Please verify.",
-            allowed_mentions=discord.AllowedMentions.none()
-        )
-        await asyncio.sleep(ttl)
+    global mention_flush_task
+    mention_pending.append((user_id, trace, trace.now(), time.monotonic()))
+    if mention_flush_task is None or mention_flush_task.done():
+        mention_flush_task = spawn_background(flush_mentions(guild))
+
+def pending_mention_ids() -> List[int]:
+    # one member may be flagged twice (e.g. join detection and a scan apply)
+    return list(dict.fromkeys(uid for uid, _, _, _ in mention_pending))
+
+async def flush_mentions(guild: discord.Guild):
+    """Send batches until nothing is pending; a failed send is retried with the next batch."""
+    failures = 0
+    while mention_pending:
+        window = float(config.get("mention_batch_window_ms", 2000)) / 1000.0
+        max_wait = float(config.get("mention_batch_max_wait_seconds", 15))
+        await asyncio.sleep(window)
+        while (role_pipeline.qsize() and len(pack_mention_groups(pending_mention_ids(), MENTION_NOTE)) < 2
+               and time.monotonic() - mention_pending[0][3] < max_wait):
+            await asyncio.sleep(window)
+        settle_start = time.perf_counter()   # trace clock
+        settle = mention_pending[-1][3] + MENTION_SETTLE_SECONDS - time.monotonic()
+        if settle > 0:
+            await asyncio.sleep(settle)
+        batch = list(mention_pending)
+        mention_pending.clear()
+        for _, trace, _, _ in batch:
+            trace.record("overwrite_settle", settle_start)
+
+        user_ids = list(dict.fromkeys(uid for uid, _, _, _ in batch))
+        failed: Set[int] = set(user_ids)
+        sent = []
         try:
-            await sent.delete()
-        except Exception:
-            pass
-    except Exception:
-        pass
+            ch = await resolve_channel(guild, VERIFY_CHANNEL_ID)
+            if ch is None:
+                raise RuntimeError(f"verify channel {VERIFY_CHANNEL_ID} not found")
+            for group in pack_mention_groups(user_ids, MENTION_NOTE):
+                try:
+                    content = " ".join(f"<@{uid}>" for uid in group) + f" {MENTION_NOTE}"
+                    sent.append(await ch.send(content, allowed_mentions=discord.AllowedMentions.none()))
+                    failed.difference_update(group)
+                except Exception as e:
+                    print("Moderation mention failed:", e)
+        except Exception as e:
+            print("Moderation mention failed:", e)
+        delete_mentions_later(sent)
+
+        for uid, trace, queued, _ in batch:
+            if uid not in failed:
+                trace.record("mention_send", queued, batch=len(user_ids))
+        if not failed:
+            failures = 0
+            continue
+        failures += 1
+        if failures >= MENTION_SEND_ATTEMPTS:
+            print(f"Moderation mention: giving up on {len(failed)} member(s) after {failures} failed attempts")
+            failures = 0
+            continue
+        # back in front of anything flagged meanwhile; the next round sends them together
+        mention_pending[:0] = [entry for entry in batch if entry[0] in failed]
+
+def delete_mentions_later(messages: List[discord.Message]):
+    """Delete `messages` after `periodic_mention_delete_seconds`, through the shared delete timer."""
+    global mention_delete_task
+    if not messages:
+        return
+    due = time.monotonic() + float(config.get("periodic_mention_delete_seconds", 30))
+    mention_deletes.extend((due, m) for m in messages)
+    if mention_delete_task is None or mention_delete_task.done():
+        mention_delete_task = spawn_background(mention_delete_timer())
+
+async def mention_delete_timer():
+    # waiting one batch window past the earliest deadline lets messages of the same burst go in one call
+    grace = float(config.get("mention_batch_window_ms", 2000)) / 1000.0
+    while mention_deletes:
+        earliest = min(due for due, _ in mention_deletes)
+        await asyncio.sleep(max(earliest - time.monotonic(), 0.0) + grace)
+        now = time.monotonic()
+        expired = [m for due, m in mention_deletes if due <= now]
+        mention_deletes[:] = [(due, m) for due, m in mention_deletes if due > now]
+        by_channel: Dict[int, List[discord.Message]] = {}
+        for m in expired:
+            by_channel.setdefault(m.channel.id, []).append(m)
+        for messages in by_channel.values():
+            channel = messages[0].channel
+            for i in range(0, len(messages), 100):
+                chunk = messages[i:i + 100]
+                try:
+                    await channel.delete_messages(chunk)
+                except discord.Forbidden:
+                    # bulk delete needs Manage Messages even for the bot's own messages
+                    for m in chunk:
+                        try:
+                            await m.delete()
+                        except Exception:
+                            pass
+                except Exception as e:
+                    print("Deleting moderation mentions failed:", e)
 
 # -------------------------
 # Presence normalization
@@ -297,20 +590,146 @@ def get_member_platforms(member: discord.Member) -> List[str]:
                             v = getattr(cs2, k)
                             if _status_value_to_str(v) != "offline":
                                 platforms.add(k)
+        if not platforms and LEAN_MODE:
+            # uncached / REST-fetched members carry no presence; the index has the last gateway status
+            rec = member_index.get(member.id)
+            if rec:
+                return rec.platforms
         return sorted(platforms)
     except Exception as e:
         print("get_member_platforms error:", e)
         traceback.print_exc()
         return []
 
+# -------------------------
+# Detection rule (compiled once, hot-swappable via !rule / /rule)
+# -------------------------
+detection_rule: CompiledRule = compile_rule(DEFAULT_RULE)
+
+def load_detection_rule():
+    global detection_rule
+    source = config.get("detection_rule") or DEFAULT_RULE
+    try:
+        detection_rule = compile_rule(source)
+    except RuleError as e:
+        print(f"Invalid detection_rule in config ({e}); falling back to {DEFAULT_RULE!r}")
+        detection_rule = compile_rule(DEFAULT_RULE)
+
+def set_detection_rule(source: str) -> CompiledRule:
+    """Compile and activate a rule. Raises RuleError (and keeps the current rule) on bad input."""
+    global detection_rule
+    compiled = compile_rule(source)
+    detection_rule = compiled
+    config["detection_rule"] = compiled.source
+    save_config()
+    return compiled
+
+def member_features(member: discord.Member, platforms: List[str] = None, now_ts: float = None) -> MemberFeatures:
+    if platforms is None:
+        platforms = get_member_platforms(member)
+    joined_ts = member.joined_at.replace(tzinfo=datetime.timezone.utc).timestamp() if member.joined_at else None
+    # @everyone excluded, like the role ids in gateway member payloads (lean-mode index records)
+    role_ids = frozenset(r.id for r in member.roles if not r.is_default()) if "roles" in detection_rule.needs else frozenset()
+    return MemberFeatures(member.id, platforms_to_mask(platforms), joined_ts,
+                          now_ts or datetime.datetime.utcnow().timestamp(), role_ids, presence_history)
+
+def is_sus_candidate(member: discord.Member, platforms: List[str] = None, now_ts: float = None) -> bool:
+    try:
+        return detection_rule(member_features(member, platforms, now_ts))
+    except Exception as e:
+        print("is_sus_candidate error:", e)
+        return False
+
+def record_features(rec: MemberRecord, now_ts: float, mask: int = None) -> MemberFeatures:
+    """Features from a lean-mode index record (no Member object needed)."""
+    role_ids = frozenset(r for r in rec.roles if r != GUILD_ID)
+    return MemberFeatures(rec.user_id, rec.mask if mask is None else mask, rec.joined_ts, now_ts, role_ids, presence_history)
+
+def rule_test_reply(guild: discord.Guild, user_id: int, member: discord.Member = None) -> str:
+    """The current rule's verdict for one member, from the member cache or, in lean mode, the member index."""
+    target = guild.get_member(user_id)
+    rec = member_index.get(user_id) if LEAN_MODE and target is None else None
+    if rec is not None:
+        platforms = mask_to_platforms(rec.mask)
+        matched = detection_rule(record_features(rec, datetime.datetime.utcnow().timestamp()))
+    elif target or member:
+        target = target or member
+        platforms = get_member_platforms(target)
+        matched = is_sus_candidate(target, platforms)
+    else:
+        return "Member not found in cache."
+    verdict = "MATCHES" if matched else "does not match"
+    return f"<@{user_id}> ({', '.join(platforms) or 'offline/no-presence'}) {verdict} `{detection_rule.source}`"
+
+def scan_row_is_candidate(guild: discord.Guild, row: Dict[str, Any], now_ts: float) -> bool:
+    """Evaluate the rule on a scan row; only resolves the member when the rule reads roles."""
+    if "roles" in detection_rule.needs:
+        m = guild.get_member(int(row["userId"]))
+        if m is None and LEAN_MODE:
+            rec = member_index.get(int(row["userId"]))
+            if rec is None:
+                return False
+            return detection_rule(record_features(rec, now_ts, platforms_to_mask(row.get("platforms", []))))
+        return bool(m) and is_sus_candidate(m, row.get("platforms", []), now_ts)
+    try:
+        joined_ts = _iso_to_ts(row["joinedAt"]) if row.get("joinedAt") else None
+        features = MemberFeatures(int(row["userId"]), platforms_to_mask(row.get("platforms", [])), joined_ts, now_ts,
+                                  history=presence_history)
+        return detection_rule(features)
+    except Exception as e:
+        print("scan_row_is_candidate error:", e)
+        return False
+
+# -------------------------
+# Current Sus members (maintained set)
+# -------------------------
+# Seeded once on the first ready, then kept current from member updates, removals and the bot's own
+# role ops, so status checks are a set lookup and notifier/release cost O(Sus members).
+sus_members: Set[int] = set()
+sus_members_seeded = False
+
+def seed_sus_members(guild: discord.Guild):
+    global sus_members_seeded
+    role = guild.get_role(config.get("sus_role_id") or 0)
+    if role is None:
+        return
+    # merge, not replace: the role worker starts in setup_hook, so Sus adds may already have run
+    before = len(sus_members)
+    if LEAN_MODE:
+        # no member cache: members seen on the gateway so far; the rest are learned from member updates.
+        # (not the snapshot cache: it also holds members whose Sus add is still queued)
+        sus_members.update(member_index.with_role(role.id))
+    else:
+        sus_members.update(m.id for m in role.members if not m.bot)
+    sus_members_seeded = True
+    print(f"Sus members seeded: {len(sus_members)} ({len(sus_members) - before} from the role, {before} added since start)")
+
+def is_sus(member: discord.Member) -> bool:
+    if sus_members_seeded:
+        return member.id in sus_members
+    role_id = config.get("sus_role_id")
+    return bool(role_id and member.get_role(role_id))
+
+def update_sus_membership(user_id: int, role_ids):
+    """Sync one member's entry from a fresh role list (ids)."""
+    role_id = config.get("sus_role_id")
+    if role_id and role_id in role_ids:
+        sus_members.add(user_id)
+    else:
+        sus_members.discard(user_id)
+
 # -------------------------
 # Add/remove sus role (queued) — snapshot + immediate no-ping mention
 # -------------------------
-async def add_sus_role_to_member(member: discord.Member, reason: str = "Marked Sus"):
+async def add_sus_role_to_member(member: discord.Member, reason: str = "Marked Sus", lane: str = LANE_JOIN, trace: Trace = None):
+    """
+    Queue the Sus role for `member`. Returns a future that resolves once the queued op has run (None if nothing was queued).
+    `trace` carries spans from the triggering event (e.g. on_member_join); without one a "sus_add" trace starts here.
+    """
     role_id = config.get("sus_role_id")
     if not role_id:
         return
-    if any(r.id == role_id for r in member.roles):
+    if is_sus(member):
         await log_to_channel(member.guild, f"User already Sus: {member} (id {member.id})")
         return
 
@@ -321,49 +740,100 @@ async def add_sus_role_to_member(member: discord.Member, reason: str = "Marked S
     except Exception as e:
         print("Failed to capture platform snapshot:", e)
 
+    trace = trace or tracer.start("sus_add", user_id=member.id)
+    enqueued = trace.now()
+
     async def op():
+        trace.record("queue_wait", enqueued, lane=lane)
         role = member.guild.get_role(role_id)
-        if role:
-            try:
-                await member.add_roles(role, reason=reason)
-
-                # short pause for Discord to apply permission overwrites (so moderators' view resolves mention)
-                await asyncio.sleep(0.5)
-
+        # another path (join detection, autoscan, scan apply) may have queued the same member
+        if role and not is_sus(member):
+            with rest_calls.operation("sus_add"):
                 try:
-                    m_refreshed = await member.guild.fetch_member(member.id)
-                except Exception:
-                    m_refreshed = member
-
-                platforms_now = get_member_platforms(m_refreshed) or snapshot
-                await log_to_channel(member.guild, f"User: {member}\nServer Nickname: {member.display_name}\nID: {member.id}\nMention: <@{member.id}>\nPlatform(s): {', '.join(platforms_now)}\nAction: {reason}")
-
-                # Send one immediate moderation-visible mention (no-notify)
-                await send_immediate_mention(member.guild, member.id)
-            except Exception as e:
-                print("Failed to add Sus or send mention:", e)
-    await role_queue.put(op())
-
-async def remove_sus_role_from_member(member: discord.Member, by_user: discord.User = None, reason: str = "Verified"):
+                    with trace.span("add_roles"):
+                        await member.add_roles(role, reason=reason)
+                    sus_members.add(member.id)
+                    trace.finish(reason=reason)
+
+                    # platforms from gateway state (cache or lean index), not a fetch_member refresh
+                    platforms_now = get_member_platforms(member.guild.get_member(member.id) or member) or snapshot
+                    spawn_background(traced(trace, "log", log_to_channel(member.guild, f"User: {member}\nServer Nickname: {member.display_name}\nID: {member.id}\nMention: <@{member.id}>\nPlatform(s): {', '.join(platforms_now)}\nAction: {reason}")))
+
+                    # moderation-visible mention (no-notify), sent with the others flagged in the same window
+                    queue_moderation_mention(member.guild, member.id, trace)
+                except Exception as e:
+                    print("Failed to add Sus:", e)
+    return await queue_role_op(op(), lane)
+
+async def remove_sus_role_from_member(member: discord.Member, by_user: discord.User = None, reason: str = "Verified", lane: str = LANE_INTERACTIVE):
+    """Queue removal of the Sus role. Returns a completion future like add_sus_role_to_member."""
     role_id = config.get("sus_role_id")
     if not role_id:
         return
-    if not any(r.id == role_id for r in member.roles):
+    if not is_sus(member):
         pop_sus_platform_snapshot(member.id)
         return
     async def op():
         role = member.guild.get_role(role_id)
+        with rest_calls.operation("sus_remove"):
+            try:
+                await member.remove_roles(role, reason=f"{reason} by {by_user if by_user else 'system'}")
+                sus_members.discard(member.id)
+                pop_sus_platform_snapshot(member.id)
+                spawn_background(log_to_channel(member.guild, f"✅\nUser: {member}\nServer Nickname: {member.display_name}\nID: {member.id}\nMention: <@{member.id}>\nPlatform(s): {', '.join(get_member_platforms(member))}\nAction: {reason} by {f'<@{by_user.id}>' if by_user else 'system'}"))
+            except Exception as e:
+                print("Failed to remove Sus:", e)
+    return await queue_role_op(op(), lane)
+
+# -------------------------
+# Verify fast path — user-triggered removal, bypasses the role queue
+# -------------------------
+# click -> Sus removed, per verification method
+verify_latency: Dict[str, Histogram] = {"button": Histogram(), "challenge": Histogram()}
+verify_slo_breaches: Dict[str, int] = {"button": 0, "challenge": 0}
+
+def interaction_member(interaction: discord.Interaction) -> discord.Member:
+    """The invoking member as sent in the interaction payload (roles as of the click, no cache or REST lookup)."""
+    if isinstance(interaction.user, discord.Member):
+        return interaction.user
+    return interaction.guild.get_member(interaction.user.id) if interaction.guild else None
+
+async def verify_member_fast(interaction: discord.Interaction, member: discord.Member, method: str, platforms: List[str] = None) -> bool:
+    """
+    Remove Sus from `member` right away for their own verify interaction. One interaction maps to one
+    role edit, so it is paced by Discord's per-interaction flow rather than by the bulk queue. Returns True
+    once the role is gone; logging runs in the background afterwards.
+    """
+    role_id = config.get("sus_role_id")
+    trace = tracer.start("verify", user_id=member.id, method=method)
+    with rest_calls.operation("verify"):
         try:
-            await member.remove_roles(role, reason=f"{reason} by {by_user if by_user else 'system'}")
-            pop_sus_platform_snapshot(member.id)
-            await log_to_channel(member.guild, f"✅\nUser: {member}\nServer Nickname: {member.display_name}\nID: {member.id}\nMention: <@{member.id}>\nPlatform(s): {', '.join(get_member_platforms(member))}\nAction: {reason} by {f'<@{by_user.id}>' if by_user else 'system'}")
+            with trace.span("remove_roles"):
+                await member.remove_roles(discord.Object(id=role_id), reason=f"Verified via {method}")
         except Exception as e:
-            print("Failed to remove Sus:", e)
-    await role_queue.put(op())
+            print("Fast verify failed:", e)
+            return False
+        sus_members.discard(member.id)
+        trace.finish()
+        elapsed = max((discord.utils.utcnow() - interaction.created_at).total_seconds(), 0.0)
+        verify_latency[method].observe(elapsed)
+        if elapsed * 1000 > config.get("verify_slo_ms", 2000):
+            verify_slo_breaches[method] += 1
+        platforms = platforms or get_member_platforms(member)
+        pop_sus_platform_snapshot(member.id)
+        spawn_background(traced(trace, "log", log_to_channel(member.guild, f"✅\nUser: {member}\nServer Nickname: {member.display_name}\nID: {member.id}\nMention: <@{member.id}>\nPlatform(s): {', '.join(platforms)}\nAction: verified via {method} ({format_seconds(elapsed)})")))
+    return True
+
+def verify_slo_report() -> str:
+    target = config.get("verify_slo_ms", 2000)
+    lines = [f"**Verify click → access** (SLO {target} ms)"]
+    for method, hist in verify_latency.items():
+        lines.append(f"`{method}` {format_summary(hist)}, over SLO {verify_slo_breaches[method]}")
+    return "\n".join(lines)
 
 async def delete_all_bot_messages_in_verify_channel(guild: discord.Guild):
     try:
-        ch = guild.get_channel(VERIFY_CHANNEL_ID) or await guild.fetch_channel(VERIFY_CHANNEL_ID)
+        ch = await resolve_channel(guild, VERIFY_CHANNEL_ID)
         if not hasattr(ch, "history"):
             return
         async for m in ch.history(limit=500):
@@ -396,7 +866,7 @@ async def send_admin_setup_prompt(guild: discord.Guild):
             print("send_admin_setup_prompt: VERIFY_CHANNEL_ID not configured (0).")
             return None
         try:
-            verify_ch = guild.get_channel(VERIFY_CHANNEL_ID) or await guild.fetch_channel(VERIFY_CHANNEL_ID)
+            verify_ch = await resolve_channel(guild, VERIFY_CHANNEL_ID)
         except Exception as e:
             print("send_admin_setup_prompt: failed to fetch verify channel:", repr(e))
             traceback.print_exc()
@@ -404,7 +874,7 @@ async def send_admin_setup_prompt(guild: discord.Guild):
         if verify_ch is None:
             print(f"send_admin_setup_prompt: verify channel (ID {VERIFY_CHANNEL_ID}) not found in guild {guild.id}.")
             return None
-        bot_member = guild.get_member(bot.user.id) or await guild.fetch_member(bot.user.id)
+        bot_member = guild.me or await guild.fetch_member(bot.user.id)
         perms = verify_ch.permissions_for(bot_member)
         if not (perms.view_channel and perms.send_messages):
             print(f"send_admin_setup_prompt: bot lacks required perms in verify channel (view/send). perms: {perms}")
@@ -456,7 +926,7 @@ class MarkSusView(discord.ui.View):
     @discord.ui.button(label="Confirm — mark as Sus", style=discord.ButtonStyle.danger, custom_id="mark_sus_confirm")
     async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
         invoker = interaction.user
-        member = interaction.guild.get_member(invoker.id) or await interaction.guild.fetch_member(invoker.id)
+        member = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
         if not is_admin_member(member):
             return await interaction.response.send_message("Only configured admins may confirm marking Sus.", ephemeral=True)
         try:
@@ -465,7 +935,7 @@ class MarkSusView(discord.ui.View):
             target = None
         if not target:
             return await interaction.response.send_message("Target member not found.", ephemeral=True)
-        await add_sus_role_to_member(target, reason=f"Marked Sus via manual scan by {invoker}")
+        await add_sus_role_to_member(target, reason=f"Marked Sus via manual scan by {invoker}", lane=LANE_INTERACTIVE)
         try:
             await interaction.response.edit_message(content=f"✅ {target.mention} has been marked Sus and logged.", view=None)
         except Exception:
@@ -494,14 +964,16 @@ class VerifyView(discord.ui.View):
     async def verify_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
         methods = config.get("verification_methods", ["button"])
-        member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(interaction.user.id)
+        member = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
         if not member:
             return await interaction.followup.send("Could not fetch your member record.", ephemeral=True)
         sus_role_id = config.get("sus_role_id")
         if methods == ["button"]:
             if sus_role_id and any(r.id == sus_role_id for r in member.roles):
-                await remove_sus_role_from_member(member, by_user=None, reason="Verified via button")
-                await interaction.followup.send("You have been verified. ✅", ephemeral=True)
+                if await verify_member_fast(interaction, member, "button"):
+                    await interaction.followup.send("You have been verified. ✅", ephemeral=True)
+                else:
+                    await interaction.followup.send("Verification could not be completed right now. Please try again in a moment.", ephemeral=True)
             else:
                 await interaction.followup.send("You are not marked for verification.", ephemeral=True)
             return
@@ -509,55 +981,220 @@ class VerifyView(discord.ui.View):
         if not enabled:
             return await interaction.followup.send("No verification methods are enabled; contact an admin.", ephemeral=True)
         chosen = random.choice(enabled)
-        key = f"{interaction.guild_id}-{interaction.user.id}"
         if chosen == "word":
             word = ''.join(secrets.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6))
-            challenge = {"type":"word","answer":word,"expires_at":(datetime.datetime.utcnow() + datetime.timedelta(minutes=5)).timestamp()}
+            answer, shown = word, word
             prompt = f"Type this exact word (private): **{word}**"
         else:
             a = random.randint(2,12); b = random.randint(2,12)
             op = random.choice(["+","*"])
             expr = f"{a} {op} {b}"
-            ans = str(a + b if op == "+" else a * b)
-            challenge = {"type":"math","answer":ans,"prompt":expr,"expires_at":(datetime.datetime.utcnow() + datetime.timedelta(minutes=5)).timestamp()}
+            answer, shown = str(a + b if op == "+" else a * b), expr
             prompt = f"Solve (private): **{expr}**"
-        challenge["platforms"] = get_member_platforms(member)
-        challenge_store[key] = challenge
-        submit = discord.ui.Button(label="Submit Answer", custom_id=f"open_modal_{interaction.user.id}", style=discord.ButtonStyle.primary)
+        token = challenge_signer.issue(interaction.guild_id, interaction.user.id, chosen, answer, shown,
+                                       platforms_to_mask(get_member_platforms(member)), ttl=CHALLENGE_TTL_SECONDS)
+        submit = discord.ui.Button(label="Submit Answer", custom_id=CHALLENGE_OPEN_PREFIX + token, style=discord.ButtonStyle.primary)
         view = discord.ui.View()
         view.add_item(submit)
         await interaction.followup.send(f"🔒 **Private challenge** — {prompt}\n\nClick **Submit Answer** to open the secure answer dialog. Your answer will be private and visible only to you.", view=view, ephemeral=True)
 
 class VerifyModal(discord.ui.Modal, title="Enter your answer (private)"):
-    answer = discord.ui.TextInput(label="Answer", style=discord.TextStyle.short, placeholder="Type your answer here", max_length=100)
-    def __init__(self, guild_id: int, user_id: int, label: str = "Answer"):
-        super().__init__()
-        self.guild_id = guild_id
-        self.user_id = user_id
+    """
+    Answer dialog for a signed challenge. The token rides in the modal's custom_id and the submit is
+    handled statelessly in on_interaction (handle_challenge_submit), so it works after a restart or on
+    another process; this object only renders the dialog.
+    """
+    answer = discord.ui.TextInput(label="Answer", custom_id="answer", style=discord.TextStyle.short, placeholder="Type your answer here", max_length=100)
+    def __init__(self, token: str, label: str = "Answer"):
+        super().__init__(timeout=CHALLENGE_TTL_SECONDS, custom_id=CHALLENGE_SUBMIT_PREFIX + token)
+        self.answer.label = label[:45]
     async def on_submit(self, interaction: discord.Interaction):
-        key = f"{self.guild_id}-{self.user_id}"
-        ch = challenge_store.get(key)
-        if not ch:
-            await interaction.response.send_message("No active challenge found or it expired. Click Verify again.", ephemeral=True)
-            return
-        if datetime.datetime.utcnow().timestamp() > ch.get("expires_at", 0):
-            challenge_store.pop(key, None)
-            await interaction.response.send_message("Challenge expired. Click Verify again to start a new one.", ephemeral=True)
-            return
-        submitted = self.answer.value.strip()
-        if submitted.lower() == str(ch["answer"]).lower():
-            guild = interaction.guild
-            member = guild.get_member(self.user_id) or await guild.fetch_member(self.user_id)
-            if not member:
-                await interaction.response.send_message("Member record not found.", ephemeral=True)
-                return
-            if config.get("sus_role_id"):
-                await remove_sus_role_from_member(member, by_user=interaction.user, reason="Verified via challenge")
-            await log_to_channel(guild, f"✅\nUser: {member}\nServer Nickname: {member.display_name}\nID: {member.id}\nMention: <@{member.id}>\nPlatform(s): {', '.join(ch.get('platforms', []))}\nAction: verified via challenge")
-            challenge_store.pop(key, None)
-            await interaction.response.send_message("✅ Correct — you are verified and can now access the server.", ephemeral=True)
-        else:
-            await interaction.response.send_message("❌ Incorrect answer. Click Verify again to try another challenge.", ephemeral=True)
+        pass
+
+def challenge_expired_message(reason: str) -> str:
+    if reason == "expired":
+        return "Challenge expired. Click Verify again to start a new one."
+    return "This challenge is not valid. Click Verify again."
+
+async def open_challenge_modal(interaction: discord.Interaction, token: str):
+    ch, reason = challenge_signer.open(token, interaction.guild_id)
+    if ch is None:
+        return await interaction.response.send_message(challenge_expired_message(reason), ephemeral=True)
+    if interaction.user.id != ch.user_id:
+        return await interaction.response.send_message("This button is not for you.", ephemeral=True)
+    label = f"Type this word: {ch.prompt}" if ch.kind == "word" else ch.prompt
+    await interaction.response.send_modal(VerifyModal(token, label))
+
+def modal_text_value(interaction: discord.Interaction, custom_id: str) -> str:
+    for row in interaction.data.get("components", []):
+        for comp in row.get("components", []):
+            if comp.get("custom_id") == custom_id:
+                return comp.get("value") or ""
+    return ""
+
+async def handle_challenge_submit(interaction: discord.Interaction, token: str):
+    # throttle before any crypto so brute-force submits are nearly free to reject
+    if not verify_throttle.allow(interaction.user.id):
+        wait = int(verify_throttle.retry_after(interaction.user.id)) + 1
+        return await interaction.response.send_message(f"Too many attempts. Try again in {wait}s.", ephemeral=True)
+    ch, reason = challenge_signer.open(token, interaction.guild_id)
+    if ch is None:
+        return await interaction.response.send_message(challenge_expired_message(reason), ephemeral=True)
+    if interaction.user.id != ch.user_id:
+        return await interaction.response.send_message("This challenge is not for you.", ephemeral=True)
+    if not challenge_signer.check_answer(ch, modal_text_value(interaction, "answer")):
+        return await interaction.response.send_message("❌ Incorrect answer. Click Verify again to try another challenge.", ephemeral=True)
+    if not used_challenges.claim(ch):
+        return await interaction.response.send_message("This challenge was already answered. Click Verify again.", ephemeral=True)
+    member = interaction_member(interaction) or await interaction.guild.fetch_member(ch.user_id)
+    if not member:
+        return await interaction.response.send_message("Member record not found.", ephemeral=True)
+    role_id = config.get("sus_role_id")
+    if not role_id or not any(r.id == role_id for r in member.roles):
+        return await interaction.response.send_message("✅ Correct — you are not marked for verification.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    if await verify_member_fast(interaction, member, "challenge", mask_to_platforms(ch.platform_mask)):
+        await interaction.followup.send("✅ Correct — you are verified and can now access the server.", ephemeral=True)
+    else:
+        await interaction.followup.send("Correct, but verification could not be completed right now. Click Verify again in a moment.", ephemeral=True)
+
+# -------------------------
+# Scan result viewer (server-side results, one page rendered at a time)
+# -------------------------
+SCAN_PAGE_SIZE = 10
+SCAN_RESULTS_MAX = 20
+SCAN_VIEW_FILTERS = {
+    "all": ("All members", lambda p: True),
+    "web_only": ("Web only", lambda p: p == ["web"]),
+    "web": ("Uses web", lambda p: "web" in p),
+    "mobile": ("Uses mobile", lambda p: "mobile" in p),
+    "desktop": ("Uses desktop", lambda p: "desktop" in p),
+    "offline": ("Offline / no presence", lambda p: not p),
+}
+
+# result id -> {"rows": [...], "label": str, "created": ts}; oldest evicted first
+scan_results: Dict[str, Dict[str, Any]] = {}
+
+def store_scan_result(rows: List[Dict[str, Any]], label: str) -> str:
+    result_id = secrets.token_hex(4)
+    scan_results[result_id] = {"rows": rows, "label": label, "created": datetime.datetime.utcnow().timestamp()}
+    while len(scan_results) > SCAN_RESULTS_MAX:
+        scan_results.pop(next(iter(scan_results)))
+    return result_id
+
+def _clip(text: str, width: int) -> str:
+    text = str(text)
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+class ScanJumpModal(discord.ui.Modal, title="Jump to page"):
+    page = discord.ui.TextInput(label="Page number", style=discord.TextStyle.short, max_length=6)
+
+    def __init__(self, view: "ScanResultsView"):
+        super().__init__(timeout=120)
+        self.results_view = view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            self.results_view.page = int(self.page.value.strip()) - 1
+        except ValueError:
+            return await interaction.response.send_message("Enter a page number.", ephemeral=True)
+        await self.results_view.refresh(interaction)
+
+class ScanResultsView(discord.ui.View):
+    """Paginator over a stored scan result; only the visible page is formatted."""
+
+    def __init__(self, result_id: str):
+        super().__init__(timeout=3600)
+        self.result_id = result_id
+        self.page = 0
+        self.filter_key = "all"
+        self._indexes: List[int] = None
+        select = discord.ui.Select(
+            placeholder="Filter by platform",
+            options=[discord.SelectOption(label=label, value=key) for key, (label, _) in SCAN_VIEW_FILTERS.items()]
+        )
+        select.callback = self.on_filter
+        self.add_item(select)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        result = scan_results.get(self.result_id)
+        return result["rows"] if result else None
+
+    def indexes(self) -> List[int]:
+        if self._indexes is None:
+            rows = self.rows() or []
+            matches = SCAN_VIEW_FILTERS[self.filter_key][1]
+            self._indexes = [i for i, r in enumerate(rows) if matches(r.get("platforms", []))]
+        return self._indexes
+
+    def render(self) -> str:
+        rows = self.rows()
+        if rows is None:
+            return "This scan result has expired. Run the scan again."
+        idx = self.indexes()
+        pages = max((len(idx) + SCAN_PAGE_SIZE - 1) // SCAN_PAGE_SIZE, 1)
+        self.page = min(max(self.page, 0), pages - 1)
+        label = scan_results[self.result_id]["label"]
+        lines = [
+            f"**{label}** — {len(rows)} members, filter: {SCAN_VIEW_FILTERS[self.filter_key][0]} ({len(idx)}) — page {self.page + 1}/{pages}",
+            "user | server nickname | id | mention | platform(s)"
+        ]
+        for i in idx[self.page * SCAN_PAGE_SIZE:(self.page + 1) * SCAN_PAGE_SIZE]:
+            r = rows[i]
+            change = f"{r['change']} " if r.get("change") else ""
+            lines.append(f"{change}{_clip(r['tag'], 32)} | {_clip(r['displayName'], 24)} | {r['userId']} | <@{r['userId']}> | {', '.join(r.get('platforms', [])) or 'offline'}")
+        if not idx:
+            lines.append("(no members match this filter)")
+        return "\n".join(lines)
+
+    async def refresh(self, interaction: discord.Interaction):
+        await interaction.response.edit_message(content=self.render(), view=self, allowed_mentions=discord.AllowedMentions.none())
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        member = interaction_member(interaction)
+        if not is_admin_member(member):
+            await interaction.response.send_message("Only configured admins can browse scan results.", ephemeral=True)
+            return False
+        return True
+
+    async def on_filter(self, interaction: discord.Interaction):
+        self.filter_key = (interaction.data.get("values") or ["all"])[0]
+        self._indexes = None
+        self.page = 0
+        await self.refresh(interaction)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await self.refresh(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await self.refresh(interaction)
+
+    @discord.ui.button(label="Jump…", style=discord.ButtonStyle.secondary)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(ScanJumpModal(self))
+
+    @discord.ui.button(label="Export CSV", style=discord.ButtonStyle.primary)
+    async def export_csv(self, interaction: discord.Interaction, button: discord.ui.Button):
+        rows = self.rows()
+        if rows is None:
+            return await interaction.response.send_message("This scan result has expired.", ephemeral=True)
+        csv_path = create_csv_for_scan([rows[i] for i in self.indexes()])
+        try:
+            await interaction.response.send_message(file=discord.File(csv_path), ephemeral=True)
+        finally:
+            try:
+                os.remove(csv_path)
+            except Exception:
+                pass
+
+async def post_scan_results(guild: discord.Guild, rows: List[Dict[str, Any]], label: str) -> bool:
+    """Store a bulk result and post one paginated viewer message to the log channel."""
+    view = ScanResultsView(store_scan_result(rows, label))
+    return await log_to_channel(guild, view.render(), view=view)
 
 # -------------------------
 # Interactive setup flow
@@ -625,7 +1262,7 @@ async def start_interactive_setup(invoker_member: discord.Member, channel: disco
                     config["verify_message_id"] = None
                     config["admin_prompt_message_id"] = None
                     await ensure_sus_role_and_overwrites(invoker_member.guild)
-                    verify_ch = invoker_member.guild.get_channel(VERIFY_CHANNEL_ID) or await invoker_member.guild.fetch_channel(VERIFY_CHANNEL_ID)
+                    verify_ch = await resolve_channel(invoker_member.guild, VERIFY_CHANNEL_ID)
                     if verify_ch and hasattr(verify_ch, "send"):
                         try:
                             m = await verify_ch.send(build_persistent_verify_text(), view=VerifyView())
@@ -664,31 +1301,27 @@ async def start_interactive_setup(invoker_member: discord.Member, channel: disco
 @bot.event
 async def on_interaction(interaction: discord.Interaction):
     try:
+        if interaction.type == discord.InteractionType.modal_submit:
+            cid = interaction.data.get("custom_id", "")
+            # signed challenge answer (stateless; any process with the key can handle it)
+            if cid.startswith(CHALLENGE_SUBMIT_PREFIX):
+                return await handle_challenge_submit(interaction, cid[len(CHALLENGE_SUBMIT_PREFIX):])
         if interaction.type == discord.InteractionType.component:
             cid = interaction.data.get("custom_id", "")
             # handle modal opener
+            if cid.startswith(CHALLENGE_OPEN_PREFIX):
+                return await open_challenge_modal(interaction, cid[len(CHALLENGE_OPEN_PREFIX):])
+            # buttons from before signed challenges
             if cid.startswith("open_modal_"):
-                try:
-                    target_uid = int(cid.split("_")[-1])
-                except Exception:
-                    return await interaction.response.send_message("Invalid button target.", ephemeral=True)
-                if interaction.user.id != target_uid:
-                    return await interaction.response.send_message("This button is not for you.", ephemeral=True)
-                key = f"{interaction.guild_id}-{interaction.user.id}"
-                ch = challenge_store.get(key)
-                if not ch:
-                    return await interaction.response.send_message("No active challenge found. Click Verify again.", ephemeral=True)
-                modal = VerifyModal(interaction.guild_id, interaction.user.id)
-                modal.answer.label = (ch.get("prompt") or ("Type this word: "+ch.get("answer")))[:100]
-                return await interaction.response.send_modal(modal)
+                return await interaction.response.send_message(challenge_expired_message("expired"), ephemeral=True)
 
             # handle configure verification button
             if cid == "init_setup":
-                member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(interaction.user.id)
+                member = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
                 if not is_admin_member(member):
                     return await interaction.response.send_message("You are not allowed to configure verification.", ephemeral=True)
                 await interaction.response.defer(ephemeral=True)
-                verify_ch = interaction.guild.get_channel(VERIFY_CHANNEL_ID) or await interaction.guild.fetch_channel(VERIFY_CHANNEL_ID)
+                verify_ch = await resolve_channel(interaction.guild, VERIFY_CHANNEL_ID)
                 await start_interactive_setup(member, verify_ch, sent_message=interaction.message)
                 return
     except Exception as e:
@@ -708,18 +1341,22 @@ async def on_member_join(member: discord.Member):
     - Ignore bots
     - Only act for configured GUILD_ID
     - Wait a short time for presence/cache to settle, then fetch a fresh member
-    - Use get_member_platforms() and, if platforms == ['web'], queue add_sus_role_to_member()
+    - Use get_member_platforms() and, if the detection rule matches, queue add_sus_role_to_member()
     """
     try:
         if member.bot:
             return
         if member.guild.id != GUILD_ID:
             return
+        note_join_for_cohorts(member.guild)
+        bump_scan_generation()
+        trace = tracer.start("join_to_sus", user_id=member.id)
 
         print(f"on_member_join: {member} joined guild {member.guild.id}. Starting quick auto-scan...")
 
         # small delay to give Discord a moment to populate presence/client_status
-        await asyncio.sleep(2)
+        with trace.span("presence_settle"):
+            await asyncio.sleep(2)
 
         # ensure sus role exists & channel overwrites are prepared
         try:
@@ -728,131 +1365,580 @@ async def on_member_join(member: discord.Member):
         except Exception as e:
             print("on_member_join: ensure_sus_role_and_overwrites error:", e)
 
-        # fetch a fresh member object
-        try:
-            fetched = member.guild.get_member(member.id) or await member.guild.fetch_member(member.id)
-        except Exception:
-            fetched = member
+        # the gateway keeps the cached member (and, in lean mode, the index) current; no REST refetch
+        with trace.span("member_resolve"):
+            fetched = member.guild.get_member(member.id) or member
 
         # check platforms; use cache snapshot fallback if available
-        platforms = get_member_platforms(fetched)
+        with trace.span("detect"):
+            platforms = get_member_platforms(fetched)
+            record_presence(fetched, platforms)
+            candidate = is_sus_candidate(fetched, platforms)
         print(f"on_member_join: platforms for {member.id}: {platforms}")
 
-        # If platforms list is exactly ['web'], mark Sus (queue the operation).
-        if isinstance(platforms, list) and len(platforms) == 1 and platforms[0] == "web":
-            print(f"on_member_join: {member} appears web-only — queuing Sus role")
+        # If the detection rule matches (default: platforms exactly ['web']), mark Sus (queue the operation).
+        if candidate:
+            print(f"on_member_join: {member} matches detection rule — queuing Sus role")
             # schedule operation and do not block the join event
-            asyncio.create_task(add_sus_role_to_member(fetched, reason="Detected web-only on join"))
+            asyncio.create_task(add_sus_role_to_member(fetched, reason="Detected web-only on join", trace=trace))
     except Exception as e:
         print("on_member_join error:", e)
         traceback.print_exc()
 
+# -------------------------
+# Presence history (transition ring buffers)
+# -------------------------
+def record_presence(member: discord.Member, platforms: List[str] = None):
+    try:
+        if member.bot:
+            return
+        if platforms is None:
+            platforms = get_member_platforms(member)
+        presence_history.record(member.id, platforms_to_mask(platforms), datetime.datetime.utcnow().timestamp())
+    except Exception as e:
+        print("record_presence error:", e)
+
+@bot.event
+async def on_presence_update(before: discord.Member, after: discord.Member):
+    if after.guild.id != GUILD_ID or LEAN_MODE:   # lean mode handles presences in the gateway tap
+        return
+    # status/activity-only updates leave the platforms (and so scan results and the rule inputs) unchanged
+    platforms = get_member_platforms(after)
+    if set(platforms) == set(get_member_platforms(before)):
+        return
+    record_presence(after, platforms)
+    mark_autoscan_dirty(after)
+    bump_scan_generation()
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if after.guild.id != GUILD_ID or LEAN_MODE:
+        return
+    bump_scan_generation()
+    if before.roles != after.roles:
+        update_sus_membership(after.id, {r.id for r in after.roles})
+        mark_autoscan_dirty(after)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    if member.guild.id != GUILD_ID or LEAN_MODE:
+        return
+    presence_history.forget(member.id)
+    autoscan_dirty.discard(member.id)
+    sus_members.discard(member.id)
+    bump_scan_generation()
+
+# -------------------------
+# Lean mode — compact member index fed straight from gateway payloads
+# -------------------------
+# With MemberCacheFlags.none() discord.py drops presence/member updates for members it does not
+# cache, so on_presence_update / on_member_update never fire for them. Instead the raw payloads
+# are read before discord.py parses them, and only the fields the detector needs are kept.
+def _payload_mask(client_status: Dict[str, str]) -> int:
+    return platforms_to_mask(k for k, v in (client_status or {}).items() if v and v != "offline")
+
+def index_member_payload(data: Dict[str, Any]) -> int:
+    user = data.get("user") or {}
+    uid = int(user["id"])
+    joined = _iso_to_ts(data["joined_at"]) if data.get("joined_at") else None
+    member_index.upsert(uid, joined, [int(r) for r in data.get("roles", [])], bool(user.get("bot")))
+    return uid
+
+def index_presence_payload(data: Dict[str, Any], now_ts: float):
+    uid = int(data["user"]["id"])
+    mask = _payload_mask(data.get("client_status"))
+    previous = member_index.set_mask(uid, mask)
+    if previous is None or previous == mask:   # not a member we know of, or nothing changed
+        return
+    rec = member_index.get(uid)
+    if rec.bot:
+        return
+    presence_history.record(uid, mask, now_ts)
+    if config.get("autoscan_enabled"):
+        autoscan_dirty.add(uid)
+    bump_scan_generation()
+
+def lean_guild_create(data: Dict[str, Any]):
+    now_ts = datetime.datetime.utcnow().timestamp()
+    for m in data.get("members", []):
+        index_member_payload(m)
+    for p in data.get("presences", []):
+        index_presence_payload(p, now_ts)
+
+def lean_member_update(data: Dict[str, Any]):
+    uid = int(data["user"]["id"])
+    before = member_index.roles(uid)
+    index_member_payload(data)
+    update_sus_membership(uid, member_index.roles(uid))
+    bump_scan_generation()
+    if before is not None and before != member_index.roles(uid) and config.get("autoscan_enabled") and not data["user"].get("bot"):
+        autoscan_dirty.add(uid)
+
+def lean_member_remove(data: Dict[str, Any]):
+    uid = int(data["user"]["id"])
+    member_index.remove(uid)
+    presence_history.forget(uid)
+    autoscan_dirty.discard(uid)
+    sus_members.discard(uid)
+    bump_scan_generation()
+
+def install_lean_gateway_taps():
+    """Wrap discord.py's raw event parsers so the index sees every payload for our guild first."""
+    parsers = bot._connection.parsers
+    taps = {
+        "GUILD_CREATE": lean_guild_create,
+        "GUILD_MEMBERS_CHUNK": lean_guild_create,
+        "GUILD_MEMBER_ADD": index_member_payload,
+        "GUILD_MEMBER_UPDATE": lean_member_update,
+        "GUILD_MEMBER_REMOVE": lean_member_remove,
+        "PRESENCE_UPDATE": lambda data: index_presence_payload(data, datetime.datetime.utcnow().timestamp()),
+    }
+
+    def wrap(event, handler, original):
+        def parse(data):
+            try:
+                if int(data.get("guild_id") or data.get("id") or 0) == GUILD_ID:
+                    handler(data)
+            except Exception as e:
+                print(f"lean tap {event} error:", e)
+            return original(data)
+        return parse
+
+    for event, handler in taps.items():
+        if event in parsers:
+            parsers[event] = wrap(event, handler, parsers[event])
+
+def install_gateway_recorder():
+    """Record every replayable gateway event for our guild before discord.py (and the lean taps) parse it."""
+    global gateway_recorder
+    directory = Path(GATEWAY_RECORD_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"gateway_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.log.gz"
+    header = {
+        "lean": LEAN_MODE, "verify_channel_id": VERIFY_CHANNEL_ID, "sus_log_channel_id": SUS_LOG_CHANNEL_ID,
+        "sus_chat_channel_id": SUS_CHAT_CHANNEL_ID, "admin_role_ids": ADMIN_ROLE_IDS, "config": config,
+    }
+    gateway_recorder = GatewayRecorder(path, GUILD_ID, header, max_bytes=GATEWAY_RECORD_MAX_MB * 1024 * 1024)
+    parsers = bot._connection.parsers
+
+    def wrap(event, original):
+        def parse(data):
+            try:
+                gateway_recorder.record(event, data)
+            except Exception as e:
+                print(f"gateway recorder {event} error:", e)
+            return original(data)
+        return parse
+
+    for event in EVENT_CODES:
+        if event in parsers:
+            parsers[event] = wrap(event, parsers[event])
+    print(f"Recording gateway events to {path}")
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except Exception:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+    except Exception:
+        return 0.0
+
+def memory_structures(guild: discord.Guild = None) -> List[tuple]:
+    """(name, entries, approximate bytes) for each long-lived structure; bytes None when not measured."""
+    state = bot._connection
+    skip = (state, guild, bot)   # every discord.py model links back to these
+    rows = []
+    def add(name: str, entries: int, obj: Any):
+        try:
+            rows.append((name, entries, approx_size(obj, exclude=skip)))
+        except Exception as e:
+            print(f"memory report: sizing {name} failed:", e)
+            rows.append((name, entries, None))
+    if guild:
+        add("discord.py members", len(guild.members), getattr(guild, "_members", {}))
+    add("discord.py users", len(bot.users), getattr(state, "_users", {}))
+    messages = getattr(state, "_messages", None) or ()
+    add("discord.py messages", len(messages), messages)
+    if LEAN_MODE:
+        add("member index", len(member_index), member_index)
+    add("Sus platform cache", len(sus_platform_cache), sus_platform_cache)
+    add("presence history", len(presence_history), presence_history)
+    add("Sus members", len(sus_members), sus_members)
+    add("role queue", len(role_pipeline), role_pipeline)
+    add("verify throttle", len(verify_throttle), verify_throttle)
+    add("used challenges", len(used_challenges), used_challenges)
+    add("scan cache", len(scan_cache), scan_cache)
+    add("scan results", len(scan_results), scan_results)
+    add("scan jobs", len(scan_jobs), scan_jobs)
+    add("bulk jobs", len(bulk_jobs), bulk_jobs)
+    add("autoscan dirty", len(autoscan_dirty), autoscan_dirty)
+    add("recent joins", len(recent_joins), recent_joins)
+    add("fetched channels", len(fetched_channels), fetched_channels)
+    add("REST counters", sum(len(r) for r in rest_calls.calls.values()), rest_calls.calls)
+    add("background tasks", len(background_tasks), background_tasks)
+    return rows
+
+def task_census(limit: int = 6) -> str:
+    """Pending asyncio tasks grouped by coroutine, to spot leftover coroutines piling up."""
+    counts: Dict[str, int] = {}
+    for task in asyncio.all_tasks():
+        name = task.get_name()
+        if name.startswith("Task-"):   # unnamed: group by coroutine instead
+            coro = task.get_coro()
+            name = getattr(coro, "__qualname__", None) or type(coro).__name__
+        counts[name] = counts.get(name, 0) + 1
+    top = sorted(counts.items(), key=lambda kv: -kv[1])[:limit]
+    return f"asyncio tasks: {sum(counts.values())} (" + ", ".join(f"{name} {n}" for name, n in top) + ")"
+
+def member_memory_report(guild: discord.Guild = None, markdown: bool = True) -> str:
+    mode = "lean" if LEAN_MODE else "full member cache"
+    table = [f"{'structure':<22}{'entries':>10}{'~size':>11}"]
+    for name, entries, nbytes in memory_structures(guild):
+        table.append(f"{name:<22}{entries:>10}{format_bytes(nbytes) if nbytes is not None else '?':>11}")
+    head = [f"Memory ({mode}{', slash-only' if SLASH_ONLY else ''})",
+            f"RSS {rss_mb():.1f} MB (at startup {startup_rss_mb:.1f} MB); {heap_tracker.status()}",
+            task_census()]
+    if markdown:
+        return "\n".join([f"**{head[0]}**"] + head[1:] + ["```"] + table + ["```"])
+    return "\n".join(head + table)
+
+def heap_diff_reply(rebase: bool = False) -> tuple:
+    """(reply text, diff file path or None) for `!mem diff` / `/diag report:heap`."""
+    if heap_tracker.baseline is None:
+        return heap_tracker.snapshot() + ". Run the diff again later to see what grew.", None
+    try:
+        path, top = heap_tracker.diff(rebase=rebase)
+    except Exception as e:
+        return f"Heap diff failed: {e}", None
+    return f"Heap diff written to `{path}`\n```\n" + "\n".join(top)[:1700] + "\n```", path
+
+async def memory_report_loop():
+    """Print the memory report (and a heap diff while tracemalloc runs) every `memory_report_minutes`."""
+    while True:
+        minutes = float(config.get("memory_report_minutes", 60) or 0)
+        await asyncio.sleep(max(minutes, 1.0) * 60)
+        if minutes <= 0:
+            continue
+        try:
+            print("[memory] " + member_memory_report(bot.get_guild(GUILD_ID), markdown=False))
+            if heap_tracker.baseline is not None:
+                path, top = heap_tracker.diff()
+                print(f"[memory] heap diff vs baseline: {top[0]} ({path})")
+        except Exception as e:
+            print("memory report failed:", e)
+
 # -------------------------
 # Scanning & perform_scan (with snapshot fallback)
 # -------------------------
+SCAN_DURATIONS = {
+    "last_hour": 3600,
+    "last_day": 86400,
+    "last_week": 86400*7,
+    "last_month": 86400*30
+}
+SCAN_FETCH_PAGE_SIZE = 1000      # members per page when the cache is cold
+SCAN_FETCH_PREFETCH_PAGES = 1    # pages fetched ahead while the current page is processed
+SCAN_FETCH_MAX_RETRIES = 3
+
+class ScanIncomplete(RuntimeError):
+    """A streamed scan lost the member fetch part-way; its rows cover only part of the guild."""
+
+def _iso_to_ts(value: str):
+    try:
+        return datetime.datetime.fromisoformat(value).replace(tzinfo=datetime.timezone.utc).timestamp()
+    except Exception:
+        return None
+
+def scan_join_bounds(duration: str = None, start_iso: str = None, end_iso: str = None, now_ts: float = None):
+    """
+    Resolve scan filters once into (lower, upper) joined-at timestamps.
+    Returns None when no join filter is active.
+    """
+    if not (duration or start_iso or end_iso):
+        return None
+    now_ts = now_ts or datetime.datetime.utcnow().timestamp()
+    lower = float("-inf")
+    upper = float("inf")
+    if duration and SCAN_DURATIONS.get(duration):
+        lower = now_ts - SCAN_DURATIONS[duration]
+    if start_iso:
+        ts = _iso_to_ts(start_iso)
+        if ts is not None:
+            lower = max(lower, ts)
+    if end_iso:
+        ts = _iso_to_ts(end_iso)
+        if ts is not None:
+            upper = min(upper, ts)
+    return (lower, upper)
+
+def member_matches_join_bounds(m: discord.Member, bounds) -> bool:
+    if bounds is None:
+        return True
+    if not m.joined_at:
+        return False
+    jd = m.joined_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return bounds[0] <= jd <= bounds[1]
+
+def build_scan_row(m: discord.Member, now_ts: float) -> Dict[str, Any]:
+    if LEAN_MODE and m.id not in member_index:
+        member_index.upsert(m.id, m.joined_at.replace(tzinfo=datetime.timezone.utc).timestamp() if m.joined_at else None,
+                            [r.id for r in m.roles if not r.is_default()], m.bot)
+    platforms = get_member_platforms(m) or recent_sus_platform_snapshot(m.id, now_ts)
+    return {
+        "userId": m.id,
+        "tag": str(m),
+        "displayName": m.display_name,
+        "platforms": platforms,
+        "joinedAt": m.joined_at.isoformat() if m.joined_at else ""
+    }
+
+async def iter_member_pages(guild: discord.Guild, page_size: int = SCAN_FETCH_PAGE_SIZE, after: int = None):
+    """
+    Fetch guild members via the API and yield them page by page.
+
+    A producer task fetches the next page while the caller works on the current one; at most
+    SCAN_FETCH_PREFETCH_PAGES pages are buffered, so memory stays bounded by page size rather
+    than guild size. Members arrive in ascending id order and the last id handed out is kept
+    as a cursor: a failed fetch resumes after it instead of starting over. Pass `after`
+    (a member id) to resume a previous walk.
+    """
+    pages: asyncio.Queue = asyncio.Queue(maxsize=SCAN_FETCH_PREFETCH_PAGES)
+
+    async def producer():
+        cursor = after
+        page: List[discord.Member] = []
+        retries = 0
+        while True:
+            try:
+                kwargs = {"limit": None}
+                if cursor:
+                    kwargs["after"] = discord.Object(id=cursor)
+                async for m in guild.fetch_members(**kwargs):
+                    page.append(m)
+                    cursor = m.id
+                    if len(page) >= page_size:
+                        await pages.put(page)
+                        page = []
+                        retries = 0
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                retries += 1
+                if retries > SCAN_FETCH_MAX_RETRIES:
+                    await pages.put(e)
+                    return
+                print(f"iter_member_pages: fetch failed after id {cursor} ({e!r}); retry {retries}/{SCAN_FETCH_MAX_RETRIES}")
+                await asyncio.sleep(retries)
+        if page:
+            await pages.put(page)
+        await pages.put(None)
+
+    task = asyncio.create_task(producer())
+    try:
+        while True:
+            item = await pages.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+
 async def perform_scan(guild: discord.Guild, member: discord.Member = None, duration: str = None, start_iso: str = None, end_iso: str = None):
+    if member:   # one member from gateway state: no REST calls, not counted as a scan run
+        return await _perform_scan(guild, member=member)
+    # scoped, so the caller's later REST calls (autoscan adds, replies, job steps) are not charged to "scan"
+    with rest_calls.operation("scan"):
+        return await _perform_scan(guild, duration=duration, start_iso=start_iso, end_iso=end_iso)
+
+async def _perform_scan(guild: discord.Guild, member: discord.Member = None, duration: str = None, start_iso: str = None, end_iso: str = None):
     rows = []
     print(f"perform_scan: start (member={'YES' if member else 'BULK'}, duration={duration}, start={start_iso}, end={end_iso})")
+    now_ts = datetime.datetime.utcnow().timestamp()
     if member:
         try:
-            platforms = get_member_platforms(member)
-            if not platforms:
-                snap = sus_platform_cache.get(str(member.id))
-                if snap and (datetime.datetime.utcnow().timestamp() - float(snap.get("ts", 0)) < 86400):
-                    platforms = snap.get("platforms", [])
-            rows.append({
-                "userId": member.id,
-                "tag": str(member),
-                "displayName": member.display_name,
-                "platforms": platforms,
-                "joinedAt": member.joined_at.isoformat() if member.joined_at else ""
-            })
+            rows.append(build_scan_row(member, now_ts))
         except Exception as e:
             print("perform_scan single-member error:", e)
             traceback.print_exc()
         print(f"perform_scan: single-member result rows={len(rows)}")
         return rows
 
-    members_list: List[discord.Member] = []
+    bounds = scan_join_bounds(duration, start_iso, end_iso, now_ts)
+
+    def scan_page(members) -> int:
+        seen = 0
+        for m in members:
+            try:
+                seen += 1
+                if m.bot or not member_matches_join_bounds(m, bounds):
+                    continue
+                # fetched members carry no presence; prefer the cached object when there is one
+                cached = guild.get_member(m.id)
+                rows.append(build_scan_row(cached or m, now_ts))
+            except Exception as exc:
+                print("perform_scan: error processing member", getattr(m, "id", "<unknown>"), exc)
+                traceback.print_exc()
+        return seen
+
     try:
         cached_count = len(guild.members)
     except Exception:
         cached_count = 0
 
-    if cached_count and cached_count > 1:
-        members_list = list(guild.members)
-        print(f"perform_scan: using cached guild.members (count={len(members_list)})")
+    if cached_count and cached_count > 1 and not LEAN_MODE:
+        print(f"perform_scan: using cached guild.members (count={cached_count})")
+        scan_page(guild.members)
     else:
-        print("perform_scan: guild.members cache empty or small; fetching members via API.")
+        print("perform_scan: guild.members cache empty or small; streaming members via API.")
+        seen = 0
         try:
-            members_list = [m async for m in guild.fetch_members(limit=None)]
-            print(f"perform_scan: fetched members count={len(members_list)}")
+            async for page in iter_member_pages(guild):
+                seen += scan_page(page)
+            print(f"perform_scan: fetched members count={seen}")
         except Exception as e:
             print("perform_scan: fetch_members failed:", e)
             traceback.print_exc()
+            if seen:
+                # a truncated member list must not pass for a finished scan (cache, baseline, archive)
+                raise ScanIncomplete(f"member fetch failed after {seen} members: {e}") from e
             try:
-                members_list = list(guild.members)
-                print(f"perform_scan: fallback to cached members count={len(members_list)})")
+                seen = scan_page(list(guild.members))
+                print(f"perform_scan: fallback to cached members count={seen})")
             except Exception:
-                members_list = []
-
-    if not members_list:
-        print("perform_scan: no members available to scan.")
-        return rows
+                pass
+        if not seen:
+            print("perform_scan: no members available to scan.")
+            return rows
 
-    now_ts = datetime.datetime.utcnow().timestamp()
-    for m in members_list:
-        try:
-            if m.bot:
-                continue
-            include = True
-            if duration or start_iso or end_iso:
-                if not m.joined_at:
-                    include = False
-                else:
-                    jd = m.joined_at.replace(tzinfo=datetime.timezone.utc).timestamp()
-                    if duration:
-                        mapping = {
-                            "last_hour": 3600,
-                            "last_day": 86400,
-                            "last_week": 86400*7,
-                            "last_month": 86400*30
-                        }
-                        ms = mapping.get(duration)
-                        if ms and jd < (now_ts - ms):
-                            include = False
-                    if start_iso:
-                        try:
-                            if jd < datetime.datetime.fromisoformat(start_iso).replace(tzinfo=datetime.timezone.utc).timestamp():
-                                include = False
-                        except Exception:
-                            pass
-                    if end_iso:
-                        try:
-                            if jd > datetime.datetime.fromisoformat(end_iso).replace(tzinfo=datetime.timezone.utc).timestamp():
-                                include = False
-                        except Exception:
-                            pass
-            if not include:
-                continue
-            platforms = get_member_platforms(m)
-            if not platforms:
-                snap = sus_platform_cache.get(str(m.id))
-                if snap and (now_ts - float(snap.get("ts", 0)) < 86400):
-                    platforms = snap.get("platforms", [])
-            rows.append({
-                "userId": m.id,
-                "tag": str(m),
-                "displayName": m.display_name,
-                "platforms": platforms,
-                "joinedAt": m.joined_at.isoformat() if m.joined_at else ""
-            })
-        except Exception as exc:
-            print("perform_scan: error processing member", getattr(m, "id", "<unknown>"), exc)
-            traceback.print_exc()
     print(f"perform_scan: complete, matched rows={len(rows)}")
     return rows
 
+# -------------------------
+# Bulk scan result cache + single-flight
+# -------------------------
+# bumped on every presence/membership change; cached scans from an older generation are stale
+scan_generation: int = 0
+# (guild id, duration, start, end) -> (generation, completed ts, rows)
+scan_cache: Dict[tuple, tuple] = {}
+scan_inflight: Dict[tuple, asyncio.Future] = {}
+
+def scan_key(guild: discord.Guild, duration: str = None, start_iso: str = None, end_iso: str = None) -> tuple:
+    return (guild.id, duration, start_iso, end_iso)
+
+def bump_scan_generation():
+    global scan_generation
+    scan_generation += 1
+
+async def cached_scan(guild: discord.Guild, duration: str = None, start_iso: str = None, end_iso: str = None):
+    """
+    Bulk perform_scan with result reuse. Returns (rows, fresh).
+
+    `fresh` is False when the rows come from the cache (nothing relevant changed and the
+    entry is younger than scan_cache_ttl_seconds) or from an identical scan that was
+    already running; in both cases another caller has already logged them.
+    """
+    key = scan_key(guild, duration, start_iso, end_iso)
+    now_ts = datetime.datetime.utcnow().timestamp()
+    hit = scan_cache.get(key)
+    if hit and hit[0] == scan_generation and now_ts - hit[1] < float(config.get("scan_cache_ttl_seconds", 300)):
+        print(f"cached_scan: cache hit for {key} (generation {scan_generation})")
+        return hit[2], False
+    pending = scan_inflight.get(key)
+    if pending is not None:
+        print(f"cached_scan: joining in-flight scan for {key}")
+        return await asyncio.shield(pending), False
+
+    future = asyncio.get_running_loop().create_future()
+    scan_inflight[key] = future
+    generation = scan_generation
+    try:
+        rows = await perform_scan(guild, duration=duration, start_iso=start_iso, end_iso=end_iso)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody joined
+        raise
+    finally:
+        scan_inflight.pop(key, None)
+    future.set_result(rows)
+    scan_cache.pop(key, None)
+    scan_cache[key] = (generation, datetime.datetime.utcnow().timestamp(), rows)
+    while len(scan_cache) > max(int(config.get("scan_cache_max_entries", 8)), 1):
+        scan_cache.pop(next(iter(scan_cache)))
+    return rows, True
+
+# -------------------------
+# Scan baselines & diff mode
+# -------------------------
+def scan_baseline_path(key: tuple) -> Path:
+    return SCAN_BASELINE_DIR / f"scan_{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}.bin"
+
+def load_scan_baseline(key: tuple):
+    try:
+        path = scan_baseline_path(key)
+        return PlatformSnapshotStore.from_bytes(path.read_bytes()) if path.exists() else None
+    except Exception as e:
+        print("load_scan_baseline error:", e)
+        return None
+
+async def save_scan_baseline(key: tuple, rows: List[Dict[str, Any]]):
+    """Remember this scan (id -> platform mask) as the baseline for the next diff with the same filter."""
+    try:
+        now_ts = datetime.datetime.utcnow().timestamp()
+        store = PlatformSnapshotStore.from_items((int(r["userId"]), platforms_to_mask(r.get("platforms", [])), now_ts) for r in rows)
+        SCAN_BASELINE_DIR.mkdir(exist_ok=True)
+        await asyncio.to_thread(store.save, scan_baseline_path(key))
+    except Exception as e:
+        print("save_scan_baseline error:", e)
+
+async def archive_scan(rows: List[Dict[str, Any]], label: str):
+    """Append a bulk scan to the binary archive (query offline with query_archive.py)."""
+    try:
+        items = [(int(r["userId"]), platforms_to_mask(r.get("platforms", []))) for r in rows]
+        ts = datetime.datetime.utcnow().timestamp()
+        await asyncio.to_thread(ScanArchive(SCAN_ARCHIVE_DIR).append, ts, items, label)
+    except Exception as e:
+        print("archive_scan error:", e)
+
+async def log_scan_diff(guild: discord.Guild, rows: List[Dict[str, Any]], previous) -> str:
+    """Post only members who appeared, disappeared or changed platforms since `previous`; returns a reply summary."""
+    if previous is None:
+        return "No previous scan with this filter — stored this one as the baseline for the next diff."
+    by_id = {int(r["userId"]): r for r in rows}
+    current = PlatformSnapshotStore.from_items((uid, platforms_to_mask(r.get("platforms", [])), 0.0) for uid, r in by_id.items())
+    since = max((snap.ts for snap in previous), default=0.0)
+    since_text = datetime.datetime.utcfromtimestamp(since).strftime("%Y-%m-%d %H:%M UTC") if since else "unknown"
+    diff_rows = []
+    appeared = disappeared = changed = 0
+    for uid, old_mask, new_mask in diff_stores(previous, current):
+        if old_mask is None:
+            appeared += 1
+            diff_rows.append(dict(by_id[uid], change="+"))
+        elif new_mask is None:
+            disappeared += 1
+            diff_rows.append({"userId": uid, "tag": "(not in this scan)", "displayName": "", "platforms": mask_to_platforms(old_mask), "joinedAt": "", "change": "-"})
+        else:
+            changed += 1
+            diff_rows.append(dict(by_id[uid], change=f"~ was {', '.join(mask_to_platforms(old_mask)) or 'offline'} →"))
+    summary = f"Scan diff vs {since_text}: +{appeared} appeared, -{disappeared} disappeared, ~{changed} changed ({len(rows)} members scanned)."
+    if not diff_rows:
+        return summary
+    await post_scan_results(guild, diff_rows, summary)
+    return summary + " Changes posted to the log channel."
+
 def create_csv_for_scan(rows: List[Dict[str,Any]]) -> str:
     fname = f"scan_{int(datetime.datetime.utcnow().timestamp())}.csv"
     with open(fname, "w", newline='', encoding="utf-8") as f:
@@ -862,7 +1948,522 @@ def create_csv_for_scan(rows: List[Dict[str,Any]]) -> str:
             writer.writerow([r["userId"], r["tag"], r["displayName"], "|".join(r.get("platforms",[])), r.get("joinedAt","")])
     return fname
 
+# -------------------------
+# Scan jobs (bulk scans run in the background under a concurrency cap)
+# -------------------------
+SCAN_JOBS_KEEP_FINISHED = 20
+SCAN_JOBS_KEEP_RESULTS = 3
+
+# job id -> state dict (in memory; a scan is cheap to rerun, so jobs are not persisted)
+scan_jobs: Dict[str, Dict[str, Any]] = {}
+scan_job_tasks: Dict[str, asyncio.Task] = {}
+# job id -> callbacks that deliver the outcome text to whoever asked (reply / followup / DM)
+scan_job_watchers: Dict[str, List[Any]] = {}
+scan_job_slots: asyncio.Semaphore = None
+
+def start_scan_job(guild: discord.Guild, invoker_id: int, notify, duration: str = None, start_iso: str = None,
+                   end_iso: str = None, diff: bool = False, apply_sus: bool = False) -> tuple:
+    """
+    Queue a bulk scan. Returns (job, created); an identical queued/running job is shared instead of
+    starting another one, and `notify` is added to its watchers.
+    """
+    global scan_job_slots
+    if scan_job_slots is None:
+        scan_job_slots = asyncio.Semaphore(max(int(config.get("scan_max_concurrent", 1)), 1))
+    for job in scan_jobs.values():
+        if (job["status"] in ("queued", "running") and job["guild_id"] == guild.id
+                and (job["duration"], job["start"], job["end"], job["diff"], job["apply"]) == (duration, start_iso, end_iso, diff, apply_sus)):
+            scan_job_watchers[job["id"]].append(notify)
+            return job, False
+    job_id = secrets.token_hex(3)
+    label = f"Bulk scan ({duration or 'all members'}{f', from {start_iso}' if start_iso else ''}{f', to {end_iso}' if end_iso else ''})"
+    job = {
+        "id": job_id, "guild_id": guild.id, "invoker_id": invoker_id, "label": label,
+        "duration": duration, "start": start_iso, "end": end_iso, "diff": diff, "apply": apply_sus,
+        "status": "queued", "created": datetime.datetime.utcnow().timestamp(), "started": None, "finished": None,
+        "members": 0, "summary": "", "rows": None
+    }
+    scan_jobs[job_id] = job
+    scan_job_watchers[job_id] = [notify]
+    scan_job_tasks[job_id] = asyncio.create_task(run_scan_job(job_id))
+    prune_scan_jobs()
+    return job, True
+
+def prune_scan_jobs():
+    finished = [j for j in scan_jobs.values() if j["status"] in ("done", "failed", "cancelled")]
+    for job in finished[:-SCAN_JOBS_KEEP_FINISHED]:
+        scan_jobs.pop(job["id"], None)
+    for job in [j for j in finished if j["rows"] is not None][:-SCAN_JOBS_KEEP_RESULTS]:
+        job["rows"] = None
+
+async def run_scan_job(job_id: str):
+    job = scan_jobs[job_id]
+    guild = bot.get_guild(job["guild_id"])
+    try:
+        async with scan_job_slots:
+            if job["status"] == "cancelled":
+                return
+            job["status"] = "running"
+            job["started"] = datetime.datetime.utcnow().timestamp()
+            rows, fresh = await cached_scan(guild, duration=job["duration"], start_iso=job["start"], end_iso=job["end"])
+            job["members"] = len(rows)
+            job["rows"] = rows
+            key = scan_key(guild, job["duration"], job["start"], job["end"])
+            previous = load_scan_baseline(key) if job["diff"] else None
+            if fresh:
+                await save_scan_baseline(key, rows)
+                await archive_scan(rows, job["duration"] or ("custom range" if job["start"] or job["end"] else "all members"))
+            if job["diff"]:
+                summary = await log_scan_diff(guild, rows, previous)
+            elif not rows:
+                summary = "No members matched the criteria."
+            elif not fresh:
+                summary = f"Nothing changed since an identical scan ({len(rows)} members) — see its entry in the log channel."
+            elif await post_scan_results(guild, rows, job["label"]):
+                summary = f"Bulk scan complete ({len(rows)} members) — browse the results in the log channel."
+            else:
+                summary = "Scan completed but the results could not be posted to the log channel (see console)."
+            if job["apply"] and rows:
+                now_ts = datetime.datetime.utcnow().timestamp()
+                suspects = [int(r["userId"]) for r in rows if scan_row_is_candidate(guild, r, now_ts)]
+                if suspects:
+                    bulk = create_bulk_job("apply", guild, suspects, job["invoker_id"], f"Marked via scan job {job_id}")
+                    await log_to_channel(guild, f"Bulk apply job `{bulk['id']}` started by <@{job['invoker_id']}> for {len(suspects)} users.")
+                    summary += f" Started bulk apply job `{bulk['id']}` for {len(suspects)} users."
+            job["status"] = "done"
+            job["summary"] = summary
+    except asyncio.CancelledError:
+        if job["status"] != "cancelled":
+            # the identical in-flight scan this job had joined was cancelled by its own job
+            job["status"] = "failed"
+            job["summary"] = "The shared scan this job was waiting on was cancelled."
+        else:
+            job["summary"] = "Cancelled."
+            raise
+    except ScanIncomplete as e:
+        print(f"scan job {job_id} incomplete:", e)
+        job["status"] = "failed"
+        job["summary"] = f"Scan incomplete ({e}); nothing was cached, baselined, archived or applied. Run it again."
+    except Exception as e:
+        print(f"scan job {job_id} error:", e)
+        traceback.print_exc()
+        job["status"] = "failed"
+        job["summary"] = f"Scan failed: {e}"
+    finally:
+        job["finished"] = job["finished"] or datetime.datetime.utcnow().timestamp()
+        scan_job_tasks.pop(job_id, None)
+        for notify in scan_job_watchers.pop(job_id, []):
+            spawn_background(notify(f"Scan job `{job_id}` {job['status']}: {job['summary']}"))
+        prune_scan_jobs()
+
+def describe_scan_job(job: Dict[str, Any]) -> str:
+    text = f"`{job['id']}` {job['label']} — {job['status']} — by <@{job['invoker_id']}>"
+    if job["status"] == "queued":
+        ahead = sum(1 for j in scan_jobs.values() if j["status"] in ("queued", "running") and j["created"] < job["created"])
+        text += f", {ahead} job(s) ahead"
+    elif job["status"] == "running" and job["started"]:
+        text += f", running for {format_seconds(datetime.datetime.utcnow().timestamp() - job['started'])}"
+    elif job["finished"] and job["started"]:
+        text += f", took {format_seconds(job['finished'] - job['started'])}: {job['summary']}"
+    elif job["summary"]:
+        text += f": {job['summary']}"
+    return text
+
+def control_scan_job(action: str, job_id: str) -> str:
+    job = scan_jobs.get(job_id)
+    if not job:
+        return f"No scan job `{job_id}`."
+    if action == "status":
+        return describe_scan_job(job)
+    if action == "cancel":
+        if job["status"] not in ("queued", "running"):
+            return f"Scan job `{job_id}` is already {job['status']}."
+        job["status"] = "cancelled"
+        task = scan_job_tasks.get(job_id)
+        if task:
+            task.cancel()
+        return f"Scan job `{job_id}` cancelled."
+    return "Actions: status, cancel, result."
+
+def scan_job_result_file(job_id: str):
+    """(csv path, None) for a finished job whose rows are still held, else (None, reason)."""
+    job = scan_jobs.get(job_id)
+    if not job:
+        return None, f"No scan job `{job_id}`."
+    if job["status"] != "done":
+        return None, f"Scan job `{job_id}` is {job['status']}."
+    if job["rows"] is None:
+        return None, f"Results of `{job_id}` are no longer held (only the last {SCAN_JOBS_KEEP_RESULTS} are); its posted results remain in the log channel."
+    return create_csv_for_scan(job["rows"]), None
+
+def list_scan_jobs() -> str:
+    if not scan_jobs:
+        return "No scan jobs."
+    return "\n".join(describe_scan_job(j) for j in list(scan_jobs.values())[-15:])
+
+async def dm_user(user_id: int, text: str):
+    user = bot.get_user(user_id) or await bot.fetch_user(user_id)
+    await user.send(text, allowed_mentions=discord.AllowedMentions.none())
+
+# -------------------------
+# Incremental autoscan (dirty-member set + occasional full rescan)
+# -------------------------
+# members whose presence or roles changed since the last autoscan pass
+autoscan_dirty: Set[int] = set()
+autoscan_last_full_ts: float = 0.0
+
+def mark_autoscan_dirty(member: discord.Member):
+    if config.get("autoscan_enabled") and not member.bot:
+        autoscan_dirty.add(member.id)
+
+def set_autoscan_enabled(enabled: bool):
+    global autoscan_last_full_ts
+    config["autoscan_enabled"] = enabled
+    save_config()
+    autoscan_dirty.clear()
+    # a fresh enable starts from a full pass; afterwards only churn is re-evaluated
+    autoscan_last_full_ts = 0.0
+
+async def autoscan_tick(guild: discord.Guild):
+    global autoscan_dirty, autoscan_last_full_ts
+    now_ts = datetime.datetime.utcnow().timestamp()
+    full_interval = float(config.get("autoscan_full_rescan_hours", 24)) * 3600
+    flagged = 0
+
+    async def flag(m: discord.Member, reason: str, lane: str = LANE_JOIN):
+        nonlocal flagged
+        if is_sus(m):
+            return
+        await add_sus_role_to_member(m, reason=reason, lane=lane)
+        flagged += 1
+
+    if now_ts - autoscan_last_full_ts >= full_interval:
+        previous_full_ts = autoscan_last_full_ts
+        autoscan_last_full_ts = now_ts
+        autoscan_dirty.clear()
+        try:
+            rows, fresh = await cached_scan(guild)
+        except ScanIncomplete as e:
+            # the next tick retries the full rescan, which covers the dirty members cleared above
+            autoscan_last_full_ts = previous_full_ts
+            print("autoscan: full rescan incomplete, retrying next tick:", e)
+            return
+        if fresh:
+            await archive_scan(rows, "autoscan full")
+        checked = len(rows)
+        candidates = [int(r["userId"]) for r in rows if scan_row_is_candidate(guild, r, now_ts)]
+        # cache first, the rest over the gateway 100 at a time (no per-member fetch)
+        resolved = await resolve_members(guild, candidates)
+        for uid in candidates:
+            m = resolved.get(uid)
+            if m is None:
+                print("autoscan: full rescan could not resolve", uid)
+                continue
+            await flag(m, "Detected by autoscan (full rescan)", LANE_BULK)
+        kind = "full"
+    else:
+        dirty, autoscan_dirty = autoscan_dirty, set()
+        checked = 0
+        index_matches: List[int] = []
+        for uid in dirty:
+            m = guild.get_member(uid)
+            if m is None and LEAN_MODE:
+                # evaluate from the index; only members that match are resolved, in one batch below
+                rec = member_index.get(uid)
+                if rec is None or rec.bot or uid in sus_members:
+                    continue
+                checked += 1
+                if detection_rule(record_features(rec, now_ts)):
+                    index_matches.append(uid)
+                continue
+            if m is None or m.bot:
+                continue
+            checked += 1
+            if is_sus_candidate(m, now_ts=now_ts):
+                await flag(m, "Detected by autoscan")
+            if checked % 500 == 0:
+                await asyncio.sleep(0)
+        if index_matches:
+            resolved = await resolve_members(guild, index_matches)
+            for uid in index_matches:
+                if uid in resolved:
+                    await flag(resolved[uid], "Detected by autoscan")
+                else:
+                    print("autoscan: could not resolve", uid)
+        kind = "incremental"
+    if checked:
+        print(f"autoscan: {kind} pass checked={checked} flagged={flagged}")
+    if flagged:
+        await log_to_channel(guild, f"Autoscan ({kind}) queued Sus for {flagged} member(s) out of {checked} checked.")
+
+async def autoscan_loop():
+    while True:
+        await asyncio.sleep(max(float(config.get("autoscan_interval_seconds", 60)), 5.0))
+        if not config.get("autoscan_enabled"):
+            continue
+        guild = bot.get_guild(GUILD_ID)
+        if not guild or not config.get("sus_role_id"):
+            continue
+        try:
+            await autoscan_tick(guild)
+        except Exception as e:
+            print("autoscan_loop error:", e)
+            traceback.print_exc()
+
+# -------------------------
+# Persistent bulk Sus apply / release jobs
+# -------------------------
+BULK_JOB_BATCH = 25            # members resolved/queued per checkpoint
+BULK_JOBS_KEEP_FINISHED = 50
+
+# job id -> state dict (persisted as bulk_jobs/<id>.json); member ids live in bulk_jobs/<id>.ids
+bulk_jobs: Dict[str, Dict[str, Any]] = {}
+bulk_job_tasks: Dict[str, asyncio.Task] = {}
+
+def _bulk_job_path(job_id: str, suffix: str) -> Path:
+    return BULK_JOBS_DIR / f"{job_id}{suffix}"
+
+def save_bulk_job(job: Dict[str, Any]):
+    try:
+        job["updated"] = datetime.datetime.utcnow().timestamp()
+        path = _bulk_job_path(job["id"], ".json")
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(job))
+        tmp.replace(path)
+    except Exception as e:
+        print("save_bulk_job error:", e)
+
+def load_bulk_job_ids(job_id: str) -> array:
+    ids = array("Q")
+    ids.frombytes(_bulk_job_path(job_id, ".ids").read_bytes())
+    return ids
+
+def load_bulk_jobs():
+    bulk_jobs.clear()
+    if not BULK_JOBS_DIR.exists():
+        return
+    for path in sorted(BULK_JOBS_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime):
+        try:
+            job = json.loads(path.read_text())
+            bulk_jobs[job["id"]] = job
+        except Exception as e:
+            print("load_bulk_jobs: skipping", path, e)
+    finished = [j for j in bulk_jobs.values() if j["status"] in ("done", "cancelled")]
+    for job in finished[:-BULK_JOBS_KEEP_FINISHED]:
+        bulk_jobs.pop(job["id"], None)
+        for suffix in (".json", ".ids"):
+            try:
+                _bulk_job_path(job["id"], suffix).unlink()
+            except Exception:
+                pass
+
+def create_bulk_job(kind: str, guild: discord.Guild, user_ids: List[int], invoker_id: int, reason: str) -> Dict[str, Any]:
+    BULK_JOBS_DIR.mkdir(exist_ok=True)
+    job_id = secrets.token_hex(3)
+    _bulk_job_path(job_id, ".ids").write_bytes(array("Q", user_ids).tobytes())
+    job = {
+        "id": job_id, "kind": kind, "guild_id": guild.id, "invoker_id": invoker_id, "reason": reason,
+        "total": len(user_ids), "cursor": 0, "done": 0, "skipped": 0, "status": "running",
+        "created": datetime.datetime.utcnow().timestamp(), "run_started": None, "run_start_cursor": 0
+    }
+    bulk_jobs[job_id] = job
+    save_bulk_job(job)
+    start_bulk_job(job_id)
+    return job
+
+def start_bulk_job(job_id: str):
+    task = bulk_job_tasks.get(job_id)
+    if task and not task.done():
+        return
+    bulk_job_tasks[job_id] = asyncio.create_task(run_bulk_job(job_id))
+
+async def resolve_members(guild: discord.Guild, user_ids) -> Dict[int, discord.Member]:
+    """Cache first; misses are resolved 100 at a time over the gateway instead of one REST call each."""
+    found: Dict[int, discord.Member] = {}
+    missing: List[int] = []
+    for uid in user_ids:
+        m = guild.get_member(uid)
+        if m is not None:
+            found[uid] = m
+        else:
+            missing.append(uid)
+    for i in range(0, len(missing), 100):
+        chunk = missing[i:i + 100]
+        try:
+            for m in await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True):
+                found[m.id] = m
+        except Exception as e:
+            print("resolve_members: query_members failed:", e)
+    return found
+
+async def run_bulk_job(job_id: str):
+    rest_calls.enter("bulk_job")
+    job = bulk_jobs[job_id]
+    guild = bot.get_guild(job["guild_id"])
+    if guild is None:
+        print(f"bulk job {job_id}: guild {job['guild_id']} not available; leaving it for the next start")
+        return
+    try:
+        user_ids = load_bulk_job_ids(job_id)
+    except Exception as e:
+        print(f"bulk job {job_id}: member list unreadable ({e}); cancelling")
+        job["status"] = "cancelled"
+        save_bulk_job(job)
+        return
+    job["run_started"] = datetime.datetime.utcnow().timestamp()
+    job["run_start_cursor"] = job["cursor"]
+    print(f"bulk job {job_id}: {job['kind']} running from {job['cursor']}/{job['total']}")
+    try:
+        while job["status"] == "running" and job["cursor"] < len(user_ids):
+            batch = list(user_ids[job["cursor"]:job["cursor"] + BULK_JOB_BATCH])
+            # members already in the target state are skipped without resolving them
+            want_sus = job["kind"] == "apply"
+            todo = [uid for uid in batch if (uid in sus_members) != want_sus]
+            job["skipped"] += len(batch) - len(todo)
+            members = await resolve_members(guild, todo) if todo else {}
+            pending = []
+            for uid in todo:
+                m = members.get(uid)
+                if m is None:
+                    job["skipped"] += 1
+                    continue
+                if job["kind"] == "apply":
+                    fut = await add_sus_role_to_member(m, reason=job["reason"], lane=LANE_BULK)
+                else:
+                    fut = await remove_sus_role_from_member(m, by_user=None, reason=job["reason"], lane=LANE_BULK)
+                if fut is not None:
+                    pending.append(fut)
+            if pending:
+                await asyncio.gather(*pending)
+            job["done"] += len(pending)
+            job["cursor"] += len(batch)
+            save_bulk_job(job)
+        if job["status"] == "running":
+            job["status"] = "done"
+            save_bulk_job(job)
+            await log_to_channel(guild, f"Bulk {job['kind']} job `{job_id}` finished: {job['done']} changed, {job['skipped']} skipped (of {job['total']}).")
+    except asyncio.CancelledError:
+        save_bulk_job(job)
+        raise
+    except Exception as e:
+        print(f"bulk job {job_id} error:", e)
+        traceback.print_exc()
+        job["status"] = "paused"
+        save_bulk_job(job)
+        await log_to_channel(guild, f"Bulk {job['kind']} job `{job_id}` paused after an error at {job['cursor']}/{job['total']}: {e}")
+
+def resume_bulk_jobs():
+    for job_id, job in bulk_jobs.items():
+        if job["status"] == "running":
+            start_bulk_job(job_id)
+
+def describe_bulk_job(job: Dict[str, Any]) -> str:
+    pct = (100.0 * job["cursor"] / job["total"]) if job["total"] else 100.0
+    text = f"`{job['id']}` {job['kind']} — {job['status']} — {job['cursor']}/{job['total']} ({pct:.0f}%), {job['done']} changed, {job['skipped']} skipped"
+    task = bulk_job_tasks.get(job["id"])
+    if job["status"] == "running" and task and not task.done() and job.get("run_started"):
+        elapsed = datetime.datetime.utcnow().timestamp() - job["run_started"]
+        progressed = job["cursor"] - job.get("run_start_cursor", 0)
+        if progressed > 0 and elapsed > 0:
+            eta = (job["total"] - job["cursor"]) * elapsed / progressed
+            text += f", ETA {datetime.timedelta(seconds=int(eta))}"
+    return text
+
+def control_bulk_job(action: str, job_id: str) -> str:
+    job = bulk_jobs.get(job_id)
+    if not job:
+        return f"No job `{job_id}`."
+    if action == "status":
+        return describe_bulk_job(job)
+    if job["status"] in ("done", "cancelled"):
+        return f"Job `{job_id}` is already {job['status']}."
+    if action == "pause":
+        job["status"] = "paused"
+    elif action == "cancel":
+        job["status"] = "cancelled"
+    elif action == "resume":
+        job["status"] = "running"
+        save_bulk_job(job)
+        start_bulk_job(job_id)
+        return f"Job `{job_id}` resumed."
+    else:
+        return "Actions: status, pause, resume, cancel."
+    save_bulk_job(job)
+    return f"Job `{job_id}` {job['status']} (stops after the current batch)."
+
+def list_bulk_jobs() -> str:
+    if not bulk_jobs:
+        return "No bulk jobs."
+    return "\n".join(describe_bulk_job(j) for j in list(bulk_jobs.values())[-15:])
+
+# -------------------------
+# Raid cohorts (join-wave clustering in a worker thread)
+# -------------------------
+# NumPy releases the GIL in the sorts and searches, so a thread keeps the event loop responsive
+# without a process pool (no fork after the loop watchdog thread started, no bot.py re-import on
+# spawn platforms)
+# join times (utc ts) inside the current join window, for raid autodetect
+recent_joins: deque = deque()
+cohort_last_auto_ts: float = 0.0
+
+def member_join_arrays(guild: discord.Guild):
+    """(ids, joined timestamps) of non-bot members: the member cache, or the index in lean mode."""
+    if LEAN_MODE:
+        return member_index.join_arrays()
+    ids, joined = array("Q"), array("d")
+    for m in guild.members:
+        if not m.bot:
+            ids.append(m.id)
+            joined.append(m.joined_at.timestamp() if m.joined_at else float("nan"))
+    return ids, joined
+
+async def detect_cohorts(guild: discord.Guild, window: str = None) -> List[Cohort]:
+    ids, joined = member_join_arrays(guild)
+    since = datetime.datetime.utcnow().timestamp() - SCAN_DURATIONS[window] if SCAN_DURATIONS.get(window) else None
+    return await asyncio.to_thread(find_cohorts, ids, joined,
+                                   join_window=float(config.get("cohort_join_window_seconds", 300)),
+                                   created_window=float(config.get("cohort_created_window_seconds", 7200)),
+                                   min_size=max(int(config.get("cohort_min_size", 10)), 2), joined_after=since)
+
+async def handle_cohorts(guild: discord.Guild, cohorts: List[Cohort], invoker_id: int, apply: bool) -> str:
+    """Log each cohort and, with `apply`, send each one to the Sus pipeline as a single bulk apply job."""
+    if not cohorts:
+        return "No raid cohorts found."
+    lines = []
+    for cohort in cohorts:
+        ids = [uid for uid in cohort.user_ids if uid not in sus_members]
+        text = f"Raid cohort: {cohort.describe()} ({len(cohort.user_ids) - len(ids)} already Sus)"
+        if apply and ids:
+            job = create_bulk_job("apply", guild, ids, invoker_id, f"Raid cohort ({cohort.describe()})")
+            text += f" — bulk apply job `{job['id']}` for {len(ids)} users"
+        mentions = " ".join(f"<@{uid}>" for uid in cohort.user_ids[:40])
+        more = f" (+{len(cohort.user_ids) - 40} more)" if len(cohort.user_ids) > 40 else ""
+        await log_to_channel(guild, f"{text}\n{mentions}{more}")
+        lines.append(text)
+    return "\n".join(lines[:10]) + (f"\n(+{len(lines) - 10} more cohorts in the log channel)" if len(lines) > 10 else "")
+
+def note_join_for_cohorts(guild: discord.Guild):
+    """Raid autodetect: once a join window holds cohort_min_size joins, cluster the last day's joins."""
+    global cohort_last_auto_ts
+    if not config.get("cohort_autodetect"):
+        return
+    now_ts = datetime.datetime.utcnow().timestamp()
+    window = float(config.get("cohort_join_window_seconds", 300))
+    recent_joins.append(now_ts)
+    while recent_joins and now_ts - recent_joins[0] > window:
+        recent_joins.popleft()
+    if len(recent_joins) >= int(config.get("cohort_min_size", 10)) and now_ts - cohort_last_auto_ts >= window:
+        cohort_last_auto_ts = now_ts
+        async def check():
+            # let the burst land (and lean-mode join records arrive) before clustering
+            await asyncio.sleep(window)
+            cohorts = await detect_cohorts(guild, "last_day")
+            if cohorts:
+                await handle_cohorts(guild, cohorts, bot.user.id, bool(config.get("cohort_auto_apply")))
+        spawn_background(check())
+
 async def periodic_notifier():
+    rest_calls.enter("notifier")
     if not config.get("periodic_notify_enabled", True):
         return
     guild = bot.get_guild(GUILD_ID)
@@ -874,76 +2475,117 @@ async def periodic_notifier():
     role = guild.get_role(role_id)
     if not role:
         return
-    suspects = [m for m in role.members if not m.bot]
+    suspects = sorted(sus_members)
     if not suspects:
         return
-    ch = guild.get_channel(VERIFY_CHANNEL_ID) or await guild.fetch_channel(VERIFY_CHANNEL_ID)
-    ttl = config.get("periodic_mention_delete_seconds", 30)
-    chunk_size = 50
-    for i in range(0, len(suspects), chunk_size):
-        chunk = suspects[i:i+chunk_size]
-        # build mention strings but disable allowed_mentions to avoid pings
-        mentions = " ".join(f"<@{m.id}>" for m in chunk)
+    ch = await resolve_channel(guild, VERIFY_CHANNEL_ID)
+    sent = []
+    # mention strings but allowed_mentions disabled to avoid pings; deleted by the shared mention timer
+    for content in pack_mentions(suspects, "Please complete verification to regain access. Click **Verify** below."):
         try:
-            sent = await ch.send(f"{mentions} Please complete verification to regain access. Click **Verify** below.", allowed_mentions=discord.AllowedMentions.none())
-            await asyncio.sleep(ttl)
-            try:
-                await sent.delete()
-            except Exception:
-                pass
+            sent.append(await ch.send(content, allowed_mentions=discord.AllowedMentions.none()))
         except Exception:
             pass
+    delete_mentions_later(sent)
     await log_to_channel(guild, f"Periodic notifier triggered: mentioned {len(suspects)} Sus members.")
 
 # -------------------------
-# Events & startup (load cache)
+# Event-loop lag monitor
 # -------------------------
-@bot.event
-async def on_ready():
-    print(f"Logged in as {bot.user} (id: {bot.user.id})")
-    print("Effective intents at runtime:", json.dumps({
-        "members": bot.intents.members,
-        "presences": bot.intents.presences,
-        "message_content": bot.intents.message_content,
-        "guilds": bot.intents.guilds
-    }, indent=2))
-    load_config()
-    load_sus_platform_cache()
-    global role_worker_task
-    if role_worker_task is None:
-        role_worker_task = asyncio.create_task(role_worker())
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        print("Bot not in configured guild. Check GUILD_ID.")
-        return
-    await ensure_sus_role_and_overwrites(guild)
+def report_loop_stall(lag: float, handler: str, frames: List[str]):
+    print(f"[loop] blocked {format_seconds(lag)} in {handler}" + (f" | {' <- '.join(reversed(frames[-3:]))}" if frames else ""))
+
+def start_loop_monitor():
+    global loop_monitor
+    loop_monitor = LoopLagMonitor(
+        threshold=float(config.get("loop_lag_threshold_ms", 100)) / 1000.0,
+        project_root=str(Path(__file__).resolve().parent),
+        on_stall=report_loop_stall,
+    )
+    loop_monitor.start()
 
-    # debug app commands visible
+# -------------------------
+# Slash command registration (schemas from command_schemas.py)
+# -------------------------
+def apply_command_schemas():
+    """
+    COMMANDS (command_schemas.py) is the one definition of the slash commands: copy its descriptions
+    and choices onto the @bot.tree.command handlers, and refuse to start when a handler's options
+    (names, types, required) do not match, since the registered schema is what users are offered.
+    """
+    handlers = {c.name: c for c in bot.tree.get_commands()}
+    errors = []
+    for schema in COMMANDS:
+        handler = handlers.pop(schema["name"], None)
+        if handler is None:
+            errors.append(f"/{schema['name']} is registered but has no handler in bot.py")
+            continue
+        handler.description = schema["description"]
+        params = handler._params
+        options = {o["name"]: o for o in schema.get("options", [])}
+        if set(options) != set(params):
+            errors.append(f"/{schema['name']} options differ: schema {sorted(options)} vs handler {sorted(params)}")
+            continue
+        for name, option in options.items():
+            param = params[name]
+            if param.type.value != option["type"]:
+                errors.append(f"/{schema['name']} {name}: schema type {option['type']} vs handler {param.type.value} ({param.type.name})")
+            if param.required != bool(option.get("required", False)):
+                errors.append(f"/{schema['name']} {name}: schema required={bool(option.get('required', False))} vs handler required={param.required}")
+            param.description = option["description"]
+            param.choices = [app_commands.Choice(name=c["name"], value=c["value"]) for c in option.get("choices", [])]
+    for name in handlers:
+        errors.append(f"/{name} has a handler but is missing from command_schemas.py")
+    if errors:
+        for e in errors:
+            print("ERROR: slash command schema mismatch:", e)
+        raise SystemExit(1)
+
+async def sync_commands_if_changed():
+    """Bulk-overwrite the guild's commands only when the schema hash differs from the last successful sync."""
+    if not SYNC_COMMANDS_ON_START:
+        return
+    app_id = bot.application_id or bot.user.id
+    digest = commands_hash()
+    if load_synced_hash(app_id, GUILD_ID) == digest:
+        print(f"Slash commands up to date ({len(COMMANDS)} commands, hash {digest[:12]}); not calling the API.")
+        return
     try:
-        cmds = await bot.tree.fetch_commands(guild=discord.Object(id=GUILD_ID))
-        print(f"bot.tree.fetch_commands sees {len(cmds)} guild commands:")
-        for c in cmds:
-            print("  -", c.name, "| options:", [o.name for o in getattr(c, "options", [])])
+        registered = await bot.http.bulk_upsert_guild_commands(app_id, GUILD_ID, COMMANDS)
+        save_synced_hash(app_id, GUILD_ID, digest)
+        print(f"Slash commands changed; registered {len(registered)} commands (hash {digest[:12]}).")
     except Exception as e:
-        print("bot.tree.fetch_commands() failed:", repr(e))
-        traceback.print_exc()
+        print("Slash command sync failed:", repr(e))
 
+# -------------------------
+# Events & startup — one-time init; reconnects only re-verify
+# -------------------------
+# on_ready fires again after every gateway reconnect. Process-wide setup runs once in setup_hook
+# (before the first connect); guild setup runs on the first ready that sees the guild. Later
+# ready events only check cached state and make API calls if something is actually missing.
+INIT_PENDING, INIT_RUNNING, INIT_DONE = "pending", "running", "done"
+guild_init_state = INIT_PENDING
+notifier_cron = None
+
+def schedule_periodic_notifier():
+    global notifier_cron
     try:
-        raw_cmds = await bot.http.request(discord.http.Route("GET", f"/applications/{bot.user.id}/guilds/{GUILD_ID}/commands"))
-        print("Raw REST GET for guild commands (using this bot token) returned:")
-        for rc in raw_cmds:
-            print("  -", rc.get("name"), "id:", rc.get("id"))
+        if notifier_cron is not None:
+            notifier_cron.stop()
+        spec = config.get("periodic_notify_cron", DEFAULT_CONFIG["periodic_notify_cron"])
+        notifier_cron = aiocron.crontab(spec, func=periodic_notifier, tz=pytz.timezone("Asia/Beirut"), start=False)
+        notifier_cron.start()
+        print("Periodic notifier scheduled:", spec)
     except Exception as e:
-        print("Raw REST GET failed:", repr(e))
+        print("Failed to schedule periodic notifier:", e)
         traceback.print_exc()
 
-    print("NOTE: bot will NOT auto-sync application commands at startup (to avoid overwriting).")
-
-    # admin prompt creation
+async def ensure_verify_prompt(guild: discord.Guild):
+    """Refresh the persistent verify message, or post the admin setup prompt if there is none."""
     try:
         posted = False
         try:
-            ch = guild.get_channel(VERIFY_CHANNEL_ID) or await guild.fetch_channel(VERIFY_CHANNEL_ID)
+            ch = await resolve_channel(guild, VERIFY_CHANNEL_ID)
         except Exception:
             ch = None
         if ch:
@@ -980,20 +2622,65 @@ async def on_ready():
                 else:
                     print("Admin setup prompt already exists.")
         else:
-            print(f"on_ready: verify channel (ID {VERIFY_CHANNEL_ID}) could not be found or fetched. admin prompt not posted.")
+            print(f"ensure_verify_prompt: verify channel (ID {VERIFY_CHANNEL_ID}) could not be found or fetched. admin prompt not posted.")
         if not posted:
-            print("on_ready: admin prompt not posted (either existing prompt found, or posting failed). Check previous logs for details.")
+            print("ensure_verify_prompt: admin prompt not posted (either existing prompt found, or posting failed). Check previous logs for details.")
     except Exception as e:
-        print("on_ready admin prompt setup failed:", repr(e))
+        print("admin prompt setup failed:", repr(e))
         traceback.print_exc()
 
+async def setup_hook():
+    """Runs once per process, after login and before the gateway connects (never on reconnect)."""
+    global role_worker_task, autoscan_task, memory_report_task
+    print("Effective intents at runtime:", json.dumps({
+        "members": bot.intents.members,
+        "presences": bot.intents.presences,
+        "message_content": bot.intents.message_content,
+        "guilds": bot.intents.guilds
+    }, indent=2))
+    role_worker_task = asyncio.create_task(role_worker())
+    start_loop_monitor()
+    autoscan_task = asyncio.create_task(autoscan_loop())
+    memory_report_task = asyncio.create_task(memory_report_loop())
+    load_bulk_jobs()
+    # the Verify button keeps working across restarts without re-posting the message
+    bot.add_view(VerifyView())
+    schedule_periodic_notifier()
+
+bot.setup_hook = setup_hook
+
+@bot.event
+async def on_ready():
+    global guild_init_state
+    print(f"Logged in as {bot.user} (id: {bot.user.id})")
+    guild = bot.get_guild(GUILD_ID)
+    print(f"RSS after ready: {rss_mb():.1f} MB (startup {startup_rss_mb:.1f} MB); cached members {len(guild.members) if guild else 0}"
+          + (f", member index {len(member_index)}" if LEAN_MODE else ""))
+    if not guild:
+        print("Bot not in configured guild. Check GUILD_ID.")
+        return
+    if guild_init_state == INIT_DONE:
+        if guild.get_role(config.get("sus_role_id") or 0) is None:
+            print("on_ready (reconnect): Sus role missing from cache; re-running role setup.")
+            await ensure_sus_role_and_overwrites(guild)
+        else:
+            print("on_ready (reconnect): state verified from cache; nothing to redo.")
+        return
+    if guild_init_state == INIT_RUNNING:
+        return
+    guild_init_state = INIT_RUNNING
     try:
-        spec = config.get("periodic_notify_cron", DEFAULT_CONFIG["periodic_notify_cron"])
-        cron_job = aiocron.crontab(spec, func=periodic_notifier, tz=pytz.timezone("Asia/Beirut"), start=False)
-        cron_job.start()
-        print("Periodic notifier scheduled:", spec)
+        await ensure_sus_role_and_overwrites(guild)
+        seed_sus_members(guild)
+        await sync_commands_if_changed()
+        # pick up bulk jobs interrupted by the last shutdown
+        resume_bulk_jobs()
+        await ensure_verify_prompt(guild)
+        guild_init_state = INIT_DONE
     except Exception as e:
-        print("Failed to schedule periodic notifier:", e)
+        # let the next ready retry the guild setup
+        guild_init_state = INIT_PENDING
+        print("on_ready guild setup failed:", repr(e))
         traceback.print_exc()
 
 # -------------------------
@@ -1001,7 +2688,7 @@ async def on_ready():
 # -------------------------
 @bot.event
 async def on_message(message: discord.Message):
-    if message.author.bot or not message.guild:
+    if SLASH_ONLY or message.author.bot or not message.guild:
         return
 
     preview = (message.content[:200] + "...") if message.content and len(message.content) > 200 else (message.content or "<empty>")
@@ -1052,9 +2739,21 @@ async def on_message(message: discord.Message):
             "    - `!scan last_day` (filter by join time)\n"
             "    - `!scan @user` (single user)\n"
             "    - `!scan last_day apply` (scan + mark web-only as Sus)\n"
+            "    - `!scan last_day diff` (only log changes since the previous `last_day` scan)\n"
             f"- `{COMMAND_PREFIX}setupverify` — open interactive setup (admin, run in verify channel)\n"
             f"- `{COMMAND_PREFIX}verifyuser @user` / `{COMMAND_PREFIX}unsus @user` — manually remove Sus (admin)\n"
-            f"- `{COMMAND_PREFIX}autoscan on|off` — toggle autoscan (admin)\n"
+            f"- `{COMMAND_PREFIX}autoscan on|off` — toggle incremental autoscan (admin)\n"
+            f"- `{COMMAND_PREFIX}releaseall` — bulk-release everyone with the Sus role as a resumable job (admin)\n"
+            f"- `{COMMAND_PREFIX}jobs` / `{COMMAND_PREFIX}job <id>` / `{COMMAND_PREFIX}job pause|resume|cancel <id>` — bulk job progress, ETA and control (admin)\n"
+            f"- `{COMMAND_PREFIX}cohorts [last_hour|last_day|last_week|last_month] [apply]` — find raid cohorts (joined together, created together); `apply` marks each cohort Sus as one bulk job (admin)\n"
+            f"- `{COMMAND_PREFIX}scanjobs` / `{COMMAND_PREFIX}scanjob <id>` / `{COMMAND_PREFIX}scanjob cancel|result <id>` — background scan jobs; `result` re-sends a finished scan as CSV (admin)\n"
+            f"- `{COMMAND_PREFIX}rule [show|set <rule>|test @user|reset]` — view or hot-swap the Sus detection rule (admin)\n"
+            f"- `{COMMAND_PREFIX}queue` — role queue lanes: pending ops and wait-time percentiles (admin)\n"
+            f"- `{COMMAND_PREFIX}slo` — verify click-to-access latency percentiles (admin)\n"
+            f"- `{COMMAND_PREFIX}lag` — event-loop lag percentiles and the handlers behind the worst stalls (admin)\n"
+            f"- `{COMMAND_PREFIX}trace [file]` — per-stage latency of join → Sus and verify flows, or upload the trace file (admin)\n"
+            f"- `{COMMAND_PREFIX}rest` — REST calls by route per operation, incl. calls per Sus action (admin)\n"
+            f"- `{COMMAND_PREFIX}mem [snapshot|diff [rebase]|stop]` — entries and approximate size of the bot's caches and queues; tracemalloc baseline and growth diff file (admin)\n"
         )
         return await message.reply(help_text)
 
@@ -1078,7 +2777,7 @@ async def on_message(message: discord.Message):
         if not m:
             return await message.reply("Invalid channel mention/ID")
         cid = int(m.group(1))
-        ch = message.guild.get_channel(cid) or await message.guild.fetch_channel(cid)
+        ch = await resolve_channel(message.guild, cid)
         if not ch or not hasattr(ch, "send"):
             return await message.reply("Channel not found or not text-based.")
         config["log_channel_id"] = cid
@@ -1103,15 +2802,36 @@ async def on_message(message: discord.Message):
         if len(args) < 2:
             return await message.reply("Usage: !autoscan on|off")
         action = args[1].lower()
-        config["autoscan_enabled"] = (action == "on")
-        save_config()
+        set_autoscan_enabled(action == "on")
         return await message.reply(f"Auto-scan is now {'ENABLED' if config['autoscan_enabled'] else 'DISABLED'}.")
 
+    # RULE
+    if cmd == "rule":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        parts = body.split(None, 2)
+        sub = parts[1].lower() if len(parts) > 1 else "show"
+        if sub == "show":
+            return await message.reply(f"Current detection rule: `{detection_rule.source}`")
+        if sub in ("set", "reset"):
+            source = DEFAULT_RULE if sub == "reset" else (parts[2] if len(parts) > 2 else "")
+            try:
+                compiled = set_detection_rule(source)
+            except RuleError as e:
+                return await message.reply(f"Rule not changed: {e}")
+            await log_to_channel(message.guild, f"Detection rule changed by <@{message.author.id}>: `{compiled.source}`")
+            return await message.reply(f"Detection rule is now: `{compiled.source}`")
+        if sub == "test":
+            if not message.mentions:
+                return await message.reply("Usage: !rule test @user")
+            return await message.reply(rule_test_reply(message.guild, message.mentions[0].id))
+        return await message.reply("Usage: !rule [show|set <rule>|test @user|reset]")
+
     # SETUPVERIFY
     if cmd == "setupverify":
         if not is_admin:
             return await message.reply("You are not allowed to configure verification.")
-        verify_ch = message.guild.get_channel(VERIFY_CHANNEL_ID) or await message.guild.fetch_channel(VERIFY_CHANNEL_ID)
+        verify_ch = await resolve_channel(message.guild, VERIFY_CHANNEL_ID)
         if verify_ch and verify_ch.id != message.channel.id:
             return await message.reply(f"Run this command inside the configured verify channel (ID {VERIFY_CHANNEL_ID}).")
         await message.reply("Opening interactive setup in this channel...")
@@ -1149,77 +2869,172 @@ async def on_message(message: discord.Message):
         # If we didn't set duration/apply_sus above because we used mentions, parse args now:
         duration = None
         apply_sus = False
+        diff_mode = False
         for a in args[1:]:
             token = a.strip().strip("\\")
             if token.lower() in ("apply", "--apply"):
                 apply_sus = True
+            elif token.lower() in ("diff", "--diff"):
+                diff_mode = True
             elif token.lower() in ("last_hour","last_day","last_week","last_month"):
                 duration = token.lower()
 
-        print(f"scan command invoked (member_target={'yes' if member_target else 'no'}, duration={duration}, apply_sus={apply_sus})")
+        print(f"scan command invoked (member_target={'yes' if member_target else 'no'}, duration={duration}, apply_sus={apply_sus}, diff={diff_mode})")
 
-        try:
-            async with message.channel.typing():
-                rows = await perform_scan(message.guild, member=member_target, duration=duration)
-        except Exception as e:
-            print("Typing context failed or scan error; running scan without typing:", e)
-            traceback.print_exc()
+        if member_target:
             try:
-                rows = await perform_scan(message.guild, member=member_target, duration=duration)
-            except Exception as e2:
-                print("Prefix scan perform_scan error:", e2)
+                async with message.channel.typing():
+                    rows = await perform_scan(message.guild, member=member_target)
+            except Exception as e:
+                print("Prefix scan perform_scan error:", e)
                 traceback.print_exc()
                 return await message.reply("Error during scan (see console).")
-
-        if member_target:
             if not rows:
                 return await message.reply("Member not found or has no presence info.")
             r = rows[0]
             platforms = r.get("platforms", [])
             platforms_text = ", ".join(platforms) or "offline/no-presence"
-            if set(platforms) == {"web"}:
+            if is_sus_candidate(member_target, platforms):
                 view = MarkSusView(message.guild.id, member_target.id)
                 try:
-                    await message.reply(f"User {member_target.mention} appears to be web-only ({platforms_text}). Mark as Sus?", view=view)
+                    await message.reply(f"User {member_target.mention} matches the detection rule ({platforms_text}). Mark as Sus?", view=view)
                 except Exception:
-                    await message.reply(f"User {member_target.mention} appears to be web-only. Run `!verifyuser @{member_target.id}` to mark Sus manually.")
+                    await message.reply(f"User {member_target.mention} matches the detection rule. Run `!verifyuser @{member_target.id}` to mark Sus manually.")
                 return
             return await message.reply(f"Platforms for {r['tag']}: {platforms_text}\nID: {r['userId']}\nJoined: {r['joinedAt']}")
 
-        if not rows:
-            return await message.reply("No members matched the criteria.")
-        if len(rows) <= 300:
-            header = "user | server nickname | id | mention | platform(s)"
-            body = "\n".join([f"{r['tag']} | {r['displayName']} | {r['userId']} | <@{r['userId']}> | {', '.join(r.get('platforms',[]))}" for r in rows])
+        # bulk scans run as background jobs; the outcome is replied to this message when done
+        async def notify(text: str):
             try:
-                await log_to_channel(message.guild, f"Bulk scan completed ({len(rows)} members):\n{header}\n{body}")
-            except Exception as e:
-                print("Failed to send scan log:", e)
-            await message.reply("Bulk scan complete and logged.")
-        else:
+                await message.reply(text, allowed_mentions=discord.AllowedMentions.none())
+            except Exception:
+                await dm_user(message.author.id, text)
+        job, created = start_scan_job(message.guild, message.author.id, notify, duration=duration, diff=diff_mode, apply_sus=apply_sus)
+        if created:
+            return await message.reply(f"Scan job `{job['id']}` {job['status']}. You'll get the result here; `{COMMAND_PREFIX}scanjob {job['id']}` / `{COMMAND_PREFIX}scanjob cancel {job['id']}`.")
+        return await message.reply(f"An identical scan is already {job['status']} as job `{job['id']}`; you'll get its result here too.")
+
+    # RELEASEALL
+    if cmd == "releaseall":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        role = message.guild.get_role(config.get("sus_role_id") or 0)
+        if not role:
+            return await message.reply("Sus role is not configured.")
+        targets = sorted(sus_members)
+        if not targets:
+            return await message.reply("Nobody currently has the Sus role.")
+        job = create_bulk_job("release", message.guild, targets, message.author.id, f"Bulk release by {message.author}")
+        await log_to_channel(message.guild, f"Bulk release job `{job['id']}` started by <@{message.author.id}> for {len(targets)} users.")
+        return await message.reply(f"Started bulk release job `{job['id']}` for {len(targets)} users. Track it with `{COMMAND_PREFIX}job {job['id']}`.")
+
+    # JOBS / JOB
+    if cmd in ("jobs", "job"):
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        if cmd == "jobs" or len(args) < 2:
+            return await message.reply(list_bulk_jobs())
+        if len(args) == 2:
+            return await message.reply(control_bulk_job("status", args[1]))
+        return await message.reply(control_bulk_job(args[1].lower(), args[2]))
+
+    # RAID COHORTS
+    if cmd == "cohorts":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        window = next((a.lower() for a in args[1:] if a.lower() in SCAN_DURATIONS), None)
+        apply = any(a.lower() in ("apply", "--apply") for a in args[1:])
+        try:
+            async with message.channel.typing():
+                cohorts = await detect_cohorts(message.guild, window)
+        except Exception as e:
+            print("cohorts error:", e)
+            traceback.print_exc()
+            return await message.reply("Cohort analysis failed (see console).")
+        return await message.reply(await handle_cohorts(message.guild, cohorts, message.author.id, apply))
+
+    # SCAN JOBS
+    if cmd in ("scanjobs", "scanjob"):
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        if cmd == "scanjobs" or len(args) < 2:
+            return await message.reply(list_scan_jobs(), allowed_mentions=discord.AllowedMentions.none())
+        if len(args) == 2:
+            return await message.reply(control_scan_job("status", args[1]), allowed_mentions=discord.AllowedMentions.none())
+        if args[1].lower() == "result":
+            path, error = scan_job_result_file(args[2])
+            if error:
+                return await message.reply(error)
             try:
-                csv_path = create_csv_for_scan(rows)
-                await log_to_channel(message.guild, f"Bulk scan completed: {len(rows)} members — CSV attached.", csv_path)
-                await message.reply("Bulk scan complete and CSV uploaded to the log channel.")
+                return await message.reply(f"Results of scan job `{args[2]}`", file=discord.File(path))
+            finally:
                 try:
-                    os.remove(csv_path)
+                    os.remove(path)
                 except Exception:
                     pass
+        return await message.reply(control_scan_job(args[1].lower(), args[2]))
+
+    # QUEUE
+    if cmd == "queue":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        return await message.reply(role_queue_report())
+
+    # SLO
+    if cmd == "slo":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        return await message.reply(verify_slo_report())
+
+    # LAG
+    if cmd == "lag":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        return await message.reply(diag_report("lag", message.guild))
+
+    # TRACE
+    if cmd == "trace":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        if len(args) > 1 and args[1].lower() == "file":
+            if not tracer.path.exists():
+                return await message.reply("No trace file yet.")
+            # the file can reach TRACE_MAX_MB, over the attachment limit; spans compress about 10x
+            try:
+                path = await asyncio.to_thread(tracer.export_gzip)
             except Exception as e:
-                print("Failed to create/upload CSV:", e)
-                await message.reply("Scan completed but failed to create CSV (see console).")
-        if apply_sus:
-            suspects = [r for r in rows if len(r.get("platforms",[]))==1 and r["platforms"][0]=="web"]
-            if suspects:
-                for s in suspects:
-                    try:
-                        m = message.guild.get_member(int(s["userId"])) or await message.guild.fetch_member(int(s["userId"]))
-                        await add_sus_role_to_member(m, reason="Marked via scan applySus")
-                    except Exception:
-                        pass
-                await log_to_channel(message.guild, f"Applied Sus to {len(suspects)} users (queued).")
-                await message.reply(f"Applied Sus to {len(suspects)} users (queued).")
-        return
+                return await message.reply(f"Could not export the trace file: {e}")
+            size, limit = path.stat().st_size, message.guild.filesize_limit
+            if size > limit:
+                return await message.reply(f"Compressed trace file is {format_bytes(size)}, over this server's {format_bytes(limit)} upload limit. Copy `{path}` from the bot host instead.")
+            try:
+                return await message.reply("Open in https://ui.perfetto.dev (gzip is fine) or chrome://tracing", file=discord.File(path))
+            except Exception as e:
+                return await message.reply(f"Trace upload failed: {e}. Copy `{path}` from the bot host instead.")
+        return await message.reply(diag_report("trace", message.guild))
+
+    # REST
+    if cmd == "rest":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        return await message.reply(diag_report("rest", message.guild))
+
+    # MEMORY
+    if cmd == "mem":
+        if not is_admin:
+            return await message.reply("Only configured admins can run this.")
+        sub = args[1].lower() if len(args) > 1 else ""
+        if sub == "snapshot":
+            return await message.reply(heap_tracker.snapshot())
+        if sub == "diff":
+            text, path = heap_diff_reply(rebase=len(args) > 2 and args[2].lower() == "rebase")
+            if path:
+                return await message.reply(text, file=discord.File(path))
+            return await message.reply(text)
+        if sub == "stop":
+            heap_tracker.stop()
+            return await message.reply("tracemalloc stopped; baseline dropped.")
+        return await message.reply(member_memory_report(message.guild)[:1990])
 
     print(f"  -> Unknown prefix command: {cmd} (no action taken)")
     try:
@@ -1236,54 +3051,149 @@ async def on_command_error(ctx, error):
     traceback.print_exc()
 
 # -------------------------
-# Slash commands (full) — /setupverify, /setlog, /verifyuser, /autoscan, /scan
+# Slash commands (full) — /setupverify, /setlog, /verifyuser, /autoscan, /rule, /jobs, /releaseall, /diag, /scan
+# Names and parameters here; descriptions and choices come from command_schemas.py (apply_command_schemas)
 # -------------------------
-@bot.tree.command(name="setupverify", description="Interactive setup for verification (run in the verify channel)")
+@bot.tree.command(name="setupverify")
 async def setupverify(interaction: discord.Interaction):
-    invoker = interaction.user
-    member = interaction.guild.get_member(invoker.id) or await interaction.guild.fetch_member(invoker.id)
+    member = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
     if not is_admin_member(member):
         return await interaction.response.send_message("You are not allowed to configure verification.", ephemeral=True)
-    verify_ch = interaction.guild.get_channel(VERIFY_CHANNEL_ID) or await interaction.guild.fetch_channel(VERIFY_CHANNEL_ID)
+    verify_ch = await resolve_channel(interaction.guild, VERIFY_CHANNEL_ID)
     if verify_ch.id != interaction.channel_id:
         return await interaction.response.send_message(f"Run this command inside the configured verify channel (ID {VERIFY_CHANNEL_ID}).", ephemeral=True)
     await interaction.response.send_message("Opening interactive setup in this channel...", ephemeral=True)
     await start_interactive_setup(member, verify_ch)
 
-@bot.tree.command(name="setlog", description="Set the channel where verification & sus logs should be sent.")
-@app_commands.describe(channel="Text channel to use as logs")
+@bot.tree.command(name="setlog")
 async def setlog(interaction: discord.Interaction, channel: discord.TextChannel):
-    member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(interaction.user.id)
+    member = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
     if not is_admin_member(member):
         return await interaction.response.send_message("Only configured admins can run this command.", ephemeral=True)
     config["log_channel_id"] = channel.id
     save_config()
     await interaction.response.send_message(f"Log channel set to {channel.mention}", ephemeral=True)
 
-@bot.tree.command(name="verifyuser", description="Manually verify (remove Sus role) from a user.")
-@app_commands.describe(member="Member to verify")
+@bot.tree.command(name="verifyuser")
 async def verifyuser(interaction: discord.Interaction, member: discord.Member):
-    inv = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(interaction.user.id)
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
     if not is_admin_member(inv):
         return await interaction.response.send_message("Only configured admins can run this command.", ephemeral=True)
     await remove_sus_role_from_member(member, by_user=interaction.user, reason="Manual verify via command")
     await interaction.response.send_message(f"Removed Sus role (if present) from {member.mention}. Logged to the log channel.", ephemeral=True)
 
-@bot.tree.command(name="autoscan", description="Enable or disable automatic daily scanning.")
-@app_commands.describe(action="on or off")
+@bot.tree.command(name="autoscan")
 async def autoscan(interaction: discord.Interaction, action: str):
-    inv = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(interaction.user.id)
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
     if not is_admin_member(inv):
         return await interaction.response.send_message("Only configured admins can run this command.", ephemeral=True)
     action = action.lower()
-    config["autoscan_enabled"] = (action == "on")
-    save_config()
+    set_autoscan_enabled(action == "on")
     await interaction.response.send_message(f"Auto-scan is now {'ENABLED' if config['autoscan_enabled'] else 'DISABLED'}.", ephemeral=True)
 
-@bot.tree.command(name="scan", description="Scan members for platform usage.")
-@app_commands.describe(member="Check one member only", duration="Quick filter by join time", start="Start ISO timestamp", end="End ISO timestamp", apply_sus="If true, ask to mark matched users Sus")
-async def scan_interaction(interaction: discord.Interaction, member: discord.Member = None, duration: str = None, start: str = None, end: str = None, apply_sus: bool = False):
-    inv = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(interaction.user.id)
+@bot.tree.command(name="rule")
+async def rule_interaction(interaction: discord.Interaction, action: str, expression: str = None, member: discord.Member = None):
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
+    if not is_admin_member(inv):
+        return await interaction.response.send_message("Only configured admins can run this command.", ephemeral=True)
+    action = action.lower()
+    if action in ("set", "reset"):
+        try:
+            compiled = set_detection_rule(DEFAULT_RULE if action == "reset" else (expression or ""))
+        except RuleError as e:
+            return await interaction.response.send_message(f"Rule not changed: {e}", ephemeral=True)
+        await interaction.response.send_message(f"Detection rule is now: `{compiled.source}`", ephemeral=True)
+        await log_to_channel(interaction.guild, f"Detection rule changed by <@{interaction.user.id}>: `{compiled.source}`")
+        return
+    if action == "test":
+        if not member:
+            return await interaction.response.send_message("Pick a member to test.", ephemeral=True)
+        return await interaction.response.send_message(rule_test_reply(interaction.guild, member.id, member), ephemeral=True)
+    await interaction.response.send_message(f"Current detection rule: `{detection_rule.source}`", ephemeral=True)
+
+@bot.tree.command(name="jobs")
+async def jobs_interaction(interaction: discord.Interaction, action: str = "list", job_id: str = None):
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
+    if not is_admin_member(inv):
+        return await interaction.response.send_message("Only configured admins can run this command.", ephemeral=True)
+    if action == "list" or not job_id:
+        return await interaction.response.send_message(list_bulk_jobs(), ephemeral=True)
+    await interaction.response.send_message(control_bulk_job(action.lower(), job_id), ephemeral=True)
+
+@bot.tree.command(name="scanjobs")
+async def scanjobs_interaction(interaction: discord.Interaction, action: str = "list", job_id: str = None):
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
+    if not is_admin_member(inv):
+        return await interaction.response.send_message("Only configured admins can run this command.", ephemeral=True)
+    if action == "list" or not job_id:
+        return await interaction.response.send_message(list_scan_jobs(), ephemeral=True)
+    if action == "result":
+        path, error = scan_job_result_file(job_id)
+        if error:
+            return await interaction.response.send_message(error, ephemeral=True)
+        try:
+            return await interaction.response.send_message(f"Results of scan job `{job_id}`", file=discord.File(path), ephemeral=True)
+        finally:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+    await interaction.response.send_message(control_scan_job(action.lower(), job_id), ephemeral=True)
+
+@bot.tree.command(name="cohorts")
+async def cohorts_interaction(interaction: discord.Interaction, window: str = None, apply: bool = False):
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
+    if not is_admin_member(inv):
+        return await interaction.response.send_message("Only configured admins can run this command.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+    try:
+        cohorts = await detect_cohorts(interaction.guild, window)
+    except Exception as e:
+        print("cohorts error:", e)
+        traceback.print_exc()
+        return await interaction.followup.send("Cohort analysis failed (see console).", ephemeral=True)
+    await interaction.followup.send(await handle_cohorts(interaction.guild, cohorts, interaction.user.id, apply), ephemeral=True)
+
+@bot.tree.command(name="releaseall")
+async def releaseall_interaction(interaction: discord.Interaction):
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
+    if not is_admin_member(inv):
+        return await interaction.response.send_message("Only configured admins can run this.", ephemeral=True)
+    role = interaction.guild.get_role(config.get("sus_role_id") or 0)
+    if not role:
+        return await interaction.response.send_message("Sus role is not configured.", ephemeral=True)
+    targets = sorted(sus_members)
+    if not targets:
+        return await interaction.response.send_message("Nobody currently has the Sus role.", ephemeral=True)
+    job = create_bulk_job("release", interaction.guild, targets, interaction.user.id, f"Bulk release by {interaction.user}")
+    await interaction.response.send_message(f"Started bulk release job `{job['id']}` for {len(targets)} users. Track it with `/jobs`.", ephemeral=True)
+    await log_to_channel(interaction.guild, f"Bulk release job `{job['id']}` started by <@{interaction.user.id}> for {len(targets)} users.")
+
+def diag_report(report: str, guild: discord.Guild) -> str:
+    if report == "queue":
+        return role_queue_report()
+    if report == "slo":
+        return verify_slo_report()
+    if report == "lag":
+        return loop_monitor.report() if loop_monitor else "Loop monitor is not running yet."
+    if report == "trace":
+        return f"**Stage latency** (spans in `{tracer.path}`)\n```\n{tracer.summary()[:1800]}\n```"
+    if report == "rest":
+        return rest_calls_report()[:1900]
+    if report == "heap":
+        return heap_diff_reply(rebase=True)[0]
+    return member_memory_report(guild)[:1990]
+
+@bot.tree.command(name="diag")
+async def diag_interaction(interaction: discord.Interaction, report: str = "queue"):
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
+    if not is_admin_member(inv):
+        return await interaction.response.send_message("Only configured admins can run this.", ephemeral=True)
+    await interaction.response.send_message(diag_report(report, interaction.guild), ephemeral=True)
+
+@bot.tree.command(name="scan")
+async def scan_interaction(interaction: discord.Interaction, member: discord.Member = None, duration: str = None, start: str = None, end: str = None, apply_sus: bool = False, diff: bool = False):
+    inv = interaction_member(interaction) or await interaction.guild.fetch_member(interaction.user.id)
     if not is_admin_member(inv):
         return await interaction.response.send_message("Only configured admins can run this.", ephemeral=True)
 
@@ -1299,44 +3209,54 @@ async def scan_interaction(interaction: discord.Interaction, member: discord.Mem
         except Exception:
             target_member = member
 
-    rows = await perform_scan(interaction.guild, member=target_member, duration=duration, start_iso=start, end_iso=end)
-
     if target_member:
+        rows = await perform_scan(interaction.guild, member=target_member)
         if not rows:
             return await interaction.followup.send("Member not found or has no presence info.", ephemeral=True)
         r = rows[0]
         platforms = r.get("platforms", [])
         platforms_text = ", ".join(platforms) or "offline/no-presence"
-        if set(platforms) == {"web"}:
+        if is_sus_candidate(target_member, platforms):
             view = MarkSusView(interaction.guild.id, target_member.id, ephemeral=True)
             try:
-                return await interaction.followup.send(f"User {target_member.mention} appears to be web-only. Mark as Sus?", view=view, ephemeral=True)
+                return await interaction.followup.send(f"User {target_member.mention} matches the detection rule ({platforms_text}). Mark as Sus?", view=view, ephemeral=True)
             except Exception:
-                return await interaction.followup.send(f"User {target_member.mention} appears to be web-only. Run `/verifyuser member:{target_member.id}` to mark Sus manually.", ephemeral=True)
+                return await interaction.followup.send(f"User {target_member.mention} matches the detection rule. Run `/verifyuser member:{target_member.id}` to mark Sus manually.", ephemeral=True)
         return await interaction.followup.send(f"Platforms for {r['tag']}: {platforms_text}\nID: {r['userId']}\nJoined: {r['joinedAt']}", ephemeral=True)
 
-    if not rows:
-        return await interaction.followup.send("No members matched the criteria.", ephemeral=True)
-    if len(rows) <= 300:
-        header = "user | server nickname | id | mention | platform(s)"
-        body = "\n".join([f"{r['tag']} | {r['displayName']} | {r['userId']} | <@{r['userId']}> | {', '.join(r.get('platforms',[]))}" for r in rows])
-        await log_to_channel(interaction.guild, f"Bulk scan completed ({len(rows)} members):\n{header}\n{body}")
-        return await interaction.followup.send("Bulk scan complete and logged.", ephemeral=True)
-    else:
-        csv_path = create_csv_for_scan(rows)
-        await log_to_channel(interaction.guild, f"Bulk scan completed: {len(rows)} members — CSV attached.", csv_path)
+    # bulk scans run as background jobs; the outcome arrives as a followup (or a DM once the token expired)
+    async def notify(text: str):
         try:
-            os.remove(csv_path)
+            await interaction.followup.send(text, ephemeral=True)
         except Exception:
-            pass
-        return await interaction.followup.send("Bulk scan complete and CSV uploaded to the log channel.", ephemeral=True)
+            await dm_user(interaction.user.id, text)
+    job, created = start_scan_job(interaction.guild, interaction.user.id, notify, duration=duration, start_iso=start,
+                                  end_iso=end, diff=diff, apply_sus=apply_sus)
+    if created:
+        return await interaction.followup.send(f"Scan job `{job['id']}` {job['status']}. The result will be sent here; track it with `/scanjobs`.", ephemeral=True)
+    return await interaction.followup.send(f"An identical scan is already {job['status']} as job `{job['id']}`; its result will be sent here too.", ephemeral=True)
 
 # -------------------------
 # Start
 # -------------------------
 def main():
+    global startup_rss_mb
     load_config()
     load_sus_platform_cache()
+    if LEAN_MODE:
+        install_lean_gateway_taps()
+    if GATEWAY_RECORD_DIR:
+        install_gateway_recorder()
+    install_rest_accounting()
+    apply_command_schemas()
+    try:
+        dropped = ScanArchive(SCAN_ARCHIVE_DIR).repair()
+        if dropped:
+            print(f"scan archive: dropped {dropped} bytes of torn tail")
+    except Exception as e:
+        print("scan archive repair error:", e)
+    startup_rss_mb = rss_mb()
+    print(f"Starting ({'lean' if LEAN_MODE else 'full member cache'}{', slash-only' if SLASH_ONLY else ''}), RSS {startup_rss_mb:.1f} MB")
     bot.run(BOT_TOKEN)
 
 if __name__ == "__main__":
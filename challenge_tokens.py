@@ -0,0 +1,168 @@
+# challenge_tokens.py
+# Stateless verification challenges: everything needed to check an answer travels in a
+# signed token (component / modal custom_id), so no server-side store is needed and any
+# bot process holding the same key can handle the submit.
+#
+# Token = "<prefix>" + base64url(payload | tag), well under Discord's 100-char custom_id limit.
+#   payload  u8 version | u8 kind | u32 expiry (unix) | u64 user id | u8 platform mask |
+#            4-byte nonce | 6-byte answer tag | u8 prompt length | prompt (utf-8, <= 16 bytes)
+#   tag      first 10 bytes of HMAC-SHA256(key, guild id | payload)
+# The answer tag is HMAC(key, nonce | user id | normalized answer), so the answer itself is not
+# recoverable from the token without the key. The prompt is shown to the user anyway.
+# The only server-side state is UsedChallenges: the nonces of correctly answered tokens, kept until
+# they expire so a token cannot be submitted twice (per process; bounded like AttemptThrottle).
+
+from __future__ import annotations
+import base64
+import hashlib
+import hmac
+import secrets
+import struct
+import sys
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+VERSION = 1
+KINDS = {"word": 1, "math": 2}
+_KIND_NAMES = {v: k for k, v in KINDS.items()}
+_HEAD = struct.Struct("<BBIQB4s6sB")
+TAG_BYTES = 10
+MAX_PROMPT_BYTES = 16
+
+def _dict_nbytes(d: Dict) -> int:
+    """Approximate footprint of a dict of uniformly shaped entries, sized from the first one."""
+    size = sys.getsizeof(d)
+    for key, value in d.items():
+        parts = [key, value] + list(key if isinstance(key, tuple) else ()) + list(value if isinstance(value, tuple) else ())
+        return size + len(d) * sum(sys.getsizeof(p) for p in parts)
+    return size
+
+class Challenge(NamedTuple):
+    kind: str
+    expires_at: int
+    user_id: int
+    platform_mask: int
+    prompt: str
+    nonce: bytes
+    answer_tag: bytes
+
+class ChallengeSigner:
+    def __init__(self, key: bytes):
+        if not key:
+            raise ValueError("challenge signing key must not be empty")
+        self.key = key
+
+    def _mac(self, *parts: bytes) -> bytes:
+        return hmac.new(self.key, b"\0".join(parts), hashlib.sha256).digest()
+
+    def _answer_tag(self, nonce: bytes, user_id: int, answer: str) -> bytes:
+        return self._mac(b"answer", nonce, str(user_id).encode(), answer.strip().lower().encode("utf-8"))[:6]
+
+    def issue(self, guild_id: int, user_id: int, kind: str, answer: str, prompt: str,
+              platform_mask: int = 0, ttl: int = 300, nonce: bytes = None, now: float = None) -> str:
+        prompt_bytes = prompt.encode("utf-8")
+        if len(prompt_bytes) > MAX_PROMPT_BYTES:
+            raise ValueError("challenge prompt too long")
+        nonce = nonce or secrets.token_bytes(4)
+        expires = int((now if now is not None else time.time()) + ttl)
+        payload = _HEAD.pack(VERSION, KINDS[kind], expires, user_id, platform_mask & 0xFF, nonce,
+                             self._answer_tag(nonce, user_id, answer), len(prompt_bytes)) + prompt_bytes
+        tag = self._mac(b"token", str(guild_id).encode(), payload)[:TAG_BYTES]
+        return base64.urlsafe_b64encode(payload + tag).rstrip(b"=").decode("ascii")
+
+    def open(self, token: str, guild_id: int, now: float = None) -> Tuple[Optional[Challenge], str]:
+        """Verify `token`. Returns (challenge, "") or (None, reason) with reason "invalid" or "expired"."""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except Exception:
+            return None, "invalid"
+        if len(raw) < _HEAD.size + TAG_BYTES:
+            return None, "invalid"
+        payload, tag = raw[:-TAG_BYTES], raw[-TAG_BYTES:]
+        if not hmac.compare_digest(tag, self._mac(b"token", str(guild_id).encode(), payload)[:TAG_BYTES]):
+            return None, "invalid"
+        version, kind, expires, user_id, mask, nonce, answer_tag, plen = _HEAD.unpack_from(payload)
+        prompt = payload[_HEAD.size:_HEAD.size + plen]
+        if version != VERSION or kind not in _KIND_NAMES or len(prompt) != plen:
+            return None, "invalid"
+        if (now if now is not None else time.time()) > expires:
+            return None, "expired"
+        return Challenge(_KIND_NAMES[kind], expires, user_id, mask, prompt.decode("utf-8", "replace"), nonce, answer_tag), ""
+
+    def check_answer(self, challenge: Challenge, answer: str) -> bool:
+        return hmac.compare_digest(challenge.answer_tag, self._answer_tag(challenge.nonce, challenge.user_id, answer))
+
+class AttemptThrottle:
+    """
+    Fixed-window attempt counter per user. Memory is bounded: once `max_users` windows are
+    tracked, expired windows are dropped (and if all are live, the oldest ones).
+    """
+
+    def __init__(self, max_attempts: int = 5, window: float = 60.0, max_users: int = 10000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_users = max_users
+        self._windows: Dict[int, Tuple[float, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def nbytes(self) -> int:
+        return _dict_nbytes(self._windows)
+
+    def allow(self, user_id: int, now: float = None) -> bool:
+        """Count one attempt for `user_id`; False once the user is over the limit for this window."""
+        now = now if now is not None else time.monotonic()
+        start, count = self._windows.get(user_id, (now, 0))
+        if now - start >= self.window:
+            start, count = now, 0
+        if count >= self.max_attempts:
+            return False
+        if user_id not in self._windows and len(self._windows) >= self.max_users:
+            self._prune(now)
+        self._windows[user_id] = (start, count + 1)
+        return True
+
+    def retry_after(self, user_id: int, now: float = None) -> float:
+        now = now if now is not None else time.monotonic()
+        start, _ = self._windows.get(user_id, (now, 0))
+        return max(self.window - (now - start), 0.0)
+
+    def _prune(self, now: float):
+        for uid in [uid for uid, (start, _) in self._windows.items() if now - start >= self.window]:
+            del self._windows[uid]
+        while len(self._windows) >= self.max_users:
+            del self._windows[next(iter(self._windows))]
+
+class UsedChallenges:
+    """
+    (user id, nonce) of challenges already answered, kept until the token expires. Memory is
+    bounded like AttemptThrottle: once `max_entries` are tracked, expired ones are dropped
+    (and if all are live, the oldest ones).
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._used: Dict[Tuple[int, bytes], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._used)
+
+    def nbytes(self) -> int:
+        return _dict_nbytes(self._used)
+
+    def claim(self, challenge: Challenge, now: float = None) -> bool:
+        """Mark `challenge` used; False when it was used before."""
+        key = (challenge.user_id, challenge.nonce)
+        if key in self._used:
+            return False
+        if len(self._used) >= self.max_entries:
+            self._prune(now if now is not None else time.time())
+        self._used[key] = challenge.expires_at
+        return True
+
+    def _prune(self, now: float):
+        for key in [key for key, expires in self._used.items() if expires < now]:
+            del self._used[key]
+        while len(self._used) >= self.max_entries:
+            del self._used[next(iter(self._used))]
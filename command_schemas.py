@@ -0,0 +1,264 @@
+# command_schemas.py
+# Single definition of the bot's slash commands (Discord application command JSON)
+#
+# register_commands.py, register_commands_force.py and bot.py all read COMMANDS from here.
+# A content hash of the last successfully registered set is kept locally, so registration
+# (the scripts or the bot at startup) only calls the API when the definitions actually change.
+# If commands are edited outside this repo, run `python register_commands.py --force` once.
+
+from __future__ import annotations
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+COMMANDS_HASH_PATH = Path(".commands_hash.json")
+
+# The commands to register (guild-scoped)
+COMMANDS = [
+    {
+        "name": "setupverify",
+        "description": "Interactive setup for verification (run in the verify channel)",
+    },
+    {
+        "name": "setlog",
+        "description": "Set the channel where verification & sus logs should be sent.",
+        "options": [
+            {
+                "name": "channel",
+                "description": "Text channel to use as logs",
+                "type": 7,   # CHANNEL
+                "required": True
+            }
+        ]
+    },
+    {
+        "name": "verifyuser",
+        "description": "Manually verify (remove Sus role) from a user.",
+        "options": [
+            {
+                "name": "member",
+                "description": "Member to verify",
+                "type": 6,   # USER
+                "required": True
+            }
+        ]
+    },
+    {
+        "name": "autoscan",
+        "description": "Enable or disable autoscan: re-checks changed members on an interval, plus a periodic full rescan.",
+        "options": [
+            {
+                "name": "action",
+                "description": "on or off",
+                "type": 3,  # STRING
+                "required": True,
+                "choices": [
+                    {"name": "on", "value": "on"},
+                    {"name": "off", "value": "off"}
+                ]
+            }
+        ]
+    },
+    {
+        "name": "rule",
+        "description": "Show, test or hot-swap the Sus detection rule.",
+        "options": [
+            {
+                "name": "action",
+                "description": "show, set, test or reset",
+                "type": 3,  # STRING
+                "required": True,
+                "choices": [
+                    {"name": "show", "value": "show"},
+                    {"name": "set", "value": "set"},
+                    {"name": "test", "value": "test"},
+                    {"name": "reset", "value": "reset"}
+                ]
+            },
+            {
+                "name": "expression",
+                "description": "Rule text (for set)",
+                "type": 3,
+                "required": False
+            },
+            {
+                "name": "member",
+                "description": "Member to test the rule against (for test)",
+                "type": 6,   # USER
+                "required": False
+            }
+        ]
+    },
+    {
+        "name": "jobs",
+        "description": "List, inspect or control bulk Sus apply/release jobs.",
+        "options": [
+            {
+                "name": "action",
+                "description": "list, status, pause, resume or cancel",
+                "type": 3,  # STRING
+                "required": False,
+                "choices": [
+                    {"name": "list", "value": "list"},
+                    {"name": "status", "value": "status"},
+                    {"name": "pause", "value": "pause"},
+                    {"name": "resume", "value": "resume"},
+                    {"name": "cancel", "value": "cancel"}
+                ]
+            },
+            {
+                "name": "job_id",
+                "description": "Job id (for everything but list)",
+                "type": 3,
+                "required": False
+            }
+        ]
+    },
+    {
+        "name": "scanjobs",
+        "description": "List, inspect, cancel or fetch results of background scan jobs.",
+        "options": [
+            {
+                "name": "action",
+                "description": "list, status, cancel or result",
+                "type": 3,  # STRING
+                "required": False,
+                "choices": [
+                    {"name": "list", "value": "list"},
+                    {"name": "status", "value": "status"},
+                    {"name": "cancel", "value": "cancel"},
+                    {"name": "result", "value": "result"}
+                ]
+            },
+            {
+                "name": "job_id",
+                "description": "Scan job id (for everything but list)",
+                "type": 3,
+                "required": False
+            }
+        ]
+    },
+    {
+        "name": "cohorts",
+        "description": "Find raid cohorts: accounts that joined together and were created together.",
+        "options": [
+            {
+                "name": "window",
+                "description": "Only members who joined within this window",
+                "type": 3,  # STRING
+                "required": False,
+                "choices": [
+                    {"name": "last_hour", "value": "last_hour"},
+                    {"name": "last_day", "value": "last_day"},
+                    {"name": "last_week", "value": "last_week"},
+                    {"name": "last_month", "value": "last_month"}
+                ]
+            },
+            {
+                "name": "apply",
+                "description": "If true, mark each cohort Sus as one bulk job",
+                "type": 5,  # BOOLEAN
+                "required": False
+            }
+        ]
+    },
+    {
+        "name": "releaseall",
+        "description": "Bulk-release everyone with the Sus role as a resumable job."
+    },
+    {
+        "name": "diag",
+        "description": "Bot diagnostics: role queue, verify SLO, loop lag, trace stages, REST calls, memory or heap diff.",
+        "options": [
+            {
+                "name": "report",
+                "description": "Which report to show",
+                "type": 3,  # STRING
+                "required": False,
+                "choices": [
+                    {"name": "queue", "value": "queue"},
+                    {"name": "slo", "value": "slo"},
+                    {"name": "lag", "value": "lag"},
+                    {"name": "trace", "value": "trace"},
+                    {"name": "rest", "value": "rest"},
+                    {"name": "memory", "value": "memory"},
+                    {"name": "heap", "value": "heap"}
+                ]
+            }
+        ]
+    },
+    {
+        "name": "scan",
+        "description": "Scan members for platform usage. Optionally mark matching users Sus as a bulk job.",
+        "options": [
+            {
+                "name": "member",
+                "description": "Check one member only",
+                "type": 6,   # USER
+                "required": False
+            },
+            {
+                "name": "duration",
+                "description": "Quick filter by join time",
+                "type": 3,
+                "required": False,
+                "choices": [
+                    {"name": "last_hour", "value": "last_hour"},
+                    {"name": "last_day", "value": "last_day"},
+                    {"name": "last_week", "value": "last_week"},
+                    {"name": "last_month", "value": "last_month"}
+                ]
+            },
+            {
+                "name": "start",
+                "description": "Start ISO timestamp",
+                "type": 3,
+                "required": False
+            },
+            {
+                "name": "end",
+                "description": "End ISO timestamp",
+                "type": 3,
+                "required": False
+            },
+            {
+                "name": "apply_sus",
+                "description": "If true, mark matching users Sus as a bulk job",
+                "type": 5,  # BOOLEAN
+                "required": False
+            },
+            {
+                "name": "diff",
+                "description": "Only report changes since the previous scan with the same filter",
+                "type": 5,  # BOOLEAN
+                "required": False
+            }
+        ]
+    }
+]
+
+def commands_hash(commands: List[Dict[str, Any]] = None) -> str:
+    """sha256 of the canonical JSON of `commands` (key order and whitespace do not matter)."""
+    canonical = json.dumps(commands if commands is not None else COMMANDS, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _hash_key(app_id, guild_id) -> str:
+    return f"{app_id}:{guild_id}"
+
+def load_synced_hash(app_id, guild_id, path: Path = COMMANDS_HASH_PATH) -> Optional[str]:
+    try:
+        return json.loads(path.read_text()).get(_hash_key(app_id, guild_id))
+    except Exception:
+        return None
+
+def save_synced_hash(app_id, guild_id, digest: str, path: Path = COMMANDS_HASH_PATH):
+    try:
+        data = json.loads(path.read_text()) if path.exists() else {}
+    except Exception:
+        data = {}
+    data[_hash_key(app_id, guild_id)] = digest
+    path.write_text(json.dumps(data, indent=2))
+
+def commands_changed(app_id, guild_id, path: Path = COMMANDS_HASH_PATH) -> bool:
+    return load_synced_hash(app_id, guild_id, path) != commands_hash()
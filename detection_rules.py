@@ -0,0 +1,250 @@
+# detection_rules.py
+# Small rule language for "is this member Sus?", compiled once into predicates
+#
+# Grammar (keywords are case-insensitive):
+#   rule       := or_expr
+#   or_expr    := and_expr ("or" and_expr)*
+#   and_expr   := unary ("and" unary)*
+#   unary      := "not" unary | primary
+#   primary    := "(" rule ")" | "true" | "false" | call | comparison
+#   comparison := "platforms" ("==" | "!=") platforms
+#               | numeric ("<" | "<=" | ">" | ">=" | "==" | "!=") value
+#   numeric    := join_age | account_age | role_count | tracked_for   (role_count excludes @everyone)
+#   call       := has_role(ROLE_ID) | uses(platforms)
+#               | continuous(platforms, DURATION) | seen(platforms, DURATION)
+#   platforms  := none | NAME ("+" NAME)*          NAME in web, mobile, desktop
+#   value      := NUMBER | DURATION                 DURATION = NUMBER followed by s, m, h, d or w
+#
+# Examples:
+#   platforms == web
+#   platforms == web and continuous(web, 10m) and account_age < 30d
+#   not seen(desktop+mobile, 7d) and tracked_for >= 7d and not has_role(123456789012345678)
+
+from __future__ import annotations
+import operator
+import re
+from typing import Callable, FrozenSet, List, Optional, Set, Tuple
+
+from member_store import PLATFORM_BITS
+
+DEFAULT_RULE = "platforms == web"
+DISCORD_EPOCH = 1420070400
+
+class RuleError(ValueError):
+    """Raised when a rule does not parse; the message points at the offending position."""
+
+class MemberFeatures:
+    """Everything a rule may look at for one member. Timestamps are epoch seconds."""
+    __slots__ = ("user_id", "mask", "joined_ts", "created_ts", "role_ids", "now", "history")
+
+    def __init__(self, user_id: int, mask: int, joined_ts: Optional[float], now: float,
+                 role_ids: FrozenSet[int] = frozenset(), history=None):
+        self.user_id = user_id
+        self.mask = mask
+        self.joined_ts = joined_ts
+        self.created_ts = ((user_id >> 22) / 1000.0) + DISCORD_EPOCH
+        self.role_ids = role_ids
+        self.now = now
+        self.history = history
+
+# -------------------------
+# Tokenizer
+# -------------------------
+_TOKEN_RE = re.compile(r"\s*(?:(?P<num>\d+(?:\.\d+)?)(?P<unit>[smhdw])?\b|(?P<name>[A-Za-z_][A-Za-z0-9_]*)|(?P<op>==|!=|<=|>=|<|>|\(|\)|,|\+))")
+_UNITS = {None: 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_PLATFORMS = {name: bit for name, bit in PLATFORM_BITS}
+_COMPARE = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+def _tokenize(text: str) -> List[Tuple[str, object, int]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m:
+            pos += len(text[pos:]) - len(text[pos:].lstrip())
+            raise RuleError(f"unexpected character {text[pos]!r} at position {pos}")
+        if m.group("num") is not None:
+            num, unit = m.group("num"), m.group("unit")
+            # keep plain integers exact: role ids are 64-bit snowflakes
+            value = int(num) if unit is None and "." not in num else float(num) * _UNITS[unit]
+            tokens.append(("num", value, m.start("num")))
+        elif m.group("name") is not None:
+            tokens.append(("name", m.group("name").lower(), m.start("name")))
+        else:
+            tokens.append(("op", m.group("op"), m.start("op")))
+        pos = m.end()
+    tokens.append(("end", None, len(text)))
+    return tokens
+
+# -------------------------
+# Feature accessors
+# -------------------------
+def _join_age(f: MemberFeatures) -> float:
+    return f.now - f.joined_ts if f.joined_ts else float("inf")
+
+def _account_age(f: MemberFeatures) -> float:
+    return f.now - f.created_ts
+
+def _role_count(f: MemberFeatures) -> float:
+    return len(f.role_ids)
+
+def _tracked_for(f: MemberFeatures) -> float:
+    since = f.history.tracked_since(f.user_id) if f.history is not None else None
+    return f.now - since if since is not None else 0.0
+
+# name -> (accessor, features needed beyond the snapshot)
+_NUMERIC = {
+    "join_age": (_join_age, ()),
+    "account_age": (_account_age, ()),
+    "role_count": (_role_count, ("roles",)),
+    "tracked_for": (_tracked_for, ("history",)),
+}
+
+# -------------------------
+# Parser / compiler
+# -------------------------
+class _Compiler:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.i = 0
+        self.needs: Set[str] = set()
+
+    def peek(self):
+        return self.tokens[self.i]
+
+    def take(self):
+        tok = self.tokens[self.i]
+        self.i += 1
+        return tok
+
+    def expect(self, kind: str, value=None):
+        tok = self.take()
+        if tok[0] != kind or (value is not None and tok[1] != value):
+            want = repr(value) if value is not None else {"num": "a number", "op": "an operator", "end": "end of rule"}.get(kind, kind)
+            got = tok[1] if tok[0] != "end" else "end of rule"
+            raise RuleError(f"expected {want} at position {tok[2]}, got {got!r}")
+        return tok
+
+    def compile(self) -> Callable[[MemberFeatures], bool]:
+        pred = self.or_expr()
+        self.expect("end")
+        return pred
+
+    def or_expr(self):
+        parts = [self.and_expr()]
+        while self.peek()[:2] == ("name", "or"):
+            self.take()
+            parts.append(self.and_expr())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda f: any(p(f) for p in parts)
+
+    def and_expr(self):
+        parts = [self.unary()]
+        while self.peek()[:2] == ("name", "and"):
+            self.take()
+            parts.append(self.unary())
+        if len(parts) == 1:
+            return parts[0]
+        if len(parts) == 2:
+            a, b = parts
+            return lambda f: a(f) and b(f)
+        return lambda f: all(p(f) for p in parts)
+
+    def unary(self):
+        if self.peek()[:2] == ("name", "not"):
+            self.take()
+            inner = self.unary()
+            return lambda f: not inner(f)
+        return self.primary()
+
+    def primary(self):
+        kind, value, pos = self.take()
+        if (kind, value) == ("op", "("):
+            inner = self.or_expr()
+            self.expect("op", ")")
+            return inner
+        if kind != "name":
+            raise RuleError(f"expected a condition at position {pos}, got {value if kind != 'end' else 'end of rule'!r}")
+        if value in ("true", "false"):
+            result = value == "true"
+            return lambda f: result
+        if value == "platforms":
+            op = self.expect("op")
+            if op[1] not in ("==", "!="):
+                raise RuleError(f"platforms only supports == and != (position {op[2]})")
+            mask = self.platform_set()
+            if op[1] == "==":
+                return lambda f: f.mask == mask
+            return lambda f: f.mask != mask
+        if value in _NUMERIC:
+            accessor, needs = _NUMERIC[value]
+            self.needs.update(needs)
+            op = self.expect("op")
+            cmp = _COMPARE.get(op[1])
+            if cmp is None:
+                raise RuleError(f"expected a comparison after {value!r} at position {op[2]}")
+            limit = self.expect("num")[1]
+            return lambda f: cmp(accessor(f), limit)
+        if self.peek()[:2] == ("op", "("):
+            return self.call(value, pos)
+        raise RuleError(f"unknown name {value!r} at position {pos}")
+
+    def call(self, name: str, pos: int):
+        self.expect("op", "(")
+        if name == "has_role":
+            role_id = self.expect("num")[1]
+            self.expect("op", ")")
+            self.needs.add("roles")
+            return lambda f: role_id in f.role_ids
+        if name == "uses":
+            bits = self.platform_set()
+            self.expect("op", ")")
+            return lambda f: bool(f.mask & bits)
+        if name in ("continuous", "seen"):
+            mask = self.platform_set()
+            self.expect("op", ",")
+            seconds = self.expect("num")[1]
+            self.expect("op", ")")
+            self.needs.add("history")
+            if name == "continuous":
+                return lambda f: f.history is not None and f.history.continuous(f.user_id, mask, f.now) >= seconds
+            return lambda f: f.history is not None and f.history.seen_within(f.user_id, mask, seconds, f.now)
+        raise RuleError(f"unknown function {name!r} at position {pos}")
+
+    def platform_set(self) -> int:
+        kind, value, pos = self.take()
+        if (kind, value) == ("name", "none"):
+            return 0
+        mask = 0
+        while True:
+            if kind != "name" or value not in _PLATFORMS:
+                raise RuleError(f"expected a platform (web, mobile, desktop or none) at position {pos}")
+            mask |= _PLATFORMS[value]
+            if self.peek()[:2] != ("op", "+"):
+                return mask
+            self.take()
+            kind, value, pos = self.take()
+
+class CompiledRule:
+    """A parsed rule. Call it with MemberFeatures; `needs` lists optional features it reads."""
+    __slots__ = ("source", "predicate", "needs")
+
+    def __init__(self, source: str, predicate: Callable[[MemberFeatures], bool], needs: FrozenSet[str]):
+        self.source = source
+        self.predicate = predicate
+        self.needs = needs
+
+    def __call__(self, features: MemberFeatures) -> bool:
+        return self.predicate(features)
+
+    def __repr__(self):
+        return f"CompiledRule({self.source!r})"
+
+def compile_rule(text: str) -> CompiledRule:
+    text = (text or "").strip()
+    if not text:
+        raise RuleError("rule is empty")
+    compiler = _Compiler(text)
+    return CompiledRule(text, compiler.compile(), frozenset(compiler.needs))
@@ -0,0 +1,114 @@
+# gateway_log.py
+# Compact on-disk log of the gateway events the bot handles, for offline replay (replay_gateway.py)
+#
+# File layout (the whole stream is gzip-compressed, flushed every few seconds so a live file is readable):
+#   b"GWLOG1\n" | u32 header length | header JSON (guild id, channel ids, config at start, ...)
+#   records:  f64 seconds since recording start | u8 event code | u32 payload length | payload JSON
+# Payloads are the raw gateway dispatch data, minus fields replay never needs (interaction tokens,
+# session ids). Only events for the bot's own guild are written.
+
+from __future__ import annotations
+import gzip
+import json
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+MAGIC = b"GWLOG1\n"
+_RECORD = struct.Struct("<dBI")
+
+# gateway events worth replaying; codes are part of the file format, append only
+EVENT_CODES = {
+    "READY": 1,
+    "GUILD_CREATE": 2,
+    "GUILD_MEMBERS_CHUNK": 3,
+    "GUILD_MEMBER_ADD": 4,
+    "GUILD_MEMBER_UPDATE": 5,
+    "GUILD_MEMBER_REMOVE": 6,
+    "PRESENCE_UPDATE": 7,
+    "INTERACTION_CREATE": 8,
+}
+EVENT_NAMES = {code: name for name, code in EVENT_CODES.items()}
+
+def trim_payload(event: str, data: Dict[str, Any], guild_id: int) -> Optional[Dict[str, Any]]:
+    """The part of `data` worth keeping, or None when the event is not for `guild_id`."""
+    if event == "READY":
+        guilds = [g for g in data.get("guilds", []) if int(g.get("id", 0)) == guild_id]
+        return {"user": data.get("user"), "application": data.get("application"), "guilds": guilds}
+    if int(data.get("guild_id") or (data.get("id") if event == "GUILD_CREATE" else 0) or 0) != guild_id:
+        return None
+    if event == "INTERACTION_CREATE":
+        data = dict(data, token="replay")
+    return data
+
+class GatewayRecorder:
+    def __init__(self, path: Path, guild_id: int, header: Dict[str, Any] = None,
+                 max_bytes: int = 512 * 1024 * 1024, flush_interval: float = 5.0):
+        self.path = Path(path)
+        self.guild_id = guild_id
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.events = 0
+        self.written = 0
+        self.stopped = False
+        self._start = time.monotonic()
+        self._last_flush = self._start
+        self._file = gzip.open(self.path, "wb", compresslevel=6)
+        head = json.dumps(dict(header or {}, guild_id=guild_id, started=time.time()), separators=(",", ":")).encode()
+        self._file.write(MAGIC + struct.pack("<I", len(head)) + head)
+
+    def record(self, event: str, data: Dict[str, Any]):
+        code = EVENT_CODES.get(event)
+        if code is None or self.stopped:
+            return
+        payload = trim_payload(event, data, self.guild_id)
+        if payload is None:
+            return
+        body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+        self._file.write(_RECORD.pack(time.monotonic() - self._start, code, len(body)) + body)
+        self.events += 1
+        self.written += _RECORD.size + len(body)
+        if self.written >= self.max_bytes:
+            print(f"Gateway recorder: {self.path} reached {self.max_bytes // 1048576} MB (uncompressed); recording stopped.")
+            self.close()
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def flush(self):
+        if not self.stopped:
+            self._file.flush()
+
+    def close(self):
+        if not self.stopped:
+            self.stopped = True
+            self._file.close()
+
+def read_log(path: Path) -> Tuple[Dict[str, Any], Iterator[Tuple[float, str, Dict[str, Any]]]]:
+    """(header, iterator of (offset seconds, event name, payload)). A truncated tail (live file) ends the iteration."""
+    f = gzip.open(Path(path), "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path} is not a gateway log")
+    (head_len,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(head_len))
+
+    def records():
+        try:
+            while True:
+                raw = f.read(_RECORD.size)
+                if len(raw) < _RECORD.size:
+                    return
+                offset, code, length = _RECORD.unpack(raw)
+                body = f.read(length)
+                if len(body) < length:
+                    return
+                yield offset, EVENT_NAMES.get(code, str(code)), json.loads(body)
+        except EOFError:
+            return
+        finally:
+            f.close()
+    return header, records()
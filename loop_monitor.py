@@ -0,0 +1,108 @@
+# loop_monitor.py
+# Event-loop lag monitor with a watchdog thread that names the code blocking the loop
+#
+# A ticker task sleeps `interval` seconds and records how late it woke up (loop lag). A daemon
+# thread watches the ticker's heartbeat; when the loop has not ticked for `threshold` seconds the
+# thread samples the loop thread's stack, so the report shows what was running during the stall
+# (e.g. "on_message > save_config") rather than only that a stall happened.
+
+from __future__ import annotations
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import Histogram, format_seconds, format_summary
+
+class LoopLagMonitor:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.25, project_root: str = None,
+                 on_stall: Callable[[float, str, List[str]], None] = None, max_handlers: int = 200):
+        self.threshold = threshold
+        self.interval = interval
+        self.project_root = os.path.abspath(project_root or os.getcwd())
+        self.on_stall = on_stall
+        self.max_handlers = max_handlers
+        self.lag_hist = Histogram()
+        # handler chain -> [count, total seconds, max seconds]
+        self.stalls: Dict[str, List[float]] = {}
+        self._heartbeat = time.monotonic()
+        self._sample: Optional[Tuple[str, List[str]]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._loop_thread_id = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._task = asyncio.create_task(self._ticker())
+            self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+            self._thread.start()
+        return self._task
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _ticker(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - before - self.interval, 0.0)
+            self._heartbeat = now
+            self.lag_hist.observe(lag)
+            sample, self._sample = self._sample, None
+            if lag >= self.threshold:
+                self._record_stall(lag, sample)
+
+    def _watchdog(self):
+        sampled_for = None
+        while not self._stop.wait(min(self.threshold / 2, self.interval)):
+            beat = self._heartbeat
+            if beat == sampled_for or time.monotonic() - beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._sample = self._describe(traceback.extract_stack(frame))
+                sampled_for = beat
+
+    def _describe(self, stack: traceback.StackSummary) -> Tuple[str, List[str]]:
+        """(project call chain, innermost frames) for a stack sampled from the loop thread."""
+        own = os.path.abspath(__file__)
+        chain = [f.name for f in stack
+                 if not f.name.startswith("<") and "site-packages" not in f.filename
+                 and os.path.abspath(f.filename).startswith(self.project_root) and os.path.abspath(f.filename) != own]
+        lines = [f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in stack[-6:]]
+        handler = " > ".join(chain[-4:]) if chain else (stack[-1].name if stack else "?")
+        return handler, lines
+
+    def _record_stall(self, lag: float, sample: Optional[Tuple[str, List[str]]]):
+        handler, lines = sample if sample else ("(not sampled)", [])
+        entry = self.stalls.get(handler)
+        if entry is None:
+            if len(self.stalls) >= self.max_handlers:
+                del self.stalls[min(self.stalls, key=lambda k: self.stalls[k][1])]
+            entry = self.stalls[handler] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += lag
+        entry[2] = max(entry[2], lag)
+        if self.on_stall:
+            self.on_stall(lag, handler, lines)
+
+    def report(self, top: int = 8) -> str:
+        lines = [f"**Event loop lag** (tick {format_seconds(self.interval)}, stall threshold {format_seconds(self.threshold)})",
+                 f"lag {format_summary(self.lag_hist)}"]
+        if not self.stalls:
+            lines.append("No stalls recorded.")
+            return "\n".join(lines)
+        lines.append("Top stalls by total time:")
+        for handler, (count, total, worst) in sorted(self.stalls.items(), key=lambda kv: -kv[1][1])[:top]:
+            lines.append(f"`{handler[:80]}` ×{count:.0f} total {format_seconds(total)} max {format_seconds(worst)}")
+        return "\n".join(lines)
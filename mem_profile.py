@@ -0,0 +1,152 @@
+# mem_profile.py
+# Memory introspection: approximate sizes of long-lived structures and tracemalloc heap diffs
+#
+# Sizes are estimates. Containers are measured by walking a sample of their items (a few levels
+# deep) and scaling by the item count, so a report over a 200k-member cache stays cheap enough to
+# run on the event loop. Objects that report their own footprint with an `nbytes()` method (the
+# array-backed stores in member_store.py, presence_history.py) are trusted instead of walked.
+# Objects passed in `exclude` (e.g. discord.py's connection state, which every model links back to)
+# and code objects (modules, classes, functions) count as zero, so each structure's size is what it
+# holds on its own.
+#
+# Heap diffs: tracemalloc slows every allocation, so it is off until `start()`. `snapshot()` keeps a
+# baseline; `diff()` compares a new snapshot against it and writes the allocation sites that grew
+# most (by line, then the full tracebacks of the largest) to a text file.
+
+from __future__ import annotations
+import datetime
+import sys
+import time
+import tracemalloc
+import types
+from collections import deque
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+_LEAF = (str, bytes, bytearray, int, float, complex, bool, type(None), range, memoryview)
+_SHARED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.CodeType)
+_SEQUENCES = (list, tuple, set, frozenset, deque)
+
+def approx_size(obj: Any, sample: int = 64, depth: int = 4, exclude: Iterable[Any] = ()) -> int:
+    """Approximate bytes held by `obj` and what it references (see the module header)."""
+    seen = {id(o) for o in exclude}
+    return _size(obj, sample, depth, seen)
+
+def _size(obj: Any, sample: int, depth: int, seen: set) -> int:
+    if id(obj) in seen or isinstance(obj, _SHARED):
+        return 0
+    seen.add(id(obj))
+    nbytes = getattr(obj, "nbytes", None)
+    if callable(nbytes) and not isinstance(obj, type):
+        try:
+            return int(nbytes())
+        except Exception:
+            pass
+    size = sys.getsizeof(obj, 0)
+    if depth <= 0 or isinstance(obj, _LEAF):
+        return size
+    if isinstance(obj, dict):
+        count, children = len(obj), _take(obj.items(), sample)
+    elif isinstance(obj, _SEQUENCES):
+        count, children = len(obj), [(item,) for item in _take(obj, sample)]
+    else:
+        attrs = _attributes(obj)
+        count, children = len(attrs), [(value,) for value in attrs]
+    if not children:
+        return size
+    walked = sum(_size(child, sample, depth - 1, seen) for group in children for child in group)
+    return size + int(walked * count / len(children))
+
+def _take(items: Iterable[Any], n: int) -> List[Any]:
+    out = []
+    for item in items:
+        if len(out) >= n:
+            break
+        out.append(item)
+    return out
+
+def _attributes(obj: Any) -> List[Any]:
+    values = list(getattr(obj, "__dict__", {}).values())
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name != "__dict__" and hasattr(obj, name):
+                values.append(getattr(obj, name))
+    return values
+
+def format_bytes(n: float) -> str:
+    if n < 1024:
+        return f"{n:.0f} B"
+    if n < 1048576:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / 1048576:.1f} MB"
+
+class HeapTracker:
+    def __init__(self, out_dir: Path, frames: int = 10):
+        self.out_dir = Path(out_dir)
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[float] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        self.baseline = None
+        self.baseline_at = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def snapshot(self) -> str:
+        """Start tracing if needed and take a new baseline."""
+        self.start()
+        self.baseline = self._take()
+        self.baseline_at = time.time()
+        return f"Baseline taken: {self.status()}"
+
+    def status(self) -> str:
+        if not self.tracing:
+            return "tracemalloc off"
+        current, peak = tracemalloc.get_traced_memory()
+        text = f"tracemalloc on ({self.frames} frames), traced {format_bytes(current)} (peak {format_bytes(peak)})"
+        if self.baseline_at:
+            text += f", baseline {(time.time() - self.baseline_at) / 60:.0f} min old"
+        return text
+
+    def diff(self, top: int = 25, tracebacks: int = 5, rebase: bool = False) -> Tuple[Path, List[str]]:
+        """
+        Write the allocation sites that grew since the baseline to a file; returns the path and
+        the top few lines for a chat reply. `rebase` makes the new snapshot the next baseline.
+        """
+        if self.baseline is None or not self.tracing:
+            raise RuntimeError("no baseline snapshot; take one first")
+        snap = self._take()
+        by_line = snap.compare_to(self.baseline, "lineno")
+        by_trace = snap.compare_to(self.baseline, "traceback")
+        grown = sum(s.size_diff for s in by_line)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        since = datetime.datetime.fromtimestamp(self.baseline_at, datetime.timezone.utc)
+        head = f"{format_bytes(grown) if grown >= 0 else '-' + format_bytes(-grown)} net since {since:%Y-%m-%d %H:%M:%S} UTC"
+        lines = [f"Heap diff {since:%Y-%m-%d %H:%M:%S} -> {now:%Y-%m-%d %H:%M:%S} UTC", head, self.status(), "",
+                 f"Top {top} allocation sites by growth:"]
+        lines += [str(stat) for stat in by_line[:top]]
+        for stat in by_trace[:tracebacks]:
+            lines += ["", f"{format_bytes(stat.size_diff)} in {stat.count_diff:+d} blocks:"] + stat.traceback.format()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"heapdiff_{now:%Y%m%d_%H%M%S}.txt"
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        if rebase:
+            self.baseline, self.baseline_at = snap, time.time()
+        return path, [head] + [str(stat) for stat in by_line[:5]]
@@ -0,0 +1,369 @@
+# member_store.py
+# Compact per-member platform snapshots (bitmask + typed arrays)
+
+from __future__ import annotations
+import json
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# -------------------------
+# Platform bitmask helpers
+# -------------------------
+PLATFORM_WEB = 1
+PLATFORM_MOBILE = 2
+PLATFORM_DESKTOP = 4
+
+PLATFORM_BITS = (("desktop", PLATFORM_DESKTOP), ("mobile", PLATFORM_MOBILE), ("web", PLATFORM_WEB))
+_PLATFORM_BY_NAME = {name: bit for name, bit in PLATFORM_BITS}
+
+# mask -> sorted platform list, precomputed for all 8 combinations
+_MASK_TO_PLATFORMS = [
+    sorted(name for name, bit in PLATFORM_BITS if mask & bit)
+    for mask in range(8)
+]
+
+def platforms_to_mask(platforms: Iterable[str]) -> int:
+    mask = 0
+    for p in platforms or ():
+        mask |= _PLATFORM_BY_NAME.get(p, 0)
+    return mask
+
+def mask_to_platforms(mask: int) -> List[str]:
+    return list(_MASK_TO_PLATFORMS[mask & 7])
+
+# -------------------------
+# Snapshot store
+# -------------------------
+class PlatformSnapshot:
+    """One member's snapshot, materialized on lookup."""
+    __slots__ = ("user_id", "mask", "ts")
+
+    def __init__(self, user_id: int, mask: int, ts: float):
+        self.user_id = user_id
+        self.mask = mask
+        self.ts = ts
+
+    @property
+    def platforms(self) -> List[str]:
+        return mask_to_platforms(self.mask)
+
+    def __repr__(self):
+        return f"PlatformSnapshot(user_id={self.user_id}, platforms={self.platforms}, ts={self.ts})"
+
+# On-disk layout (little-endian):
+#   header  b"WCDS" | u16 version | u32 count
+#   body    u64[count] user ids (ascending) | f64[count] timestamps | u8[count] masks
+_MAGIC = b"WCDS"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+
+class PlatformSnapshotStore:
+    """
+    user id -> (platform mask, timestamp), kept in three parallel typed arrays sorted by id.
+
+    Costs 17 bytes per member instead of a dict entry with a str key, a nested dict, a list
+    of platform strings and a float. Lookups are a binary search; inserts shift the arrays,
+    which is fine for the Sus snapshot workload (writes only when a role changes).
+    """
+    __slots__ = ("_ids", "_ts", "_masks")
+
+    def __init__(self):
+        self._ids = array("Q")
+        self._ts = array("d")
+        self._masks = array("B")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self._index(user_id) is not None
+
+    def _index(self, user_id: int) -> Optional[int]:
+        i = bisect_left(self._ids, user_id)
+        if i < len(self._ids) and self._ids[i] == user_id:
+            return i
+        return None
+
+    def set(self, user_id: int, mask: int, ts: float):
+        user_id = int(user_id)
+        i = bisect_left(self._ids, user_id)
+        if i < len(self._ids) and self._ids[i] == user_id:
+            self._ts[i] = ts
+            self._masks[i] = mask & 0xFF
+            return
+        self._ids.insert(i, user_id)
+        self._ts.insert(i, ts)
+        self._masks.insert(i, mask & 0xFF)
+
+    def set_platforms(self, user_id: int, platforms: Iterable[str], ts: float):
+        self.set(user_id, platforms_to_mask(platforms), ts)
+
+    def get(self, user_id: int) -> Optional[PlatformSnapshot]:
+        i = self._index(int(user_id))
+        if i is None:
+            return None
+        return PlatformSnapshot(self._ids[i], self._masks[i], self._ts[i])
+
+    def pop(self, user_id: int) -> bool:
+        i = self._index(int(user_id))
+        if i is None:
+            return False
+        del self._ids[i]
+        del self._ts[i]
+        del self._masks[i]
+        return True
+
+    def __iter__(self) -> Iterator[PlatformSnapshot]:
+        for i in range(len(self._ids)):
+            yield PlatformSnapshot(self._ids[i], self._masks[i], self._ts[i])
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self._ids, self._ts, self._masks))
+
+    # ---- persistence ----
+    def to_bytes(self) -> bytes:
+        ids, ts, masks = array("Q", self._ids), array("d", self._ts), self._masks
+        if sys.byteorder == "big":
+            ids.byteswap()
+            ts.byteswap()
+        return _HEADER.pack(_MAGIC, _VERSION, len(ids)) + ids.tobytes() + ts.tobytes() + masks.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PlatformSnapshotStore":
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("not a platform snapshot file (bad magic/version)")
+        store = cls()
+        off = _HEADER.size
+        store._ids.frombytes(data[off:off + 8 * count]); off += 8 * count
+        store._ts.frombytes(data[off:off + 8 * count]); off += 8 * count
+        store._masks.frombytes(data[off:off + count])
+        if not (len(store._ids) == len(store._ts) == len(store._masks) == count):
+            raise ValueError("truncated platform snapshot file")
+        if sys.byteorder == "big":
+            store._ids.byteswap()
+            store._ts.byteswap()
+        return store
+
+    @classmethod
+    def from_items(cls, items: Iterable) -> "PlatformSnapshotStore":
+        """Build from (user_id, mask, ts) tuples in any order; later duplicates win."""
+        store = cls()
+        last = None
+        for uid, mask, ts in sorted(items, key=lambda item: item[0]):
+            if uid == last:
+                store._ts[-1] = ts
+                store._masks[-1] = mask & 0xFF
+                continue
+            store._ids.append(uid)
+            store._ts.append(ts)
+            store._masks.append(mask & 0xFF)
+            last = uid
+        return store
+
+    @classmethod
+    def from_legacy_dict(cls, legacy: Dict[str, Dict]) -> "PlatformSnapshotStore":
+        """Import the old sus_platforms.json layout: {"<id>": {"platforms": [...], "ts": float}}."""
+        parsed = []
+        for uid, snap in legacy.items():
+            try:
+                parsed.append((int(uid), float(snap.get("ts", 0)), platforms_to_mask(snap.get("platforms", []))))
+            except Exception:
+                continue
+        parsed.sort()
+        store = cls()
+        for uid, ts, mask in parsed:
+            store._ids.append(uid)
+            store._ts.append(ts)
+            store._masks.append(mask)
+        return store
+
+    def save(self, path: Path):
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(self.to_bytes())
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, legacy_json_path: Path = None) -> "PlatformSnapshotStore":
+        if path.exists():
+            return cls.from_bytes(path.read_bytes())
+        if legacy_json_path is not None and legacy_json_path.exists():
+            return cls.from_legacy_dict(json.loads(legacy_json_path.read_text()))
+        return cls()
+
+def diff_stores(old: PlatformSnapshotStore, new: PlatformSnapshotStore) -> Iterator[tuple]:
+    """
+    Merge-walk two stores and yield (user_id, old_mask, new_mask) for every member that
+    appeared (old_mask None), disappeared (new_mask None) or changed platform mask.
+    """
+    i, j = 0, 0
+    old_ids, new_ids = old._ids, new._ids
+    while i < len(old_ids) or j < len(new_ids):
+        if j >= len(new_ids) or (i < len(old_ids) and old_ids[i] < new_ids[j]):
+            yield old_ids[i], old._masks[i], None
+            i += 1
+        elif i >= len(old_ids) or new_ids[j] < old_ids[i]:
+            yield new_ids[j], None, new._masks[j]
+            j += 1
+        else:
+            if old._masks[i] != new._masks[j]:
+                yield new_ids[j], old._masks[i], new._masks[j]
+            i += 1
+            j += 1
+
+# -------------------------
+# Live member index (lean mode)
+# -------------------------
+MEMBER_FLAG_BOT = 0x80   # stored in the mask byte above the platform bits
+
+class MemberRecord:
+    """One member's detector-relevant state, materialized on lookup."""
+    __slots__ = ("user_id", "joined_ts", "mask", "roles", "bot")
+
+    def __init__(self, user_id: int, joined_ts: Optional[float], mask: int, roles: tuple, bot: bool):
+        self.user_id = user_id
+        self.joined_ts = joined_ts
+        self.mask = mask
+        self.roles = roles
+        self.bot = bot
+
+    @property
+    def platforms(self) -> List[str]:
+        return mask_to_platforms(self.mask)
+
+    def __repr__(self):
+        return f"MemberRecord(user_id={self.user_id}, joined_ts={self.joined_ts}, platforms={self.platforms}, roles={len(self.roles)}, bot={self.bot})"
+
+class MemberIndex:
+    """
+    user id -> (joined ts, platform mask, role ids, bot flag) for every member the gateway told us
+    about, replacing discord.py's Member cache in lean mode. Fields live in parallel typed arrays
+    addressed by a slot number; removed slots are reused. Role lists are interned, so the many
+    members sharing a role combination share one tuple; each interned tuple is reference-counted
+    and dropped when its last member leaves or changes roles. Unlike PlatformSnapshotStore this is
+    updated on every presence change, so it trades sortedness for O(1) writes.
+    """
+    __slots__ = ("_slots", "_ids", "_joined", "_masks", "_roles", "_free", "_role_sets", "_role_refs")
+
+    def __init__(self):
+        self._slots: Dict[int, int] = {}
+        self._ids = array("Q")
+        self._joined = array("d")   # NaN = unknown
+        self._masks = bytearray()
+        self._roles: List[tuple] = []
+        self._free: List[int] = []
+        self._role_sets: Dict[tuple, tuple] = {(): ()}
+        self._role_refs: Dict[tuple, int] = {}   # interned tuple -> members holding it (() is never counted)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._slots
+
+    def _slot(self, user_id: int) -> int:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self._ids[slot] = user_id
+                self._joined[slot] = float("nan")
+                self._masks[slot] = 0
+                self._roles[slot] = ()
+            else:
+                slot = len(self._ids)
+                self._ids.append(user_id)
+                self._joined.append(float("nan"))
+                self._masks.append(0)
+                self._roles.append(())
+            self._slots[user_id] = slot
+        return slot
+
+    def upsert(self, user_id: int, joined_ts: float = None, roles: Iterable[int] = None, bot: bool = None):
+        """Create or update a member; fields left as None keep their current value."""
+        slot = self._slot(user_id)
+        if joined_ts is not None:
+            self._joined[slot] = joined_ts
+        if roles is not None:
+            self._set_roles(slot, tuple(sorted(roles)))
+        if bot is not None:
+            self._masks[slot] = (self._masks[slot] & 0x7F) | (MEMBER_FLAG_BOT if bot else 0)
+
+    def _set_roles(self, slot: int, key: tuple):
+        old = self._roles[slot]
+        if old == key:
+            return
+        if old:
+            left = self._role_refs[old] - 1
+            if left:
+                self._role_refs[old] = left
+            else:
+                del self._role_refs[old]
+                del self._role_sets[old]
+        if key:
+            key = self._role_sets.setdefault(key, key)
+            self._role_refs[key] = self._role_refs.get(key, 0) + 1
+        self._roles[slot] = key
+
+    def set_mask(self, user_id: int, mask: int, create: bool = False) -> Optional[int]:
+        """
+        Set the platform mask; returns the previous mask. An id that is not indexed is ignored
+        (returns None) unless `create`, so a stray presence does not invent a member.
+        """
+        if not create and user_id not in self._slots:
+            return None
+        slot = self._slot(user_id)
+        previous = self._masks[slot] & 0x7F
+        self._masks[slot] = (self._masks[slot] & MEMBER_FLAG_BOT) | (mask & 0x7F)
+        return previous
+
+    def roles(self, user_id: int) -> Optional[tuple]:
+        slot = self._slots.get(user_id)
+        return None if slot is None else self._roles[slot]
+
+    def remove(self, user_id: int) -> bool:
+        slot = self._slots.pop(user_id, None)
+        if slot is None:
+            return False
+        self._set_roles(slot, ())
+        self._free.append(slot)
+        return True
+
+    def get(self, user_id: int) -> Optional[MemberRecord]:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return None
+        joined = self._joined[slot]
+        flags = self._masks[slot]
+        return MemberRecord(user_id, None if joined != joined else joined, flags & 0x7F, self._roles[slot], bool(flags & MEMBER_FLAG_BOT))
+
+    def ids(self) -> Iterator[int]:
+        return iter(self._slots)
+
+    def with_role(self, role_id: int) -> List[int]:
+        """Ids of non-bot members holding `role_id` (checks each distinct role combination once)."""
+        matching = {id(t) for t in self._role_sets.values() if role_id in t}
+        if not matching:
+            return []
+        roles, masks, ids = self._roles, self._masks, self._ids
+        return [ids[slot] for slot in self._slots.values() if id(roles[slot]) in matching and not masks[slot] & MEMBER_FLAG_BOT]
+
+    def join_arrays(self) -> Tuple[array, array]:
+        """(ids, joined timestamps) of live non-bot members as flat typed arrays (NaN = unknown join time)."""
+        ids, joined = array("Q"), array("d")
+        for uid, slot in self._slots.items():
+            if not self._masks[slot] & MEMBER_FLAG_BOT:
+                ids.append(uid)
+                joined.append(self._joined[slot])
+        return ids, joined
+
+    def nbytes(self) -> int:
+        """Approximate heap footprint, including the id -> slot dict and interned role tuples."""
+        role_bytes = sum(sys.getsizeof(t) for t in self._role_sets.values()) + 2 * sys.getsizeof(self._role_refs)
+        return (sys.getsizeof(self._slots) + len(self._slots) * 32 + self._ids.itemsize * len(self._ids)
+                + self._joined.itemsize * len(self._joined) + len(self._masks) + sys.getsizeof(self._roles)
+                + sys.getsizeof(self._free) + role_bytes)
@@ -0,0 +1,79 @@
+# metrics.py
+# Fixed-size latency histograms (no external dependencies)
+
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+# bucket upper bounds in seconds: 1 ms .. ~67 min, each sqrt(2) wider than the last
+DEFAULT_BOUNDS: List[float] = [0.001 * (2 ** (i / 2)) for i in range(44)]
+
+class Histogram:
+    """
+    Bucketed latency histogram with constant memory. Percentiles are estimated by linear
+    interpolation inside the bucket that contains them (error under ~41% of the value,
+    typically far less); count, sum and max are exact.
+    """
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Iterable[float] = None):
+        self.bounds = list(bounds or DEFAULT_BOUNDS)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        value = max(value, 0.0)
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * ((rank - seen) / n), self.max)
+            seen += n
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+def format_seconds(value: float) -> str:
+    if value < 1:
+        return f"{value * 1000:.0f}ms"
+    if value < 120:
+        return f"{value:.1f}s"
+    return f"{value / 60:.1f}m"
+
+def format_summary(h: Histogram) -> str:
+    s = h.summary()
+    if not s["count"]:
+        return "no samples"
+    return (f"n={s['count']} p50={format_seconds(s['p50'])} p90={format_seconds(s['p90'])} "
+            f"p99={format_seconds(s['p99'])} max={format_seconds(s['max'])}")
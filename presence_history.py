@@ -0,0 +1,153 @@
+# presence_history.py
+# Bounded per-member ring buffers of platform transitions
+
+from __future__ import annotations
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+MAX_DELTA = 0xFFFFFF      # 3-byte delta, ~194 days; older gaps are clamped
+ENTRY_SIZE = 4            # 3 bytes delta-seconds + 1 byte platform mask
+
+class PresenceHistory:
+    """
+    Fixed-budget presence history: the last `depth` platform transitions per member.
+
+    All storage is preallocated for `max_members` slots: one shared bytearray holds every
+    ring (4 bytes per entry), and per-slot arrays hold the owner id, the absolute time of
+    the newest entry, the ring head and the entry count. Each entry stores the platform
+    mask and the seconds elapsed since the previous entry, so absolute times are recovered
+    by walking back from the newest one. Only transitions are stored: repeating the current
+    mask is a no-op. When every slot is taken, slots are reclaimed round-robin (clock hand).
+
+    Timestamps are whole epoch seconds.
+    """
+
+    def __init__(self, max_members: int = 100_000, depth: int = 16):
+        if max_members <= 0 or not (1 <= depth <= 255):
+            raise ValueError("max_members must be positive and depth within 1..255")
+        self.max_members = max_members
+        self.depth = depth
+        self._slots: Dict[int, int] = {}
+        self._owner = array("Q", bytes(8 * max_members))
+        self._last_ts = array("I", bytes(4 * max_members))
+        self._head = array("B", bytes(max_members))
+        self._count = array("B", bytes(max_members))
+        self._buf = bytearray(ENTRY_SIZE * depth * max_members)
+        self._free: List[int] = list(range(max_members - 1, -1, -1))
+        self._hand = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._slots
+
+    def nbytes(self) -> int:
+        arrays = (self._owner, self._last_ts, self._head, self._count)
+        return len(self._buf) + sum(a.itemsize * len(a) for a in arrays)
+
+    # ---- slot management ----
+    def _allocate(self, user_id: int) -> int:
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._hand
+            self._hand = (self._hand + 1) % self.max_members
+            self._slots.pop(self._owner[slot], None)
+        self._slots[user_id] = slot
+        self._owner[slot] = user_id
+        self._count[slot] = 0
+        self._head[slot] = 0
+        return slot
+
+    def forget(self, user_id: int):
+        slot = self._slots.pop(user_id, None)
+        if slot is not None:
+            self._owner[slot] = 0
+            self._count[slot] = 0
+            self._free.append(slot)
+
+    # ---- entries ----
+    def _entry(self, slot: int, pos: int) -> Tuple[int, int]:
+        off = (slot * self.depth + pos) * ENTRY_SIZE
+        b = self._buf
+        return (b[off] | (b[off + 1] << 8) | (b[off + 2] << 16), b[off + 3])
+
+    def record(self, user_id: int, mask: int, ts: float) -> bool:
+        """Record the member's current platform mask. Returns True if it was a transition."""
+        ts = int(ts)
+        slot = self._slots.get(user_id)
+        if slot is None:
+            slot = self._allocate(user_id)
+        count = self._count[slot]
+        if count:
+            if self._entry(slot, self._head[slot])[1] == mask:
+                return False
+            delta = min(max(ts - self._last_ts[slot], 0), MAX_DELTA)
+            head = (self._head[slot] + 1) % self.depth
+        else:
+            delta = 0
+            head = 0
+        off = (slot * self.depth + head) * ENTRY_SIZE
+        self._buf[off:off + ENTRY_SIZE] = bytes((delta & 0xFF, (delta >> 8) & 0xFF, delta >> 16, mask & 0xFF))
+        self._head[slot] = head
+        self._count[slot] = min(count + 1, self.depth)
+        self._last_ts[slot] = max(ts, 0)
+        return True
+
+    def _walk(self, slot: int):
+        """Yield (start_ts, mask) newest first."""
+        ts = self._last_ts[slot]
+        pos = self._head[slot]
+        for _ in range(self._count[slot]):
+            delta, mask = self._entry(slot, pos)
+            yield ts, mask
+            ts -= delta
+            pos = (pos - 1) % self.depth
+
+    def transitions(self, user_id: int) -> List[Tuple[int, int]]:
+        """All retained (start_ts, mask) entries, oldest first."""
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return []
+        return list(self._walk(slot))[::-1]
+
+    def current_mask(self, user_id: int) -> Optional[int]:
+        slot = self._slots.get(user_id)
+        if slot is None or not self._count[slot]:
+            return None
+        return self._entry(slot, self._head[slot])[1]
+
+    def tracked_since(self, user_id: int) -> Optional[int]:
+        """Start time of the oldest retained entry; nothing is known before it."""
+        slot = self._slots.get(user_id)
+        if slot is None or not self._count[slot]:
+            return None
+        oldest = None
+        for ts, _ in self._walk(slot):
+            oldest = ts
+        return oldest
+
+    # ---- queries ----
+    def continuous(self, user_id: int, mask: int, now: float) -> float:
+        """Seconds the member has been on exactly `mask` without interruption (0 if not now)."""
+        slot = self._slots.get(user_id)
+        if slot is None or not self._count[slot]:
+            return 0.0
+        if self._entry(slot, self._head[slot])[1] != mask:
+            return 0.0
+        return max(now - self._last_ts[slot], 0.0)
+
+    def seen_within(self, user_id: int, bits: int, seconds: float, now: float) -> bool:
+        """Whether any platform in `bits` was active at some point in the last `seconds`."""
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return False
+        since = now - seconds
+        for ts, mask in self._walk(slot):
+            # this entry was the active state from ts until the next (newer) entry
+            if mask & bits:
+                return True
+            if ts <= since:
+                break
+        return False
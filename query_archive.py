@@ -0,0 +1,71 @@
+# query_archive.py
+# Offline queries over the bot's scan archive (does not start the bot)
+#
+#   python query_archive.py scans [--limit 20]
+#   python query_archive.py timeline USER_ID
+#   python query_archive.py daily [--label "all members"]
+
+from __future__ import annotations
+import argparse
+import datetime
+import sys
+
+from member_store import mask_to_platforms
+from scan_archive import ScanArchive
+
+def fmt_ts(ts: float) -> str:
+    return datetime.datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S UTC")
+
+def cmd_scans(archive: ScanArchive, args):
+    scans = archive.scans()
+    if not scans:
+        print("Archive is empty.")
+        return
+    for scan in scans[-args.limit:]:
+        print(f"#{scan.scan_id:<6} {fmt_ts(scan.ts)}  members={scan.count:<8} web-only={scan.web_only:<7} {scan.label}")
+
+def cmd_timeline(archive: ScanArchive, args):
+    previous = "unset"
+    seen = 0
+    for scan, mask in archive.timeline(args.user_id):
+        if mask is None:
+            state = "not in scan"
+        else:
+            seen += 1
+            state = ", ".join(mask_to_platforms(mask)) or "offline"
+        if args.all or state != previous:
+            print(f"{fmt_ts(scan.ts)}  #{scan.scan_id:<6} {state}  ({scan.label})")
+        previous = state
+    if not seen:
+        print(f"User {args.user_id} does not appear in any archived scan.")
+
+def cmd_daily(archive: ScanArchive, args):
+    days = archive.daily_web_only(args.label)
+    if not days:
+        print(f"No scans labelled {args.label!r}." if args.label is not None else "Archive is empty.")
+        return
+    print(f"{'day (UTC)':<12}{'scans':>7}{'web-only':>10}{'members':>10}  label")
+    for (day, label), (scans, web_only, members) in sorted(days.items()):
+        print(f"{day:<12}{scans:>7}{web_only:>10}{members:>10}  {label}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the scan archive written by bot.py")
+    parser.add_argument("--dir", default="scan_archive", help="archive directory (default: scan_archive)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("scans", help="list archived scans")
+    p.add_argument("--limit", type=int, default=20)
+    p = sub.add_parser("timeline", help="platform timeline for one user")
+    p.add_argument("user_id", type=int)
+    p.add_argument("--all", action="store_true", help="print every scan, not only changes")
+    p = sub.add_parser("daily", help="web-only counts per day and scan label (max over that day's scans)")
+    p.add_argument("--label", help='only scans with this label, e.g. "all members" or "autoscan full"')
+    args = parser.parse_args()
+
+    with ScanArchive(args.dir) as archive:
+        if not archive.scans_path.exists():
+            print(f"No archive found in {args.dir!r}. Run from the bot's directory or pass --dir.")
+            sys.exit(1)
+        {"scans": cmd_scans, "timeline": cmd_timeline, "daily": cmd_daily}[args.command](archive, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# raid_cohorts.py
+# Join-wave clustering: find groups of accounts that joined together and were created together
+#
+# Raid accounts are usually made in one batch and joined in one burst, so they form a dense box in
+# (join time, account creation time). Account creation time comes from the snowflake id itself, so
+# no extra API data is needed. Everything here is vectorized NumPy over the whole member list and
+# runs in a worker thread (see bot.py, find_cohorts via asyncio.to_thread); NumPy releases the GIL
+# for the heavy parts, so the bot hands over two flat arrays and gets a short list of cohorts back.
+#
+# Detection:
+#   1. sort by join time; a join burst is a run of joins where every `join_window` seconds holds at
+#      least `min_size` joins (sliding counts via searchsorted, overlapping windows merged)
+#   2. inside each burst, the densest `created_window` of account creation times is a cohort when it
+#      holds at least `min_size` members; its members are removed and the burst is searched again
+
+from __future__ import annotations
+from typing import List, NamedTuple
+
+import numpy as np
+
+DISCORD_EPOCH_MS = 1420070400000
+
+class Cohort(NamedTuple):
+    user_ids: List[int]
+    joined_from: float
+    joined_to: float
+    created_from: float
+    created_to: float
+
+    def describe(self) -> str:
+        return (f"{len(self.user_ids)} accounts created within {_span(self.created_to - self.created_from)}, "
+                f"joined within {_span(self.joined_to - self.joined_from)}")
+
+def _span(seconds: float) -> str:
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f} minutes"
+    if seconds < 172800:
+        return f"{seconds / 3600:.1f} hours"
+    return f"{seconds / 86400:.1f} days"
+
+def snowflake_created_ts(user_ids: np.ndarray) -> np.ndarray:
+    """Unix creation time (seconds) of each snowflake id."""
+    return ((np.asarray(user_ids, dtype=np.uint64) >> np.uint64(22)).astype(np.float64) + DISCORD_EPOCH_MS) / 1000.0
+
+def _dense_runs(sorted_ts: np.ndarray, window: float, min_size: int) -> List[tuple]:
+    """[start, end) index runs of `sorted_ts` covered by windows of `window` seconds holding >= min_size points."""
+    n = len(sorted_ts)
+    if n < min_size:
+        return []
+    ends = np.searchsorted(sorted_ts, sorted_ts + window, side="right")
+    starts = np.flatnonzero(ends - np.arange(n) >= min_size)
+    if not len(starts):
+        return []
+    ends = np.maximum.accumulate(ends[starts])
+    # a new run starts where a dense window begins past everything covered so far
+    breaks = np.flatnonzero(starts[1:] >= ends[:-1]) + 1
+    run_starts = starts[np.concatenate(([0], breaks))]
+    run_ends = ends[np.concatenate((breaks - 1, [len(starts) - 1]))]
+    return list(zip(run_starts.tolist(), run_ends.tolist()))
+
+def find_cohorts(user_ids, joined_ts, join_window: float = 300.0, created_window: float = 7200.0,
+                 min_size: int = 10, joined_after: float = None, max_cohorts: int = 50) -> List[Cohort]:
+    """
+    Cohorts among members given as parallel sequences of ids and join timestamps (array.array,
+    lists or ndarrays; unknown join times as NaN), optionally only members who joined after
+    `joined_after`. Largest cohorts first.
+    """
+    ids = np.asarray(user_ids, dtype=np.uint64)
+    joined = np.asarray(joined_ts, dtype=np.float64)
+    known = ~np.isnan(joined)
+    if joined_after is not None:
+        known &= joined >= joined_after
+    ids, joined = ids[known], joined[known]
+    order = np.argsort(joined, kind="stable")
+    ids, joined = ids[order], joined[order]
+    created = snowflake_created_ts(ids)
+
+    cohorts: List[Cohort] = []
+    for start, end in _dense_runs(joined, join_window, min_size):
+        b_ids, b_joined, b_created = ids[start:end], joined[start:end], created[start:end]
+        while len(b_ids) >= min_size and len(cohorts) < max_cohorts:
+            by_created = np.argsort(b_created, kind="stable")
+            c_sorted = b_created[by_created]
+            counts = np.searchsorted(c_sorted, c_sorted + created_window, side="right") - np.arange(len(c_sorted))
+            best = int(np.argmax(counts))
+            if counts[best] < min_size:
+                break
+            members = by_created[best:best + counts[best]]
+            cohorts.append(Cohort(b_ids[members].tolist(), float(b_joined[members].min()), float(b_joined[members].max()),
+                                  float(b_created[members].min()), float(b_created[members].max())))
+            keep = np.ones(len(b_ids), dtype=bool)
+            keep[members] = False
+            b_ids, b_joined, b_created = b_ids[keep], b_joined[keep], b_created[keep]
+    cohorts.sort(key=lambda c: -len(c.user_ids))
+    return cohorts
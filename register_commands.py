@@ -1,10 +1,15 @@
 # register_commands.py
+#
+#   python register_commands.py           register only if command_schemas.py changed since the last run
+#   python register_commands.py --force   always replace the guild commands
 
 from __future__ import annotations
 import os, sys, json
 from dotenv import load_dotenv
 import requests
 
+from command_schemas import COMMANDS, commands_changed, commands_hash, save_synced_hash
+
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -21,95 +26,7 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-# The commands to register (guild-scoped)
-COMMANDS = [
-    {
-        "name": "setupverify",
-        "description": "Interactive setup for verification (run in the verify channel)",
-    },
-    {
-        "name": "setlog",
-        "description": "Set the channel where verification & sus logs should be sent.",
-        "options": [
-            {
-                "name": "channel",
-                "description": "Text channel to use as logs",
-                "type": 7,   # CHANNEL
-                "required": True
-            }
-        ]
-    },
-    {
-        "name": "verifyuser",
-        "description": "Manually verify (remove Sus role) from a user.",
-        "options": [
-            {
-                "name": "member",
-                "description": "Member to verify",
-                "type": 6,   # USER
-                "required": True
-            }
-        ]
-    },
-    {
-        "name": "autoscan",
-        "description": "Enable or disable automatic daily scanning.",
-        "options": [
-            {
-                "name": "action",
-                "description": "on or off",
-                "type": 3,  # STRING
-                "required": True,
-                "choices": [
-                    {"name": "on", "value": "on"},
-                    {"name": "off", "value": "off"}
-                ]
-            }
-        ]
-    },
-    {
-        "name": "scan",
-        "description": "Scan members for platform usage. Optionally restrict them as Sus after confirmation.",
-        "options": [
-            {
-                "name": "member",
-                "description": "Check one member only",
-                "type": 6,   # USER
-                "required": False
-            },
-            {
-                "name": "duration",
-                "description": "Quick filter by join time",
-                "type": 3,
-                "required": False,
-                "choices": [
-                    {"name": "last_hour", "value": "last_hour"},
-                    {"name": "last_day", "value": "last_day"},
-                    {"name": "last_week", "value": "last_week"},
-                    {"name": "last_month", "value": "last_month"}
-                ]
-            },
-            {
-                "name": "start",
-                "description": "Start ISO timestamp",
-                "type": 3,
-                "required": False
-            },
-            {
-                "name": "end",
-                "description": "End ISO timestamp",
-                "type": 3,
-                "required": False
-            },
-            {
-                "name": "apply_sus",
-                "description": "If true, ask to mark matched users Sus",
-                "type": 5,  # BOOLEAN
-                "required": False
-            }
-        ]
-    }
-]
+# The commands to register (guild-scoped) live in command_schemas.py
 
 def show_existing():
     r = requests.get(API_BASE, headers=HEADERS)
@@ -131,11 +48,16 @@ def register_all():
         print("Success. Registered commands:")
         for c in r.json():
             print(f" - {c.get('name')} (id: {c.get('id')})")
+        save_synced_hash(CLIENT_ID, GUILD_ID, commands_hash())
     else:
         print("Failed to register commands:", r.status_code, r.text)
         sys.exit(1)
 
 if __name__ == "__main__":
+    if "--force" not in sys.argv and not commands_changed(CLIENT_ID, GUILD_ID):
+        print("Commands unchanged since the last registration (command_schemas.py hash matches); nothing to do.")
+        print("Use --force to re-register anyway.")
+        sys.exit(0)
     print("== SHOW EXISTING ==")
     show_existing()
     print("\nThis script will now replace guild commands with the commands defined here.")
@@ -5,6 +5,8 @@ import os, sys, json
 from dotenv import load_dotenv
 import requests
 
+from command_schemas import COMMANDS, commands_hash, save_synced_hash
+
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -34,44 +36,7 @@ print("bot tag:", me.get("username") + "#" + me.get("discriminator") if me.get("
 
 API_BASE = f"https://discord.com/api/v10/applications/{app_id}/guilds/{GUILD_ID}/commands"
 
-# Commands to register
-COMMANDS = [
-    {"name":"setupverify","description":"Interactive setup for verification (run in the verify channel)"},
-    {
-      "name":"setlog",
-      "description":"Set the channel where verification & sus logs should be sent.",
-      "options":[
-        {"name":"channel","description":"Text channel to use as logs","type":7,"required":True}
-      ]
-    },
-    {
-      "name":"verifyuser",
-      "description":"Manually verify (remove Sus role) from a user.",
-      "options":[
-        {"name":"member","description":"Member to verify","type":6,"required":True}
-      ]
-    },
-    {
-      "name":"autoscan",
-      "description":"Enable or disable automatic daily scanning.",
-      "options":[
-        {"name":"action","description":"on or off","type":3,"required":True,
-         "choices":[{"name":"on","value":"on"},{"name":"off","value":"off"}]}
-      ]
-    },
-    {
-      "name":"scan",
-      "description":"Scan members for platform usage. Optionally restrict them as Sus after confirmation.",
-      "options":[
-        {"name":"member","description":"Check one member only","type":6,"required":False},
-        {"name":"duration","description":"Quick filter by join time","type":3,"required":False,
-         "choices":[{"name":"last_hour","value":"last_hour"},{"name":"last_day","value":"last_day"},{"name":"last_week","value":"last_week"},{"name":"last_month","value":"last_month"}]},
-        {"name":"start","description":"Start ISO timestamp","type":3,"required":False},
-        {"name":"end","description":"End ISO timestamp","type":3,"required":False},
-        {"name":"apply_sus","description":"If true, ask to mark matched users Sus","type":5,"required":False}
-      ]
-    }
-]
+# Commands to register: see command_schemas.py
 
 def show_existing():
     r = requests.get(API_BASE, headers=HEADERS)
@@ -96,6 +61,7 @@ def register_all():
         print("Success. Registered commands:")
         for c in r.json():
             print(f" - {c.get('name')} (id: {c.get('id')})")
+        save_synced_hash(app_id, GUILD_ID, commands_hash())
     else:
         print("Failed to register commands:", r.status_code, r.text)
         if r.status_code in (401,403):
@@ -0,0 +1,273 @@
+# replay_gateway.py
+# Replay a recorded gateway log through bot.py with the Discord API mocked (does not connect to Discord)
+#
+#   python replay_gateway.py gateway_20260101_120000.log.gz [--speed 50] [--api-latency-ms 40] [--json run.json]
+#
+# Record with GATEWAY_RECORD_DIR=... in .env. The replay runs in a scratch directory that starts from
+# the recorded config.json (no caches, jobs or archives of the live bot are read or written). Events go
+# through discord.py's own parsers, so the same event handlers, lean taps, views and slash commands run as
+# in production. Every REST and interaction-webhook call is answered locally after --api-latency-ms.
+# --speed only compresses the gaps between recorded events: the bot's own timers (presence settle,
+# process_delay_ms pacing, mention TTLs) still run in real time, which is what queue drain measures.
+# Compare two versions by replaying the same log with each and diffing the --json output.
+
+from __future__ import annotations
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict
+
+from gateway_log import read_log
+
+REPO_DIR = Path(__file__).resolve().parent
+
+class MockDiscordAPI:
+    """Answers the bot's REST and webhook calls with minimal, well-formed payloads."""
+
+    def __init__(self, app, latency: float):
+        self.app = app
+        self.latency = latency
+        self.members: Dict[str, Dict[str, Any]] = {}
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        self.unmocked: Counter = Counter()
+        self._next_id = time.time_ns() // 1000
+
+    def install(self):
+        import discord.webhook.async_ as webhook_async
+        api = self
+
+        async def webhook_request(adapter, route, session=None, **kwargs):
+            return await api.webhook(route, kwargs)
+
+        self.app.bot.http.request = self.request
+        webhook_async.AsyncWebhookAdapter.request = webhook_request
+        self.app.bot._connection.query_members = self.query_members
+
+    def observe(self, event: str, data: Dict[str, Any]):
+        """Keep the member/channel payloads the mock hands back in sync with the replayed events."""
+        if event == "GUILD_CREATE":
+            for ch in data.get("channels", []):
+                self.channels[ch["id"]] = dict(ch, guild_id=data["id"])
+        if event in ("GUILD_CREATE", "GUILD_MEMBERS_CHUNK"):
+            for m in data.get("members", []):
+                self.members[m["user"]["id"]] = m
+        elif event in ("GUILD_MEMBER_ADD", "GUILD_MEMBER_UPDATE"):
+            self.members[data["user"]["id"]] = {k: v for k, v in data.items() if k != "guild_id"}
+        elif event == "GUILD_MEMBER_REMOVE":
+            self.members.pop(data["user"]["id"], None)
+
+    def new_id(self) -> str:
+        self._next_id += 1
+        return str(self._next_id)
+
+    def bot_user(self) -> Dict[str, Any]:
+        user = self.app.bot.user
+        return {"id": str(user.id), "username": user.name, "discriminator": "0", "avatar": None, "bot": True}
+
+    def user(self, user_id: str) -> Dict[str, Any]:
+        member = self.members.get(user_id)
+        return member["user"] if member else {"id": user_id, "username": f"user{user_id}", "discriminator": "0", "avatar": None}
+
+    def message(self, channel_id, payload: Dict[str, Any] = None) -> Dict[str, Any]:
+        return {
+            "id": self.new_id(), "channel_id": str(channel_id), "guild_id": str(self.app.GUILD_ID), "author": self.bot_user(),
+            "content": (payload or {}).get("content") or "", "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": [], "pinned": False, "type": 0, "flags": 0, "components": [],
+        }
+
+    @staticmethod
+    def _params(route) -> Dict[str, str]:
+        actual = route.url[len(route.BASE):].split("?")[0].split("/")
+        return {t[1:-1]: a for t, a in zip(route.path.split("/"), actual) if t.startswith("{")}
+
+    async def request(self, route, **kwargs):
+        await asyncio.sleep(self.latency)
+        p = self._params(route)
+        key = (route.method, route.path)
+        payload = kwargs.get("json") or {}
+        if key == ("POST", "/channels/{channel_id}/messages") or key == ("PATCH", "/channels/{channel_id}/messages/{message_id}"):
+            return self.message(p["channel_id"], payload)
+        if key == ("GET", "/channels/{channel_id}/messages/{message_id}"):
+            return self.message(p["channel_id"])
+        if key == ("GET", "/channels/{channel_id}/messages"):
+            return []
+        if key == ("GET", "/channels/{channel_id}"):
+            return self.channels.get(p["channel_id"]) or {"id": p["channel_id"], "type": 0, "guild_id": str(self.app.GUILD_ID),
+                                                          "name": "replay", "position": 0, "permission_overwrites": []}
+        if key == ("GET", "/guilds/{guild_id}/members/{user_id}"):
+            return self.members.get(p["user_id"]) or {"user": self.user(p["user_id"]), "roles": [], "deaf": False, "mute": False,
+                                                      "joined_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        if key == ("GET", "/guilds/{guild_id}/members"):
+            return []
+        if key == ("POST", "/guilds/{guild_id}/roles"):
+            return {"id": self.new_id(), "name": payload.get("name", "role"), "permissions": str(payload.get("permissions", 0)),
+                    "position": 1, "color": 0, "hoist": False, "managed": False, "mentionable": False}
+        if key == ("GET", "/users/{user_id}"):
+            return self.user(p["user_id"])
+        if key == ("POST", "/users/@me/channels"):
+            return {"id": self.new_id(), "type": 1, "recipients": [self.user(str(payload.get("recipient_id")))]}
+        if route.method in ("PUT", "DELETE", "PATCH") or route.path.endswith("/bulk-delete"):
+            if route.path.startswith("/applications/"):
+                return []
+            return None
+        self.unmocked[f"{route.method} {route.path}"] += 1
+        return None
+
+    async def webhook(self, route, kwargs):
+        await asyncio.sleep(self.latency)
+        if route.path.endswith("/callback"):
+            return {"interaction": {"id": str(route.webhook_id), "type": 2}}
+        if route.method in ("POST", "PATCH"):
+            return self.message(self.app.VERIFY_CHANNEL_ID or 0, kwargs.get("payload"))
+        return None
+
+    async def query_members(self, guild, query, limit, user_ids, cache, presences):
+        import discord
+        found = []
+        for uid in user_ids or []:
+            data = self.members.get(str(uid))
+            if data is not None:
+                member = discord.Member(data=data, guild=guild, state=self.app.bot._connection)
+                if cache:
+                    guild._add_member(member)
+                found.append(member)
+        return found
+
+def prepare_environment(header: Dict[str, Any], workdir: Path, lean: bool = None):
+    workdir.mkdir(parents=True, exist_ok=True)
+    (workdir / "config.json").write_text(json.dumps(header.get("config") or {}, indent=2))
+    env = {
+        "BOT_TOKEN": "replay", "GUILD_ID": str(header["guild_id"]),
+        "VERIFY_CHANNEL_ID": str(header.get("verify_channel_id") or 0),
+        "SUS_LOG_CHANNEL_ID": str(header.get("sus_log_channel_id") or 0),
+        "SUS_CHAT_CHANNEL_ID": str(header.get("sus_chat_channel_id") or 0),
+        "ADMIN_ROLE_IDS": json.dumps([str(r) for r in header.get("admin_role_ids", [])]),
+        "LEAN_MODE": str(header.get("lean", False) if lean is None else lean).lower(),
+        "GATEWAY_RECORD_DIR": "", "SYNC_COMMANDS_ON_START": "false",
+        "TRACE_PATH": str(workdir / "traces.json"),
+        "VERIFY_HMAC_KEY": os.getenv("VERIFY_HMAC_KEY") or "replay",
+    }
+    # the recording's values win over the .env that bot.py loads (load_dotenv never overrides)
+    os.environ.update(env)
+
+async def replay(app, records, args) -> Dict[str, Any]:
+    import discord
+    api = MockDiscordAPI(app, args.api_latency_ms / 1000.0)
+    api.install()
+    client = app.bot
+    app.load_config()
+    app.load_sus_platform_cache()
+    if app.LEAN_MODE:
+        app.install_lean_gateway_taps()
+    app.install_rest_accounting()
+    app.apply_command_schemas()
+    await client._async_setup_hook()
+    client._connection._chunk_guilds = False   # members arrive through the recorded chunks
+    await client.setup_hook()
+
+    loop = asyncio.get_running_loop()
+    rss_start = app.rss_mb()
+    rss_peak = rss_start
+    counts: Counter = Counter()
+    errors = 0
+    last_offset = 0.0
+    start = loop.time()
+    for offset, event, data in records:
+        if args.until is not None and offset > args.until:
+            break
+        if args.speed > 0:
+            delay = start + offset / args.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)
+        if event == "INTERACTION_CREATE":
+            # re-stamp the id so interaction.created_at (and the verify SLO) is measured from now
+            data["id"] = str(discord.utils.time_snowflake(discord.utils.utcnow()))
+        api.observe(event, data)
+        try:
+            client._connection.parsers[event](data)
+        except Exception as e:
+            errors += 1
+            print(f"replay: {event} at {offset:.1f}s failed: {e}")
+        counts[event] += 1
+        last_offset = offset
+        if sum(counts.values()) % 500 == 0:
+            rss_peak = max(rss_peak, app.rss_mb())
+    fed = loop.time()
+
+    # drain: no event handler still running (discord.py names their tasks "discord.py: on_<event>"),
+    # role queue empty and no bulk/scan job still running
+    deadline = fed + args.drain_timeout
+    while loop.time() < deadline:
+        rss_peak = max(rss_peak, app.rss_mb())
+        handlers = [t for t in asyncio.all_tasks() if t.get_name().startswith("discord.py:") and not t.done()]
+        busy = (handlers or app.role_pipeline.qsize() or any(not t.done() for t in app.bulk_job_tasks.values())
+                or any(not t.done() for t in app.scan_job_tasks.values()))
+        if not busy:
+            break
+        await asyncio.sleep(0.05)
+    drained = loop.time()
+    # then let batched moderation mentions go out and their delete timer fire, so REST counts are complete
+    while (app.mention_pending or app.mention_deletes) and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    rss_end = app.rss_mb()
+
+    return {
+        "log": str(args.log), "lean": app.LEAN_MODE, "speed": args.speed, "api_latency_ms": args.api_latency_ms,
+        "events": dict(counts), "handler_errors": errors, "recorded_span_s": round(last_offset, 3),
+        "replay_wall_s": round(fed - start, 3), "queue_drain_s": round(drained - fed, 3),
+        "drain_timed_out": drained >= deadline,
+        "rss_mb": {"start": round(rss_start, 1), "peak": round(rss_peak, 1), "end": round(rss_end, 1)},
+        "sus_members": len(app.sus_members),
+        "role_queue_wait": {lane: h.summary() for lane, h in app.role_pipeline.wait_hist.items()},
+        "verify_latency": {method: h.summary() for method, h in app.verify_latency.items()},
+        "loop_lag": app.loop_monitor.lag_hist.summary() if app.loop_monitor else None,
+        "rest_calls": {op: app.rest_calls.total(op) for op in app.rest_calls.calls},
+        "rest_per_sus_action": round(app.rest_calls.per_op("sus_add"), 3),
+        "unmocked_routes": dict(api.unmocked),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a gateway log recorded by bot.py (GATEWAY_RECORD_DIR) with the Discord API mocked")
+    parser.add_argument("log", type=Path)
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression between events (50 = 50x; 0 = as fast as possible)")
+    parser.add_argument("--api-latency-ms", type=float, default=40.0, help="simulated latency of every mocked API call")
+    parser.add_argument("--until", type=float, default=None, help="stop after this many recorded seconds")
+    parser.add_argument("--drain-timeout", type=float, default=600.0, help="max seconds to wait for queues to drain after the last event")
+    parser.add_argument("--workdir", type=Path, default=None, help="scratch directory (default: a new temp directory)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--lean", dest="lean", action="store_const", const=True, help="force LEAN_MODE on")
+    mode.add_argument("--full", dest="lean", action="store_const", const=False, help="force LEAN_MODE off")
+    parser.add_argument("--json", type=Path, default=None, help="also write the results to this file")
+    args = parser.parse_args()
+    args.log = args.log.resolve()
+
+    header, records = read_log(args.log)
+    workdir = (args.workdir or Path(tempfile.mkdtemp(prefix="replay_"))).resolve()
+    prepare_environment(header, workdir, args.lean)
+    json_path = args.json.resolve() if args.json else None
+    sys.path.insert(0, str(REPO_DIR))
+    os.chdir(workdir)
+    import bot as app
+
+    started = datetime.datetime.utcfromtimestamp(header.get("started", 0)).strftime("%Y-%m-%d %H:%M:%S UTC")
+    print(f"Replaying {args.log.name} (recorded {started}, guild {header['guild_id']}) at {args.speed}x in {workdir}")
+    result = asyncio.run(replay(app, records, args))
+    print(json.dumps(result, indent=2))
+    if json_path:
+        json_path.write_text(json.dumps(result, indent=2))
+    # the bot's background loops (autoscan, notifier, loop monitor) never finish on their own
+    sys.stdout.flush()
+    os._exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# rest_accounting.py
+# Per-operation REST call counters, keyed by route
+#
+# The bot's HTTP client is wrapped so every request is counted under the operation that caused it.
+# The current operation lives in a context variable; asyncio tasks copy the context when they are
+# created, so background work spawned from an operation (its log line, its mention and the mention's
+# delete) is charged to that operation too. Calls made outside any operation land under "other".
+# Counts are logical requests: rate-limit retries inside the HTTP client are not counted again.
+
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator
+
+current_op: ContextVar[str] = ContextVar("rest_op", default="other")
+
+class RestAccounting:
+    def __init__(self):
+        self.ops: Dict[str, int] = {}                 # operation -> times run
+        self.calls: Dict[str, Dict[str, int]] = {}    # operation -> "METHOD /route/{template}" -> calls
+
+    @contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        """Charge REST calls made inside the block (and tasks it spawns) to `name`."""
+        self.ops[name] = self.ops.get(name, 0) + 1
+        token = current_op.set(name)
+        try:
+            yield
+        finally:
+            current_op.reset(token)
+
+    def enter(self, name: str):
+        """Charge the rest of the current task to `name` (for functions that run as their own task)."""
+        self.ops[name] = self.ops.get(name, 0) + 1
+        current_op.set(name)
+
+    def record(self, method: str, path: str):
+        routes = self.calls.setdefault(current_op.get(), {})
+        key = f"{method} {path}"
+        routes[key] = routes.get(key, 0) + 1
+
+    def total(self, op: str) -> int:
+        return sum(self.calls.get(op, {}).values())
+
+    def per_op(self, op: str) -> float:
+        runs = self.ops.get(op, 0)
+        return self.total(op) / runs if runs else 0.0
+
+    def reset(self):
+        self.ops.clear()
+        self.calls.clear()
+
+    def report(self, top_routes: int = 4) -> str:
+        if not self.calls:
+            return "No REST calls recorded yet."
+        lines = []
+        for op in sorted(self.calls, key=lambda o: -self.total(o)):
+            runs = self.ops.get(op, 0)
+            head = f"`{op}` {self.total(op)} calls"
+            if runs:
+                head += f" over {runs} runs ({self.per_op(op):.2f}/run)"
+            lines.append(head)
+            for route, n in sorted(self.calls[op].items(), key=lambda kv: -kv[1])[:top_routes]:
+                lines.append(f"  {n} × {route}")
+        return "\n".join(lines)
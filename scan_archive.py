@@ -0,0 +1,165 @@
+# scan_archive.py
+# Append-only binary archive of bulk scans, queryable offline via mmap
+#
+# Layout (little-endian) inside the archive directory:
+#   records.bin  fixed 12-byte records: u64 user id | u8 platform mask | 3 pad bytes.
+#                Every scan is one contiguous segment sorted by user id, so a user's
+#                record in a scan is found by binary search without reading the segment.
+#   scans.bin    fixed 52-byte entries, one per scan: u32 scan id | f64 unix ts |
+#                u64 first record | u32 record count | u32 web-only count | 24-byte label.
+#                An entry is written only after its records, so it doubles as the commit
+#                marker: records past the last entry are a torn write. Appends overwrite such
+#                a tail in place rather than truncating it, because query_archive.py may have
+#                records.bin mapped (shrinking a mapped file can SIGBUS the reader); repair()
+#                truncates it once when the bot starts.
+
+from __future__ import annotations
+import datetime
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from member_store import PLATFORM_WEB
+
+RECORD = struct.Struct("<QB3x")
+SCAN_ENTRY = struct.Struct("<IdQII24s")
+RECORDS_FILE = "records.bin"
+SCANS_FILE = "scans.bin"
+
+# append() derives its offsets from the committed entries, so concurrent appends in one process
+# (scan jobs and the autoscan rescan both archive from worker threads) must not interleave
+_append_lock = threading.Lock()
+
+class ScanEntry(NamedTuple):
+    scan_id: int
+    ts: float
+    first: int
+    count: int
+    web_only: int
+    label: str
+
+def _unpack_entry(data: bytes, offset: int) -> ScanEntry:
+    scan_id, ts, first, count, web_only, label = SCAN_ENTRY.unpack_from(data, offset)
+    return ScanEntry(scan_id, ts, first, count, web_only, label.rstrip(b"\0").decode("utf-8", "replace"))
+
+class ScanArchive:
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.records_path = self.directory / RECORDS_FILE
+        self.scans_path = self.directory / SCANS_FILE
+        self._records: Optional[mmap.mmap] = None
+        self._records_file = None
+
+    # ---- writing ----
+    def repair(self) -> int:
+        """Truncate torn tails left by a crash; call at startup only. Returns the bytes dropped."""
+        with _append_lock:
+            scans = self.scans()
+            committed = scans[-1].first + scans[-1].count if scans else 0
+            dropped = 0
+            for path, size in ((self.scans_path, len(scans) * SCAN_ENTRY.size), (self.records_path, committed * RECORD.size)):
+                if path.exists() and path.stat().st_size > size:
+                    dropped += path.stat().st_size - size
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+            return dropped
+
+    def append(self, ts: float, items: Iterable[Tuple[int, int]], label: str = "") -> int:
+        """Append one scan of (user_id, mask) pairs. Returns the new scan id."""
+        items = sorted(items)
+        with _append_lock:
+            return self._append(ts, items, label)
+
+    def _append(self, ts: float, items: List[Tuple[int, int]], label: str) -> int:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        scans = self.scans()
+        committed = scans[-1].first + scans[-1].count if scans else 0
+        self.records_path.touch()
+        with open(self.records_path, "r+b") as f:
+            f.seek(committed * RECORD.size)   # over any torn tail, never truncating (see header)
+            body = bytearray(RECORD.size * len(items))
+            web_only = 0
+            for k, (uid, mask) in enumerate(items):
+                RECORD.pack_into(body, k * RECORD.size, uid, mask & 0xFF)
+                if mask == PLATFORM_WEB:
+                    web_only += 1
+            f.write(body)
+            f.flush()
+        scan_id = scans[-1].scan_id + 1 if scans else 1
+        entry = SCAN_ENTRY.pack(scan_id, ts, committed, len(items), web_only, label.encode("utf-8")[:24])
+        self.scans_path.touch()
+        with open(self.scans_path, "r+b") as f:
+            f.seek(len(scans) * SCAN_ENTRY.size)
+            f.write(entry)
+        return scan_id
+
+    # ---- reading ----
+    def scans(self) -> List[ScanEntry]:
+        if not self.scans_path.exists():
+            return []
+        data = self.scans_path.read_bytes()
+        return [_unpack_entry(data, off) for off in range(0, len(data) - SCAN_ENTRY.size + 1, SCAN_ENTRY.size)]
+
+    def __enter__(self) -> "ScanArchive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._records is not None:
+            self._records.close()
+            self._records_file.close()
+            self._records = None
+            self._records_file = None
+
+    def _map(self) -> Optional[mmap.mmap]:
+        if self._records is None and self.records_path.exists() and self.records_path.stat().st_size:
+            self._records_file = open(self.records_path, "rb")
+            self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._records
+
+    def lookup(self, scan: ScanEntry, user_id: int) -> Optional[int]:
+        """Platform mask of `user_id` in `scan`, or None if the user was not in it."""
+        data = self._map()
+        if data is None:
+            return None
+        lo, hi = scan.first, scan.first + scan.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            uid = RECORD.unpack_from(data, mid * RECORD.size)[0]
+            if uid < user_id:
+                lo = mid + 1
+            elif uid > user_id:
+                hi = mid
+            else:
+                return data[mid * RECORD.size + 8]
+        return None
+
+    def iter_scan(self, scan: ScanEntry) -> Iterator[Tuple[int, int]]:
+        data = self._map()
+        if data is None:
+            return
+        for k in range(scan.first, scan.first + scan.count):
+            yield RECORD.unpack_from(data, k * RECORD.size)
+
+    def timeline(self, user_id: int) -> List[Tuple[ScanEntry, Optional[int]]]:
+        """(scan, mask or None) for every archived scan, oldest first."""
+        return [(scan, self.lookup(scan, user_id)) for scan in self.scans()]
+
+    def daily_web_only(self, label: Optional[str] = None) -> Dict[Tuple[str, str], Tuple[int, int, int]]:
+        """
+        (UTC day, label) -> (scans, max web-only count, max members scanned), from the scan table
+        only. Scans with different labels cover different members, so they are never merged;
+        `label` keeps only scans with that label.
+        """
+        days: Dict[Tuple[str, str], Tuple[int, int, int]] = {}
+        for scan in self.scans():
+            if label is not None and scan.label != label:
+                continue
+            key = (datetime.datetime.utcfromtimestamp(scan.ts).strftime("%Y-%m-%d"), scan.label)
+            n, web, members = days.get(key, (0, 0, 0))
+            days[key] = (n + 1, max(web, scan.web_only), max(members, scan.count))
+        return days
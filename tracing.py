@@ -0,0 +1,154 @@
+# tracing.py
+# Lightweight spans for the detection -> action lifecycle, written in Chrome Trace Event format
+#
+# Each finished span is appended to the trace file as one "complete" event (ph "X"). The file is
+# a JSON array without its closing bracket, which chrome://tracing and ui.perfetto.dev accept
+# as-is. Every trace gets its own row (tid) so one member's join -> Sus flow reads left to right.
+# Traces are passed explicitly (add_sus_role_to_member(..., trace=t)) rather than via context
+# variables, because the interesting part crosses the role queue into a different task.
+
+from __future__ import annotations
+import gzip
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+from metrics import Histogram, format_summary
+
+class Trace:
+    __slots__ = ("tracer", "trace_id", "name", "start", "attrs")
+
+    def __init__(self, tracer: "Tracer", trace_id: int, name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.attrs = attrs
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def record(self, stage: str, start: float, end: float = None, **attrs):
+        """Record a span from perf_counter() timestamps (for stages that cross tasks, e.g. queue wait)."""
+        self.tracer.emit(self, stage, start, end if end is not None else time.perf_counter(), attrs)
+
+    @contextmanager
+    def span(self, stage: str, **attrs) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tracer.emit(self, stage, start, time.perf_counter(), attrs)
+
+    def finish(self, **attrs):
+        """Record the whole trace, from creation until now, as the `name` span."""
+        self.record(self.name, self.start, **attrs)
+
+class Tracer:
+    def __init__(self, path: Path, max_bytes: int = 20 * 1024 * 1024, flush_interval: float = 5.0):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.enabled = True
+        self.stage_hist: Dict[str, Histogram] = {}
+        self._next_id = 1
+        self._file = None
+        self._written = 0
+        self._last_flush = 0.0
+        # perf_counter -> unix microseconds
+        self._offset_us = time.time() * 1e6 - time.perf_counter() * 1e6
+
+    def start(self, name: str, **attrs) -> Trace:
+        trace = Trace(self, self._next_id, name, attrs)
+        self._next_id += 1
+        return trace
+
+    def emit(self, trace: Trace, stage: str, start: float, end: float, attrs: Dict[str, Any]):
+        duration = max(end - start, 0.0)
+        hist = self.stage_hist.get(stage)
+        if hist is None:
+            hist = self.stage_hist[stage] = Histogram()
+        hist.observe(duration)
+        if not self.enabled:
+            return
+        event = {
+            "name": stage, "cat": trace.name, "ph": "X", "pid": os.getpid(), "tid": trace.trace_id,
+            "ts": round(start * 1e6 + self._offset_us), "dur": round(duration * 1e6),
+            "args": {"trace_id": trace.trace_id, **trace.attrs, **attrs},
+        }
+        try:
+            self._write(json.dumps(event, default=str) + ",\n")
+        except Exception as e:
+            print("Trace write failed:", e)
+
+    def _write(self, line: str):
+        if self._file is None or self._written >= self.max_bytes:
+            self._open()
+        self._file.write(line)
+        self._written += len(line)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def _open(self):
+        if self._file is not None:
+            self._file.close()
+        # size cap or a restart: keep the previous file as <name>.1 instead of truncating it
+        if self.path.exists() and self.path.stat().st_size:
+            os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        self._written = 2
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def export_gzip(self) -> Path:
+        """Gzip what has been written so far to <name>.gz (for upload); safe to run in a thread."""
+        self.flush()
+        size = self.path.stat().st_size   # bytes complete as of the flush; later appends are left out
+        out = self.path.with_name(self.path.name + ".gz")
+        with open(self.path, "rb") as src, gzip.open(out, "wb", compresslevel=6) as dst:
+            while size > 0:
+                chunk = src.read(min(size, 1 << 20))
+                if not chunk:
+                    break
+                dst.write(chunk)
+                size -= len(chunk)
+        return out
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def summary(self) -> str:
+        if not self.stage_hist:
+            return "No spans recorded yet."
+        width = max(len(s) for s in self.stage_hist)
+        return "\n".join(f"{stage:<{width}}  {format_summary(h)}" for stage, h in sorted(self.stage_hist.items()))
+
+class NullTrace:
+    """Stand-in when no trace is being carried; records nothing."""
+    trace_id = 0
+    name = ""
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def record(self, stage: str, start: float, end: float = None, **attrs):
+        pass
+
+    @contextmanager
+    def span(self, stage: str, **attrs) -> Iterator[None]:
+        yield
+
+    def finish(self, **attrs):
+        pass
+
+NULL_TRACE = NullTrace()